@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# Benchmark suite of the hot paths for airspeed velocity (asv), see asv.conf.json.
+#   time_* for the run time, peakmem_* for the peak memory (RSS) of the process.
+# Usage:
+#   pip install asv
+#   asv machine --yes                 # once per machine
+#   asv run                           # benchmark the latest commit, results saved in .asv/results
+#   asv continuous main HEAD          # compare HEAD against main, fail on regressions
+#   asv compare main HEAD             # compare the saved results
+#   asv run --python=same --quick     # smoke test in the current environment
+
+
+import datetime as dt
+
+import numpy as np
+from scipy import ndimage
+
+import pysolid
+from pysolid import resample
+from pysolid.grid import get_coarse_grid, get_interp_rows, write_grid_blocks
+
+
+def get_atr(size):
+    """Return the metadata of a size x size grid of ~90 m pixels in Los Angeles, CA."""
+    return {
+        'LENGTH'  : size,
+        'WIDTH'   : size,
+        'X_FIRST' : -118.2,
+        'Y_FIRST' : 33.8,
+        'X_STEP'  :  0.000833333,
+        'Y_STEP'  : -0.000833333,
+    }
+
+
+class SolidGrid:
+    """Grid mode at several grid sizes and step sizes, 0 for the full resolution."""
+    params = ([250, 1000, 2000], [0, 1e3])
+    param_names = ['size', 'step_size']
+    number = 1
+    repeat = 3
+    timeout = 300
+
+    def setup(self, size, step_size):
+        self.dt_obj = dt.datetime(2020, 12, 25, 14, 7, 44)
+        self.atr = get_atr(size)
+
+    def time_grid(self, size, step_size):
+        pysolid.calc_solid_earth_tides_grid(self.dt_obj, self.atr, step_size=step_size, verbose=False)
+
+    def peakmem_grid(self, size, step_size):
+        pysolid.calc_solid_earth_tides_grid(self.dt_obj, self.atr, step_size=step_size, verbose=False)
+
+
+class SolidGridTime:
+    """Grid mode at the full resolution, with the time offset of each row/pixel over a 60 s span,
+    to compare against SolidGrid at one epoch."""
+    params = [None, 'row', 'pixel']
+    param_names = ['time_offset']
+    number = 1
+    repeat = 3
+
+    def setup(self, time_offset):
+        self.dt_obj = dt.datetime(2020, 12, 25, 14, 7, 44)
+        self.atr = get_atr(1000)
+        t_row = np.linspace(0., 60., 1000)
+        self.time_offset = {
+            None    : None,
+            'row'   : t_row,
+            'pixel' : t_row[:, np.newaxis] + np.linspace(0., 1., 1000),
+        }[time_offset]
+
+    def time_grid_time(self, time_offset):
+        pysolid.calc_solid_earth_tides_grid(self.dt_obj, self.atr, step_size=0, verbose=False,
+                                            time_offset=self.time_offset)
+
+
+class SolidGridStack:
+    """Grid mode for a stack of epochs, sharing the same coarse grid."""
+    params = [1, 30]
+    param_names = ['num_date']
+    number = 1
+    repeat = 3
+
+    def setup(self, num_date):
+        self.dt_list = [dt.datetime(2020, 1, 1, 14, 7, 44) + dt.timedelta(days=12 * i) for i in range(num_date)]
+        self.atr = get_atr(1000)
+
+    def time_grid_stack(self, num_date):
+        pysolid.calc_solid_earth_tides_grid_stack(self.dt_list, self.atr, verbose=False)
+
+    def peakmem_grid_stack(self, num_date):
+        pysolid.calc_solid_earth_tides_grid_stack(self.dt_list, self.atr, verbose=False)
+
+
+class SolidPoint:
+    """Point mode over 1 day, 1 month and 1 year at 1 min sampling."""
+    params = [1, 31, 366]
+    param_names = ['num_day']
+    number = 1
+    repeat = 3
+    timeout = 300
+
+    def setup(self, num_day):
+        self.dt0 = dt.datetime(2020, 1, 1)
+        self.dt1 = self.dt0 + dt.timedelta(days=num_day)
+
+    def time_point(self, num_day):
+        pysolid.calc_solid_earth_tides_point(34.0, -118.0, self.dt0, self.dt1, step_sec=60, verbose=False)
+
+    def peakmem_point(self, num_day):
+        pysolid.calc_solid_earth_tides_point(34.0, -118.0, self.dt0, self.dt1, step_sec=60, verbose=False)
+
+
+class Resample:
+    """Resampling from the coarse grid (step_size=1e3) to the full grid, without the SET calculation."""
+    params = [1000, 4000]
+    param_names = ['size']
+    number = 1
+    repeat = 3
+
+    def setup(self, size):
+        self.atr = get_atr(size)
+        self.shape = (size, size)
+        num_step, length, width = get_coarse_grid(self.atr, step_size=1e3)[:3]
+        rng = np.random.default_rng(seed=0)
+        self.enu = [rng.standard_normal((length, width)) * 0.1 for _ in range(3)]
+        # positions of the coarse pixels in the full grid, as in calc_solid_earth_tides_grid()
+        self.ys = resample.get_zoom_positions(length, size)
+        self.xs = resample.get_zoom_positions(width,  size)
+        self.plan = resample.get_plan(self.ys, self.xs, self.shape)
+
+    def time_plan(self, size):
+        """Row/column weights, computed once per geometry."""
+        resample.get_plan(self.ys, self.xs, self.shape)
+
+    def time_interp_rows(self, size):
+        """Block-wise linear interpolation, as in calc_solid_earth_tides_grid()."""
+        get_rows = get_interp_rows(self.enu, self.plan)
+        write_grid_blocks(get_rows, self.shape)
+
+    def peakmem_interp_rows(self, size):
+        get_rows = get_interp_rows(self.enu, self.plan)
+        write_grid_blocks(get_rows, self.shape)
+
+    def time_resample(self, size):
+        """Linear interpolation with the shared plan, as in calc_solid_earth_tides_grid_stack()."""
+        for data in self.enu:
+            resample.resample(data, self.plan)
+
+    def time_resample_float32(self, size):
+        for data in self.enu:
+            resample.resample(data, self.plan, dtype=np.float32)
+
+    def peakmem_resample_float32(self, size):
+        for data in self.enu:
+            resample.resample(data, self.plan, dtype=np.float32)
+
+    def time_resample_cubic(self, size):
+        plan = resample.get_plan(self.ys, self.xs, self.shape, order=3)
+        for data in self.enu:
+            resample.resample(data, plan)
+
+    def time_zoom(self, size):
+        """ndimage.zoom, as in calc_solid_earth_tides_grid_stack() before pysolid.resample."""
+        zoom_factors = np.divide(self.shape, self.enu[0].shape)
+        for data in self.enu:
+            ndimage.zoom(data, zoom_factors, order=1, mode='nearest', grid_mode=True)
+
+    def peakmem_zoom(self, size):
+        zoom_factors = np.divide(self.shape, self.enu[0].shape)
+        for data in self.enu:
+            ndimage.zoom(data, zoom_factors, order=1, mode='nearest', grid_mode=True)
+
+
+class Import:
+    """Import time of pysolid in a fresh interpreter, with the top-level functions loaded lazily."""
+
+    def timeraw_import_pysolid(self):
+        return 'import pysolid'
+
+    def timeraw_import_point(self):
+        return 'from pysolid import calc_solid_earth_tides_point'
+
+    def timeraw_import_grid(self):
+        return 'from pysolid import calc_solid_earth_tides_grid'
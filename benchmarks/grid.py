@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# Benchmark the grid mode at the full resolution (step_size=0).
+#   The Sun/Moon ephemeris is computed once per epoch, thus the run time
+#   scales with the number of pixels only. The throughput measured at the
+#   given grid size is extrapolated to a 10k x 10k geocoded scene.
+# Usage:
+#   python benchmarks/grid.py             # 1000 x 1000 pixels
+#   python benchmarks/grid.py 10000       # 10k x 10k pixels (~2.4 GB output)
+#   python benchmarks/grid.py 4000 32     # 4k x 4k pixels with 32 threads
+#   python benchmarks/grid.py 4000 scaling # 4k x 4k pixels with 1, 2, 4, ... threads up to all CPUs
+
+
+import os
+import sys
+import time
+import datetime as dt
+
+import pysolid
+
+
+def run_grid(size, step_size=0, num_repeat=3, n_workers=1):
+    """Return the best run time in seconds of calc_solid_earth_tides_grid() on a size x size grid."""
+    dt_obj = dt.datetime(2020, 12, 25, 14, 7, 44)
+    atr = {
+        'LENGTH'  : size,
+        'WIDTH'   : size,
+        'X_FIRST' : -118.2,
+        'Y_FIRST' : 33.8,
+        'X_STEP'  :  0.000833333,
+        'Y_STEP'  : -0.000833333,
+    }
+
+    run_times = []
+    for _ in range(num_repeat):
+        t0 = time.perf_counter()
+        pysolid.calc_solid_earth_tides_grid(dt_obj, atr, step_size=step_size, verbose=False,
+                                            n_workers=n_workers)
+        run_times.append(time.perf_counter() - t0)
+    return min(run_times)
+
+
+def run_scaling(size, num_repeat=3):
+    """Print the run time, speedup and parallel efficiency with 1, 2, 4, ... threads up to all CPUs."""
+    num_cpu = os.cpu_count()
+    workers = sorted({2**i for i in range(num_cpu.bit_length()) if 2**i <= num_cpu} | {num_cpu})
+    print(f'grid size      : {size} x {size} pixels, {num_cpu} CPUs')
+    print('threads  run time (s)  speedup  efficiency')
+    for n_workers in workers:
+        run_time = run_grid(size, step_size=0, num_repeat=num_repeat, n_workers=n_workers)
+        if n_workers == 1:
+            run_time1 = run_time
+        speedup = run_time1 / run_time
+        print(f'{n_workers:7d}  {run_time:12.3f}  {speedup:7.2f}  {speedup/n_workers:10.0%}')
+
+
+if __name__ == '__main__':
+
+    # print the file/module path
+    print('-'*50)
+    print(os.path.abspath(__file__))
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    num_repeat = 1 if size > 4000 else 3
+    if len(sys.argv) > 2 and sys.argv[2] == 'scaling':
+        run_scaling(size, num_repeat=num_repeat)
+        sys.exit(0)
+    n_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    run_time = run_grid(size, step_size=0, num_repeat=num_repeat, n_workers=n_workers)
+    speed = size * size / run_time
+    print(f'grid size      : {size} x {size} pixels')
+    print(f'threads        : {n_workers}')
+    print(f'run time       : {run_time:.3f} seconds (step_size=0)')
+    print(f'throughput     : {speed/1e6:.2f} M pixels per second')
+    print(f'10k x 10k scene: {1e8/speed:.1f} seconds per epoch (extrapolated)')
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# Benchmark the batch point mode for a network of stations, e.g. GNSS.
+#   calc_solid_earth_tides_points() computes the Sun/Moon ephemeris once per
+#   epoch for all stations, while calling calc_solid_earth_tides_point() per
+#   station re-computes it for every station.
+# Usage:
+#   python benchmarks/points.py             # 2000 stations, 288 epochs (1 day every 5 min)
+#   python benchmarks/points.py 500 1440    # 500 stations, 1440 epochs (1 day every 1 min)
+
+
+import os
+import sys
+import time
+
+import numpy as np
+
+import pysolid
+
+
+def prep_inputs(num_sta, num_time):
+    """Return random station locations and regular date/times within one day."""
+    rng = np.random.default_rng(seed=0)
+    lats = rng.uniform(-80., 80., size=num_sta)
+    lons = rng.uniform(-180., 180., size=num_sta)
+    step = np.timedelta64(86400 // num_time, 's')
+    times = np.datetime64('2020-12-25T00:00:00', 's') + np.arange(num_time) * step
+    return lats, lons, times
+
+
+def run_loop(lats, lons, times):
+    """Return the run time in seconds of calc_solid_earth_tides_point() per station."""
+    t0 = time.perf_counter()
+    for lat, lon in zip(lats, lons):
+        pysolid.calc_solid_earth_tides_point(lat, lon, times=times, verbose=False)
+    return time.perf_counter() - t0
+
+
+def run_batch(lats, lons, times, num_repeat=3):
+    """Return the best run time in seconds of calc_solid_earth_tides_points()."""
+    run_times = []
+    for _ in range(num_repeat):
+        t0 = time.perf_counter()
+        pysolid.calc_solid_earth_tides_points(lats, lons, times, verbose=False)
+        run_times.append(time.perf_counter() - t0)
+    return min(run_times)
+
+
+if __name__ == '__main__':
+
+    # print the file/module path
+    print('-'*50)
+    print(os.path.abspath(__file__))
+
+    num_sta = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    num_time = int(sys.argv[2]) if len(sys.argv) > 2 else 288
+    lats, lons, times = prep_inputs(num_sta, num_time)
+
+    # silence the messages printed by calc_solid_earth_tides_point()
+    with open(os.devnull, 'w') as f:
+        stdout, sys.stdout = sys.stdout, f
+        try:
+            loop_time = run_loop(lats, lons, times)
+        finally:
+            sys.stdout = stdout
+    batch_time = run_batch(lats, lons, times)
+
+    print(f'stations x epochs : {num_sta} x {num_time}')
+    print(f'per-station loop  : {loop_time:.3f} seconds')
+    print(f'batch             : {batch_time:.3f} seconds')
+    print(f'speedup           : {loop_time/batch_time:.1f}x')
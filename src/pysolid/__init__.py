@@ -1,33 +1,69 @@
-from importlib.metadata import PackageNotFoundError, version
-
-# get version info
-try:
-    __version__ = version(__name__)
-except PackageNotFoundError:
-    print('package is not installed!\n'
-          'Please follow the installation instructions in the README.md.\n'
-          'Or, to just get the version number, use:\n'
-          '   python -m setuptools_scm')
-
-
-# top-level functions
-from pysolid.grid import (
-    calc_solid_earth_tides_grid,
-    plot_solid_earth_tides_grid,
-)
-from pysolid.point import (
-    TIDES,
-    calc_solid_earth_tides_point,
-    plot_solid_earth_tides_point,
-    plot_power_spectral_density4tides,
-)
-
-__all__ = [
-    '__version__',
-    'calc_solid_earth_tides_grid',
-    'plot_solid_earth_tides_grid',
-    'TIDES',
-    'calc_solid_earth_tides_point',
-    'plot_solid_earth_tides_point',
-    'plot_power_spectral_density4tides',
+# The top-level functions and submodules are loaded lazily on the first access, see __getattr__(),
+#   thus "import pysolid" is cheap, e.g. for short-lived batch workers, and the dependencies,
+#   e.g. scipy/matplotlib and the compiled solid.for, are loaded only when used.
+
+import importlib
+
+
+# top-level functions, by the submodule they are defined in
+_FUNC2MODULE = {
+    'calc_solid_earth_tides_dataset'     : 'dataset',
+    'calc_solid_earth_tides_grid'        : 'grid',
+    'calc_solid_earth_tides_grid_stack'  : 'grid',
+    'calc_solid_earth_tides_grid_latlon' : 'grid',
+    'plot_solid_earth_tides_grid'        : 'grid',
+    'TIDES'                              : 'point',
+    'calc_solid_earth_tides_point'       : 'point',
+    'calc_solid_earth_tides_points'      : 'point',
+    'plot_solid_earth_tides_point'       : 'point',
+    'plot_power_spectral_density4tides'  : 'point',
+}
+
+_SUBMODULES = [
+    'batch',
+    'cache',
+    'cli',
+    'dataset',
+    'ephemeris',
+    'grid',
+    'harmonic',
+    'point',
+    'profiler',
+    'resample',
+    'solid_numpy',
+    'utils',
 ]
+
+__all__ = ['__version__'] + list(_FUNC2MODULE.keys())
+
+
+def __getattr__(name):
+    if name == '__version__':
+        # get version info
+        from importlib.metadata import PackageNotFoundError, version
+        try:
+            value = version(__name__)
+        except PackageNotFoundError:
+            print('package is not installed!\n'
+                  'Please follow the installation instructions in the README.md.\n'
+                  'Or, to just get the version number, use:\n'
+                  '   python -m setuptools_scm')
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    elif name in _FUNC2MODULE:
+        module = importlib.import_module(f'{__name__}.{_FUNC2MODULE[name]}')
+        value = getattr(module, name)
+
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f'{__name__}.{name}')
+
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    # bind it, thus __getattr__ is called once per name
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals().keys()) | set(__all__) | set(_SUBMODULES))
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+#######################################################################
+# Batch calculation of SET for a time-series into one HDF5 file.
+# Copyright 2020, by the California Institute of Technology.
+#######################################################################
+# Recommend usage:
+#   from pysolid import batch
+#   batch.calc_solid_earth_tides_file(dt_list, atr, 'SET.h5', n_workers=4)
+#
+# The epochs are distributed over a pool of processes, each initialized once with the backend
+#   and the shared inputs, e.g. the DEM, thus only the date/time is sent per epoch. The parent
+#   process is the only writer: it writes each epoch into the chunked datasets, then sets its
+#   flag in the "done" dataset and flushes the file. Thus a killed job restarts from the epochs
+#   not done yet by running the same command again.
+
+
+import datetime as dt
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from pysolid import cache
+from pysolid.grid import calc_solid_earth_tides_grid
+from pysolid.profiler import log_verbose
+from pysolid.utils import get_backend
+
+
+logger = logging.getLogger(__name__)
+
+# per-worker inputs, set by init_worker()
+_worker_inputs = {}
+
+
+@log_verbose
+def calc_solid_earth_tides_file(dt_list, atr, out_file, step_size=1e3, inc_angle=None, az_angle=None,
+                                height=None, n_workers=1, backend='fortran', dtype=np.float32,
+                                overwrite=False, verbose=True):
+    """Calculate SET for a spatial grid at multiple dates/times and write into an HDF5 file.
+
+    The output file has the datasets of east/north/up (or los, if inc/az_angle are given) in
+    (n_epoch, length, width), chunked by epoch, date in ISO format and done in bool, with the grid
+    metadata and the other inputs as attributes. An existing output file with the same dates/times,
+    metadata and inputs is resumed, i.e. only the epochs not done yet are calculated, unless
+    overwrite is True.
+
+    Parameters: dt_list   - list of datetime.datetime objects, in UTC
+                atr       - dict, metadata including LENGTH/WIDTH and X/Y_FIRST/STEP,
+                            see calc_solid_earth_tides_grid()
+                out_file  - str, path of the output HDF5 file
+                step_size - float, grid step in meters, see calc_solid_earth_tides_grid()
+                inc_angle - float, incidence angle in degrees, to project SET onto LOS
+                az_angle  - float, azimuth angle in degrees, to project SET onto LOS
+                height    - float or 2D np.ndarray in (length, width), ellipsoidal height in meters
+                n_workers - int, number of processes, None for all CPUs
+                backend   - str, fortran or numpy, see pysolid.utils.get_backend()
+                dtype     - np.dtype, data type of the output datasets
+                overwrite - bool, calculate all epochs from scratch, instead of resuming
+                verbose   - bool, log verbose message at INFO level, see profiler.log_verbose()
+    Returns:    out_file  - str, path of the output HDF5 file
+    Examples:   dt_list = [dt.datetime(2020, 12, 13, 14, 7, 44), dt.datetime(2020, 12, 25, 14, 7, 44)]
+                calc_solid_earth_tides_file(dt_list, atr, 'SET.h5', n_workers=4)
+    """
+    import h5py
+
+    n_workers = os.cpu_count() if n_workers is None else max(1, int(n_workers))
+    shape = (len(dt_list), int(atr['LENGTH']), int(atr['WIDTH']))
+    los = inc_angle is not None or az_angle is not None
+    ds_names = ['los'] if los else ['east', 'north', 'up']
+    dates = [x.isoformat() for x in dt_list]
+    attrs = {key: str(value) for key, value in atr.items()}
+    attrs.update(step_size=str(step_size), inc_angle=str(inc_angle), az_angle=str(az_angle),
+                 height=str(height) if np.ndim(height) == 0 else cache.get_key('height', height=np.asarray(height)),
+                 backend=backend)
+
+    with h5py.File(out_file, 'a') as f:
+        # create or check the output file
+        if overwrite or not check_output_file(f, dates, shape, ds_names, dtype, attrs):
+            logger.info(f'PYSOLID: create file: {out_file}')
+            prep_output_file(f, dates, shape, ds_names, dtype, attrs)
+        done = f['done'][:]
+        idx = np.where(~done)[0].tolist()
+        logger.info(f'PYSOLID: number of epochs: {shape[0]}, done: {shape[0] - len(idx)}, to do: {len(idx)}')
+        if not idx:
+            return out_file
+
+        num_done = shape[0] - len(idx)
+        def write_epoch(i, data_list):
+            nonlocal num_done
+            for ds_name, data in zip(ds_names, data_list):
+                f[ds_name][i] = data
+            # mark as done after the data, thus a partially written epoch is re-calculated
+            f['done'][i] = True
+            f.flush()
+            num_done += 1
+            logger.info(f'PYSOLID: [{num_done}/{shape[0]}] {dates[i]}')
+
+        kwargs = dict(step_size=step_size, inc_angle=inc_angle, az_angle=az_angle, height=height,
+                      backend=backend, dtype=dtype)
+        if n_workers == 1 or len(idx) == 1:
+            init_worker(atr, kwargs)
+            for i in idx:
+                write_epoch(*calc_epoch(i, dt_list[i]))
+
+        else:
+            n_workers = min(n_workers, len(idx))
+            logger.info(f'PYSOLID: calculate with {n_workers} processes')
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker,
+                                     initargs=(atr, kwargs)) as executor:
+                # bounded number of epochs in flight, to bound the memory usage of the parent
+                num_max = n_workers * 2
+                futures = {}
+                for i in idx:
+                    futures[i] = executor.submit(calc_epoch, i, dt_list[i])
+                    if len(futures) >= num_max:
+                        write_epoch(*futures.pop(min(futures)).result())
+                for i in sorted(futures):
+                    write_epoch(*futures.pop(i).result())
+
+    return out_file
+
+
+def prep_output_file(f, dates, shape, ds_names, dtype, attrs):
+    """Create the datasets and attributes of the output file, see calc_solid_earth_tides_file().
+
+    Parameters: f        - h5py.File object, opened in the writable mode
+                dates    - list of str, date/times in ISO format
+                shape    - tuple of 3 int, shape of the datasets in (n_epoch, length, width)
+                ds_names - list of str, names of the SET datasets, i.e. east/north/up or los
+                dtype    - np.dtype, data type of the SET datasets
+                attrs    - dict of str, metadata of the grid and the other inputs, e.g. step_size
+    """
+    for key in list(f.keys()):
+        del f[key]
+    f.attrs.clear()
+
+    chunks = (1, min(shape[1], 1024), min(shape[2], 1024))
+    for ds_name in ds_names:
+        f.create_dataset(ds_name, shape=shape, dtype=dtype, chunks=chunks, fillvalue=np.nan)
+        f[ds_name].attrs['UNIT'] = 'm'
+    f.create_dataset('date', data=np.array(dates, dtype=np.bytes_))
+    f.create_dataset('done', data=np.zeros(shape[0], dtype=np.bool_))
+
+    for key, value in attrs.items():
+        f.attrs[key] = value
+    f.flush()
+
+
+def check_output_file(f, dates, shape, ds_names, dtype, attrs):
+    """Check if the existing output file matches the inputs and could be resumed.
+
+    Parameters: f        - h5py.File object
+                dates    - list of str, date/times in ISO format
+                shape    - tuple of 3 int, shape of the datasets in (n_epoch, length, width)
+                ds_names - list of str, names of the SET datasets
+                dtype    - np.dtype, data type of the SET datasets
+                attrs    - dict of str, metadata of the grid and the other inputs
+    Returns:    flag     - bool, True to resume
+    """
+    if any(x not in f for x in ds_names + ['date', 'done']):
+        return False
+    if any(f[x].shape != shape or f[x].dtype != np.dtype(dtype) for x in ds_names):
+        return False
+    if any(f.attrs.get(key) != value for key, value in attrs.items()):
+        return False
+    return [x.decode() for x in f['date'][:]] == list(dates)
+
+
+def init_worker(atr, kwargs):
+    """Initialize the worker process with the shared inputs, and import the backend in advance."""
+    get_backend(kwargs['backend'])
+    _worker_inputs['atr'] = atr
+    _worker_inputs['kwargs'] = kwargs
+
+
+def calc_epoch(i, dt_obj):
+    """Calculate SET for one epoch in the worker process, see init_worker().
+
+    Parameters: i         - int, index of the epoch
+                dt_obj    - datetime.datetime object
+    Returns:    i         - int, index of the epoch
+                data_list - list of 2D np.ndarray, SET in east/north/up (or LOS) direction
+    """
+    kwargs = dict(_worker_inputs['kwargs'])
+    dtype = kwargs.pop('dtype')
+    out = calc_solid_earth_tides_grid(dt_obj, _worker_inputs['atr'], verbose=False, **kwargs)
+    data_list = [out] if isinstance(out, np.ndarray) else list(out)
+    return i, [x.astype(dtype, copy=False) for x in data_list]
+
+
+def read_date_file(fname):
+    """Read the date/times from a text file, one per line, with comments after #.
+
+    Parameters: fname   - str, path of the text file
+    Returns:    dates   - list of str, date/times, see get_datetimes()
+    """
+    dates = []
+    with open(fname) as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if line:
+                dates.append(line.split()[0])
+    return dates
+
+
+def get_datetimes(dates, utc_sec=None):
+    """Convert the date/times in str into datetime.datetime objects.
+
+    Parameters: dates   - list of str, in YYYYMMDD, YYYYMMDDTHHMMSS or ISO format, in UTC
+                utc_sec - float, time of the day in seconds, for dates in YYYYMMDD without time,
+                          e.g. CENTER_LINE_UTC of SAR acquisitions
+    Returns:    dt_list - list of datetime.datetime objects
+    """
+    dt_list = []
+    for date in dates:
+        if len(date) == 8 and date.isdigit():
+            dt_obj = dt.datetime.strptime(date, '%Y%m%d')
+            if utc_sec is not None:
+                dt_obj += dt.timedelta(seconds=float(utc_sec))
+        elif len(date) == 15 and date[8] == 'T':
+            dt_obj = dt.datetime.strptime(date, '%Y%m%dT%H%M%S')
+        else:
+            dt_obj = dt.datetime.fromisoformat(date)
+        dt_list.append(dt_obj)
+    return dt_list
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+#######################################################################
+# Persistent on-disk cache of the computed solid Earth tides.
+# Copyright 2020, by the California Institute of Technology.
+#######################################################################
+# Recommend usage:
+#   import pysolid
+#   pysolid.calc_solid_earth_tides_grid(dt_obj, atr, cache_dir='~/.cache/pysolid')
+#
+# The cache is content-addressed: each entry is one compressed .npz file named after the
+#   sha256 hash of the inputs (and the package version), thus the same inputs always map to
+#   the same file and any change in the inputs results in a new entry.
+# It is safe for concurrent processes: entries are written into a temporary file and then
+#   renamed atomically, thus readers never see a partial file. The least recently used entries,
+#   by the file modification time updated on each hit, are evicted once the total size exceeds
+#   MAX_SIZE.
+
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+
+# max total size of the cache directory in bytes
+MAX_SIZE = 2**30
+
+# package version in the cache key, read on the first use, as importlib.metadata is slow to import
+_version = None
+
+
+def get_version():
+    """Get the version of the installed pysolid package, or unknown if not installed."""
+    global _version
+    if _version is None:
+        from importlib.metadata import PackageNotFoundError, version
+        try:
+            _version = version('pysolid')
+        except PackageNotFoundError:
+            _version = 'unknown'
+    return _version
+
+
+def get_key(name, **kwargs):
+    """Get the cache key given the function name and its inputs.
+
+    Parameters: name   - str, name of the cached calculation, e.g. grid or point
+                kwargs - inputs, in JSON serializable types or np.ndarray, or namedtuple of them,
+                         e.g. pysolid.ephemeris.Ephemeris
+    Returns:    key    - str, sha256 hex digest
+    """
+    hasher = hashlib.sha256()
+    hasher.update(f'{name}-{get_version()}'.encode())
+    for k in sorted(kwargs.keys()):
+        hasher.update(k.encode())
+        _update_hash(hasher, kwargs[k])
+    return hasher.hexdigest()
+
+
+def _update_hash(hasher, v):
+    if isinstance(v, np.ndarray):
+        v = np.ascontiguousarray(v)
+        hasher.update(f'{v.dtype.str}{v.shape}'.encode())
+        hasher.update(v.tobytes())
+    elif isinstance(v, tuple) and hasattr(v, '_fields'):
+        # namedtuple, field by field, for the arrays within
+        hasher.update(type(v).__name__.encode())
+        for field, x in zip(v._fields, v):
+            hasher.update(field.encode())
+            _update_hash(hasher, x)
+    else:
+        hasher.update(json.dumps(v, sort_keys=True, default=str).encode())
+
+
+def load(cache_dir, key):
+    """Load the cached arrays, and mark them as recently used.
+
+    Parameters: cache_dir - str, path of the cache directory
+                key       - str, cache key from get_key()
+    Returns:    data      - dict of np.ndarray, or None if not cached
+    """
+    fname = os.path.join(os.path.expanduser(cache_dir), f'{key}.npz')
+    try:
+        with np.load(fname) as npz:
+            data = {k: npz[k] for k in npz.files}
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # corrupted file, e.g. from a full disk, treat as missing
+        _remove(fname)
+        return None
+
+    try:
+        os.utime(fname)
+    except OSError:
+        pass
+    return data
+
+
+def save(cache_dir, key, max_size=None, **arrays):
+    """Save arrays into the cache atomically, then evict the least recently used entries.
+
+    Parameters: cache_dir - str, path of the cache directory
+                key       - str, cache key from get_key()
+                max_size  - int, max total size of the cache directory in bytes, default: MAX_SIZE
+                arrays    - np.ndarray to save
+    """
+    cache_dir = os.path.expanduser(cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    fname = os.path.join(cache_dir, f'{key}.npz')
+
+    fd, tmp_file = tempfile.mkstemp(dir=cache_dir, prefix=f'.{key}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_file, fname)
+    except BaseException:
+        _remove(tmp_file)
+        raise
+
+    evict(cache_dir, max_size=MAX_SIZE if max_size is None else max_size)
+
+
+def evict(cache_dir, max_size=None):
+    """Remove the least recently used entries until the total size is within max_size.
+
+    Parameters: cache_dir - str, path of the cache directory
+                max_size  - int, max total size of the cache directory in bytes, default: MAX_SIZE
+    """
+    max_size = MAX_SIZE if max_size is None else max_size
+    entries = []
+    with os.scandir(os.path.expanduser(cache_dir)) as it:
+        for entry in it:
+            if entry.name.endswith('.npz'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total_size = sum(x[1] for x in entries)
+    for _, size, fname in sorted(entries):
+        if total_size <= max_size:
+            break
+        _remove(fname)
+        total_size -= size
+
+
+def _remove(fname):
+    """Remove a file, which may have been removed by another process already."""
+    try:
+        os.remove(fname)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+#######################################################################
+# Command line interface of PySolid, installed as the "pysolid" command.
+# Copyright 2020, by the California Institute of Technology.
+#######################################################################
+# Recommend usage:
+#   pysolid -m geo_velocity.rsc --date-file date_list.txt -o SET.h5 -n 4
+#   pysolid --help
+
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from pysolid import batch
+
+
+EXAMPLE = """example:
+  # SET in east/north/up for two SAR acquisitions, with 4 processes
+  pysolid -m geo_velocity.rsc -d 20201213T140744 20201225T140744 -o SET.h5 -n 4
+
+  # SET in LOS for the dates in a text file at the time of CENTER_LINE_UTC in the metadata
+  pysolid -m geo_velocity.json --date-file date_list.txt --inc-angle 34 --az-angle -102
+
+  # re-run the same command to resume a killed job, or with --overwrite to start over
+  pysolid -m geo_velocity.rsc --date-file date_list.txt -o SET.h5 -n 4
+"""
+
+
+def create_parser(subparsers=None):
+    parser = argparse.ArgumentParser(
+        prog='pysolid',
+        description='Calculate solid Earth tides (SET) for a spatial grid at multiple dates/times into an HDF5 file.',
+        formatter_class=argparse.RawTextHelpFormatter,
+        epilog=EXAMPLE,
+    )
+
+    # input
+    parser.add_argument('-m', '--meta', dest='meta_file', required=True,
+                        help='metadata file of the grid, in JSON or text with one "KEY VALUE" per line\n'
+                             '(e.g. ROI_PAC .rsc), including LENGTH/WIDTH and X/Y_FIRST/STEP, and\n'
+                             'optionally CENTER_LINE_UTC in seconds for dates without time.')
+    parser.add_argument('-d', '--date', dest='dates', nargs='+', default=[],
+                        help='date/times in UTC, in YYYYMMDD, YYYYMMDDTHHMMSS or ISO format.')
+    parser.add_argument('--date-file', dest='date_file',
+                        help='text file with one date/time per line, as --date.')
+    parser.add_argument('--utc-sec', dest='utc_sec', type=float,
+                        help='time of the day in seconds for dates without time (default: CENTER_LINE_UTC\n'
+                             'in the metadata file if exists, 0 otherwise).')
+
+    # calculation
+    parser.add_argument('--step-size', dest='step_size', type=float, default=1e3,
+                        help='grid step in meters to calculate SET before resizing, 0 for the full\n'
+                             'resolution (default: %(default)s).')
+    parser.add_argument('--inc-angle', dest='inc_angle', type=float,
+                        help='incidence angle in degrees, to project SET onto LOS.')
+    parser.add_argument('--az-angle', dest='az_angle', type=float,
+                        help='azimuth angle in degrees, to project SET onto LOS.')
+    parser.add_argument('--height', dest='height', type=float,
+                        help='ellipsoidal height in meters (default: 0).')
+    parser.add_argument('--backend', dest='backend', choices={'fortran', 'numpy'}, default='fortran',
+                        help='backend of the calculation (default: %(default)s).')
+    parser.add_argument('-n', '--num-workers', dest='n_workers', type=int, default=1,
+                        help='number of processes, 0 for all CPUs (default: %(default)s).')
+
+    # output
+    parser.add_argument('-o', '--output', dest='out_file', default='SET.h5',
+                        help='output HDF5 file (default: %(default)s).')
+    parser.add_argument('--dtype', dest='dtype', choices={'float32', 'float64'}, default='float32',
+                        help='data type of the output datasets (default: %(default)s).')
+    parser.add_argument('--overwrite', dest='overwrite', action='store_true',
+                        help='calculate all epochs from scratch, instead of resuming the existing output file.')
+    parser.add_argument('-q', '--quiet', dest='verbose', action='store_false',
+                        help='do not print the progress.')
+    return parser
+
+
+def cmd_line_parse(iargs=None):
+    parser = create_parser()
+    inps = parser.parse_args(args=iargs)
+
+    if not os.path.isfile(inps.meta_file):
+        parser.error(f'metadata file NOT found: {inps.meta_file}')
+    if inps.date_file:
+        inps.dates += batch.read_date_file(inps.date_file)
+    if not inps.dates:
+        parser.error('no date/time given, use --date or --date-file!')
+    if (inps.inc_angle is None) != (inps.az_angle is None):
+        parser.error('--inc-angle and --az-angle should be given together!')
+    if inps.n_workers == 0:
+        inps.n_workers = None
+    return inps
+
+
+def read_meta(fname):
+    """Read the metadata of the grid from a JSON file or a text file with one "KEY VALUE" per line.
+
+    Parameters: fname - str, path of the metadata file
+    Returns:    atr   - dict, metadata
+    """
+    if fname.endswith('.json'):
+        with open(fname) as f:
+            return json.load(f)
+
+    atr = {}
+    with open(fname) as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if line:
+                key, _, value = line.partition(' ')
+                atr[key] = value.strip()
+    return atr
+
+
+def main(iargs=None):
+    inps = cmd_line_parse(iargs)
+
+    atr = read_meta(inps.meta_file)
+    utc_sec = inps.utc_sec if inps.utc_sec is not None else atr.get('CENTER_LINE_UTC', None)
+    dt_list = batch.get_datetimes(inps.dates, utc_sec=utc_sec)
+
+    batch.calc_solid_earth_tides_file(
+        dt_list, atr, inps.out_file,
+        step_size=inps.step_size,
+        inc_angle=inps.inc_angle,
+        az_angle=inps.az_angle,
+        height=inps.height,
+        n_workers=inps.n_workers,
+        backend=inps.backend,
+        dtype=np.dtype(inps.dtype),
+        overwrite=inps.overwrite,
+        verbose=inps.verbose,
+    )
+    return inps.out_file
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+#######################################################################
+# Lazy, chunked SET cubes as xarray.Dataset backed by dask.
+# Copyright 2020, by the California Institute of Technology.
+#######################################################################
+# Recommend usage:
+#   import pysolid
+#   ds = pysolid.calc_solid_earth_tides_dataset(grid, times, chunks={'time': 1, 'lat': 1024, 'lon': 1024})
+#   tide_u = ds['tide_u'].sel(lat=slice(35, 34)).mean(['lat', 'lon']).compute()
+#
+# Each (time, lat, lon) chunk is a dask task of its own, calculated by the grid kernel on demand,
+#   thus only the chunks used downstream are calculated, in parallel on the dask scheduler.
+# With step_size > 0, SET is calculated on the coarse nodes every num_step pixels, aligned to
+#   the first pixel of the grid, and interpolated linearly in between, thus the result does not
+#   depend on the chunking.
+
+
+import numpy as np
+
+from pysolid.grid import calc_grid_kern
+from pysolid.resample import get_linear_weights
+from pysolid.utils import datetime2mjd, get_backend
+
+
+def calc_solid_earth_tides_dataset(grid, times, step_size=1e3, chunks=None, lat='lat', lon='lon',
+                                   backend='fortran', ephemeris=None):
+    """Calculate SET in east/north/up direction lazily as a dask-backed xarray.Dataset.
+
+    Parameters: grid      - xarray.Dataset/DataArray, with the regularly spaced 1D coordinates
+                            of latitude/longitude in degrees, at the pixel centers
+                times     - 1D np.ndarray in datetime64 or list of datetime.datetime objects, in UTC,
+                            or xarray.DataArray of them, whose dimension name is used for time
+                step_size - float, coarse grid step in meters, 0 for the full resolution
+                chunks    - dict, chunk sizes by dimension name, default: 1 for time and
+                            1024 for lat/lon, with any missing one from the default
+                lat/lon   - str, name of the latitude/longitude coordinates in grid
+                backend   - str, fortran or numpy, see pysolid.utils.get_backend()
+                ephemeris - pysolid.ephemeris.Ephemeris, precomputed Sun/Moon ephemeris table
+    Returns:    ds        - xarray.Dataset with tide_e/tide_n/tide_u in (time, lat, lon), in meters
+    Examples:   grid = xr.Dataset(coords={'lat': np.arange(43, 30, -0.01), 'lon': np.arange(-126, -113, 0.01)})
+                times = np.arange('2020-01-01', '2021-01-01', 12, dtype='datetime64[D]')
+                ds = calc_solid_earth_tides_dataset(grid, times)
+                # LOS, computed for the subset only
+                tide_los = pysolid.utils.enu2los(ds.tide_e, ds.tide_n, ds.tide_u, 34, -102)
+                tide_los.isel(time=0, lat=slice(0, 100)).compute()
+    """
+    import dask.array as da
+    import xarray as xr
+
+    solid = get_backend(backend)
+
+    # time
+    time_dim = times.dims[0] if isinstance(times, xr.DataArray) else 'time'
+    times = np.atleast_1d(np.asarray(times))
+    if not np.issubdtype(times.dtype, np.datetime64):
+        times = times.astype('datetime64[us]')
+    if times.ndim != 1:
+        raise ValueError(f'Input times should be 1D, got shape of {times.shape}!')
+    mjd, fmjd = datetime2mjd(times)
+
+    # location
+    lats = np.asarray(grid[lat].values, dtype=np.float64)
+    lons = np.asarray(grid[lon].values, dtype=np.float64)
+    if grid[lat].ndim != 1 or grid[lon].ndim != 1:
+        raise ValueError('Input lat/lon coordinates should be 1D!')
+    lat_dim, lon_dim = grid[lat].dims[0], grid[lon].dims[0]
+    lat_step = get_step(lats, lat)
+    lon_step = get_step(lons, lon)
+    shape = (times.size, lats.size, lons.size)
+
+    # coarse nodes every num_step pixels, as in get_coarse_grid()
+    num_step = max(1, int(step_size / 108e3 / abs(lat_step))) if lat_step != 0 else 1
+
+    # chunks
+    chunks = dict(chunks or {})
+    chunk_sizes = [chunks.get(time_dim, 1), chunks.get(lat_dim, 1024), chunks.get(lon_dim, 1024)]
+    chunk_sizes = da.core.normalize_chunks(tuple(chunk_sizes), shape=shape, dtype=np.float64)
+
+    def calc_block(block_info=None):
+        (t0, t1), (y0, y1), (x0, x1) = block_info[None]['array-location'][1:]
+        enu = calc_block_grid(solid, mjd[t0:t1], fmjd[t0:t1],
+                              lats[0], lat_step, y0, y1,
+                              lons[0], lon_step, x0, x1,
+                              num_step=num_step, ephemeris=ephemeris)
+        return np.stack(enu)
+
+    # one task per chunk for all 3 components
+    enu = da.map_blocks(
+        calc_block,
+        chunks=((3,),) + chunk_sizes,
+        dtype=np.float64,
+        meta=np.array((), dtype=np.float64),
+        name='pysolid-set',
+    )
+
+    # output
+    dims = (time_dim, lat_dim, lon_dim)
+    coords = {time_dim: times}
+    for name, coord in grid.coords.items():
+        if set(coord.dims) <= {lat_dim, lon_dim}:
+            coords[name] = coord
+    ds = xr.Dataset(coords=coords)
+    for i, direction in enumerate(['east', 'north', 'up']):
+        ds[f'tide_{direction[0]}'] = xr.DataArray(enu[i], dims=dims, attrs={
+            'long_name': f'solid Earth tides in {direction} direction',
+            'units': 'm',
+        })
+    ds.attrs['step_size'] = float(step_size)
+    return ds
+
+
+def calc_block_grid(solid, mjd, fmjd, lat0, lat_step, y0, y1, lon0, lon_step, x0, x1, num_step=1,
+                    ephemeris=None):
+    """Calculate SET for the block of rows y0:y1 and columns x0:x1 of a regular grid.
+
+    Parameters: solid     - module, see pysolid.utils.get_backend()
+                mjd/fmjd  - 1D np.ndarray, modified julian day (and fraction) in UTC
+                lat0/lat_step - float, latitude  of the first row    and the step in degrees
+                lon0/lon_step - float, longitude of the first column and the step in degrees
+                y0/y1/x0/x1   - int, rows/columns of the block
+                num_step  - int, number of pixels per coarse grid step, 1 for the full resolution
+                ephemeris - pysolid.ephemeris.Ephemeris, precomputed Sun/Moon ephemeris table
+    Returns:    tide_e/n/u - 3D np.ndarray in (n_epoch, y1-y0, x1-x0), SET in east/north/up in m
+    """
+    if num_step == 1:
+        return calc_grid_kern(solid, mjd, fmjd,
+                              lat0 + y0 * lat_step, lat_step, y1 - y0,
+                              lon0 + x0 * lon_step, lon_step, x1 - x0,
+                              ephemeris=ephemeris)
+
+    # coarse nodes covering the block, possibly beyond the last pixel
+    k0, k1 = y0 // num_step, (y1 - 1) // num_step + 2
+    m0, m1 = x0 // num_step, (x1 - 1) // num_step + 2
+    enu = calc_grid_kern(solid, mjd, fmjd,
+                         lat0 + k0 * num_step * lat_step, num_step * lat_step, k1 - k0,
+                         lon0 + m0 * num_step * lon_step, num_step * lon_step, m1 - m0,
+                         ephemeris=ephemeris)
+
+    # linear interpolation along the columns, then along the rows
+    i0, i1, wy = get_linear_weights(np.arange(k0, k1) * num_step, np.arange(y0, y1))
+    j0, j1, wx = get_linear_weights(np.arange(m0, m1) * num_step, np.arange(x0, x1))
+    wy = wy[:, np.newaxis]
+    out = []
+    for data in enu:
+        data_x = data[:, :, j0] * (1. - wx) + data[:, :, j1] * wx
+        out.append(data_x[:, i0] * (1. - wy) + data_x[:, i1] * wy)
+    return out
+
+
+def get_step(coord, name):
+    """Get the step of a regularly spaced 1D coordinate."""
+    if coord.size < 2:
+        return 0.
+    diff = np.diff(coord)
+    if not np.allclose(diff, diff[0], rtol=1e-6, atol=0):
+        raise ValueError(f'Input {name} coordinate should be regularly spaced!')
+    return float(coord[-1] - coord[0]) / (coord.size - 1)
@@ -9,94 +9,933 @@
 # Recommend usage:
 #   import pysolid
 #   pysolid.calc_solid_earth_tides_grid()
+#   pysolid.calc_solid_earth_tides_grid_latlon()
 
 
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
-from scipy import ndimage
+
+from pysolid import cache, resample
+from pysolid.ephemeris import calc_epochs
+from pysolid.profiler import log_verbose, stage
+from pysolid.resample import get_linear_weights
+from pysolid.utils import datetime2mjd, enu2los, get_backend, warn_leap_second
+
+
+logger = logging.getLogger(__name__)
+
+# height step in meters of the finite difference for the height correction, see get_height_rows()
+HEIGHT_STEP = 1e3
+
+# max spacing in seconds of the epochs to interpolate SET linearly in time from, for per-row/pixel
+# times, with the interpolation error below 1e-7 m, see get_time_nodes()
+TIME_STEP = 10.
 
 
 ##################################  Earth tides - grid mode  ###################################
-def calc_solid_earth_tides_grid(dt_obj, atr, step_size=1e3, display=False, verbose=True):
-    """Calculate SET in east/north/up direction for a spatial grid at a given date/time.
+@log_verbose
+def calc_solid_earth_tides_grid(dt_obj, atr, step_size=1e3, display=False, verbose=True,
+                                backend='fortran', n_workers=1, inc_angle=None, az_angle=None,
+                                tolerance=None, out=None, cache_dir=None, ephemeris=None, height=None,
+                                time_offset=None, order=1):
+    """Calculate SET in east/north/up (or LOS) direction for a spatial grid at a given date/time.
+
+    Note that we use step_size to speedup the calculation, by feeding the Fortran code the coarse
+    grid, then resize the output to the same shape as the original input size. This uses the fact
+    that SET varies slowly in space. Comparison w and w/o step_size shows a difference in tide_u
+    with max of 5e-8 m, thus negligible. The Sun/Moon ephemeris is computed once per call, thus the
+    cost is dominated by the per-pixel station terms; set step_size=0 for the full resolution.
+
+    Alternatively, set tolerance to choose the coarsest grid adaptively with the linear interpolation
+    error within tolerance, see calc_coarse_grid_adaptive(); step_size is ignored then.
+
+    If inc_angle/az_angle are given, SET is projected onto LOS and returned as a single array. With
+    scalar angles, the projection is done on the coarse grid before resizing, to save memory and time.
+
+    The output is resized (or calculated, for the full resolution) and written in blocks of rows,
+    thus with out given, e.g. as np.memmap or HDF5 datasets, the memory usage is bounded and
+    independent of the grid size, see write_grid_blocks().
+
+    With cache_dir given, the coarse grid is cached on disk and read back for the same inputs in
+    later runs, thus only the resizing is repeated, see pysolid.cache. The full resolution is not
+    cached.
+
+    The run time of the stages, i.e. the date/time conversion, the kernel, the resizing and the
+    cache, is recorded within pysolid.profiler.profile(), see pysolid.profiler.
+
+    The ellipsoidal height of the stations is 0 by default. A scalar height is applied in the
+    kernel directly. For a 2D height, e.g. a DEM, SET and its derivative w.r.t. the height are
+    calculated on the coarse grid and resized, then combined with the height of each pixel, thus
+    the coarse grid is kept, see get_height_rows(). Note that the height changes SET only via the
+    geocentric latitude of the station, by ~1e-6 m for 5 km.
 
-    Note that we use step_size to speedup >30 times, by feeding the Fortran code (SET calc and
-    text file writing) the coarse grid, then resize the output to the same shape as the original
-    input size. This uses the fact that SET varies slowly in space. Comparison w and w/o step_size
-    shows a difference in tide_u with max of 5e-8 m, thus negligible.
+    The grid is at the same date/time by default. For a varying time, e.g. the azimuth time of a
+    long SAR frame or a stitched multi-burst product, give the time offset per row or per pixel
+    w.r.t. dt_obj. SET is calculated at a few epochs evenly spaced over the time span, TIME_STEP
+    apart, sharing the geodetic terms of the grid, then interpolated in time to the time of each
+    coarse node (or pixel, for the full resolution) before resizing, see get_time_nodes(). SET
+    varies by up to ~0.04 mm per second.
 
-    Parameters: dt_obj    - datetime.datetime object (with precision up to the second)
+    Parameters: dt_obj    - datetime.datetime object (with precision up to the microsecond)
                 atr       - dict, metadata including the following keys:
                                 LENGTH/WIDTTH
                                 X/Y_FIRST
                                 X/Y_STEP
                 step_size - float, grid step feeded into the fortran code in meters
-                                to speedup the calculation
+                                to speedup the calculation, 0 for the full resolution
                 display   - bool, plot the calculated SET
-                verbose   - bool, print verbose message
+                verbose   - bool, log verbose message at INFO level, see profiler.log_verbose()
+                backend   - str, fortran or numpy, see pysolid.utils.get_backend()
+                n_workers - int, number of threads to split the grid rows into, None for all CPUs
+                inc_angle - float or 2D np.ndarray in (length, width), incidence angle in degrees
+                az_angle  - float or 2D np.ndarray in (length, width), azimuth angle in degrees,
+                                see pysolid.utils.enu2los() for the convention
+                tolerance - float, max interpolation error in meters of the adaptive coarse grid, e.g. 1e-6
+                out       - tuple of 3 2D arrays in (length, width) for east/north/up, or
+                                one 2D array for LOS, to write the output into, e.g. np.memmap,
+                                h5py.Dataset or netCDF4.Variable, in any float data type.
+                cache_dir - str, path of the cache directory, None to disable the cache
+                ephemeris - pysolid.ephemeris.Ephemeris, precomputed Sun/Moon ephemeris table
+                                to interpolate from, instead of evaluating the series
+                height    - float or 2D array (np.memmap or h5py.Dataset) in (length, width),
+                                ellipsoidal height in meters, None for 0
+                time_offset - 1D np.ndarray in (length,) or 2D np.ndarray in (length, width),
+                                time offset in seconds (with fractions) of each row/pixel w.r.t. dt_obj,
+                                None for dt_obj only
+                order     - int, 1 for bilinear, 3 for bicubic interpolation from the coarse grid,
+                                see pysolid.resample.get_weights()
     Returns:    tide_e    - 2D np.ndarray, SET in east  direction in meters
                 tide_n    - 2D np.ndarray, SET in north direction in meters
                 tide_u    - 2D np.ndarray, SET in up    direction in meters
+                OR
+                tide_los  - 2D np.ndarray, SET in LOS   direction in meters, if inc/az_angle are given
     Examples:   atr = readfile.read_attribute('geo_velocity.h5')
                 tide_e, tide_n, tide_u = calc_solid_earth_tides_grid('20180219', atr)
-    """
-    try:
-        from pysolid.solid import solid_grid
-    except ImportError:
-        msg = "Cannot import name 'solid' from 'pysolid'!"
-        msg += '\n    Maybe solid.for is NOT compiled yet.'
-        msg += '\n    Check instruction at: https://github.com/insarlab/PySolid.'
-        raise ImportError(msg)
+                tide_los = calc_solid_earth_tides_grid('20180219', atr, inc_angle=34, az_angle=-102)
+
+                # with DEM
+                dem = readfile.read('geo_geometry.h5', datasetName='height')[0]
+                tide_e, tide_n, tide_u = calc_solid_earth_tides_grid('20180219', atr, height=dem)
+
+                # with the azimuth time of each row, e.g. 0.0123 s apart
+                t_az = np.arange(length) * 0.0123
+                tide_e, tide_n, tide_u = calc_solid_earth_tides_grid(dt_obj, atr, time_offset=t_az)
 
-    vprint = print if verbose else lambda *args, **kwargs: None
+                # write into HDF5 datasets
+                with h5py.File('SET.h5', 'w') as f:
+                    out = [f.create_dataset(x, shape=(length, width), dtype='f4') for x in ['east', 'north', 'up']]
+                    calc_solid_earth_tides_grid(dt_obj, atr, out=out)
+    """
+    solid = get_backend(backend)
+    func = 'calc_solid_earth_tides_grid'
 
     # location
     lat0 = float(atr['Y_FIRST'])
     lon0 = float(atr['X_FIRST'])
     lat1 = lat0 + float(atr['Y_STEP']) * int(atr['LENGTH'])
     lon1 = lon0 + float(atr['X_STEP']) * int(atr['WIDTH'])
+    out_shape = (int(atr['LENGTH']), int(atr['WIDTH']))
+    eht, dem = split_height(height, out_shape)
+    time_offset = split_time(time_offset, out_shape)
+
+    logger.info('PYSOLID: ----------------------------------------')
+    logger.info('PYSOLID: datetime: {}'.format(dt_obj.isoformat()))
+    logger.info('PYSOLID: SNWE: {}'.format((lat1, lat0, lon0, lon1)))
+
+    ## calc solid Earth tides
+    with stage(func, 'time'):
+        mjd, fmjd, t_nodes = get_time_nodes(dt_obj, time_offset)
+    if t_nodes is not None:
+        logger.info('PYSOLID: time offset: [{:.3f}, {:.3f}] s, number of epochs: {}'.format(
+            t_nodes[0], t_nodes[-1], t_nodes.size))
+    data = None
+    if cache_dir is not None:
+        with stage(func, 'cache'):
+            kwargs = dict(time_offset=time_offset) if time_offset is not None else {}
+            if ephemeris is not None:
+                kwargs['ephemeris'] = ephemeris
+            cache_key = cache.get_key('grid', mjd=mjd, fmjd=fmjd,
+                                      grid=(lat0, float(atr['Y_STEP']), out_shape[0],
+                                            lon0, float(atr['X_STEP']), out_shape[1]),
+                                      step_size=None if tolerance is not None else step_size,
+                                      tolerance=tolerance, backend=backend,
+                                      height=eht if dem is None else 'grid', **kwargs)
+            data = cache.load(cache_dir, cache_key)
+
+    enu_dh = None
+    if data is not None:
+        logger.info(f'PYSOLID: read coarse grid from cache: {cache_key}')
+        enu, ys, xs = list(data['enu']), data['ys'], data['xs']
+        if dem is not None:
+            enu_dh = list(data['enu_dh'])
+        full_res = False
+
+    elif tolerance is not None:
+        # adaptive coarse grid
+        logger.info('SOLID  : calculate solid Earth tides in east/north/up direction')
+        with stage(func, 'kernel'):
+            # the coarse grid is chosen at the first epoch, as SET varies in time slowly
+            enu, ys, xs = calc_coarse_grid_adaptive(solid, mjd[:1], fmjd[:1], atr, tolerance,
+                                                    n_workers=n_workers, verbose=verbose,
+                                                    ephemeris=ephemeris, eht=eht)[:3]
+            kwargs = dict(n_workers=n_workers, ephemeris=ephemeris, t_nodes=t_nodes,
+                          time_offset=sample_time(time_offset, ys, xs) if t_nodes is not None else None)
+            if t_nodes is not None:
+                enu = calc_grid_nodes(solid, mjd, fmjd, atr, ys, xs, eht=eht, **kwargs)
+            if dem is not None:
+                enu_h = calc_grid_nodes(solid, mjd, fmjd, atr, ys, xs, eht=eht + HEIGHT_STEP, **kwargs)
+                enu_dh = get_height_gradient(enu, enu_h)
+        full_res = False
+
+    else:
+        # coarse grid given the step size
+        num_step, length, width, lat_step, lon_step = get_coarse_grid(atr, step_size)
+        logger.info('SOLID  : calculate solid Earth tides in east/north/up direction')
+        logger.info('SOLID  : shape: {s}, step size: {la:.4f} by {lo:.4f} deg'.format(
+            s=(length, width), la=lat_step, lo=lon_step))
+
+        full_res = num_step == 1
+        if not full_res:
+            # positions of the coarse pixels in the full grid, as in ndimage.zoom(grid_mode=True)
+            ys = resample.get_zoom_positions(length, out_shape[0])
+            xs = resample.get_zoom_positions(width,  out_shape[1])
+            time_c = sample_time(time_offset, ys, xs) if t_nodes is not None else None
+            kwargs = dict(n_workers=n_workers, ephemeris=ephemeris)
+            with stage(func, 'kernel'):
+                enu = calc_grid_kern_time(solid, mjd, fmjd, t_nodes, time_c, lat0, lat_step, length,
+                                          lon0, lon_step, width, eht=eht, **kwargs)
+                if dem is not None:
+                    enu_h = calc_grid_kern_time(solid, mjd, fmjd, t_nodes, time_c, lat0, lat_step, length,
+                                                lon0, lon_step, width, eht=eht + HEIGHT_STEP, **kwargs)
+                    enu_dh = get_height_gradient(enu, enu_h)
+
+    if cache_dir is not None and data is None and not full_res:
+        with stage(func, 'cache'):
+            kwargs = dict(enu_dh=np.stack(enu_dh)) if dem is not None else {}
+            cache.save(cache_dir, cache_key, enu=np.stack(enu), ys=ys, xs=xs, **kwargs)
+
+    if full_res:
+        # calculate at the full resolution block by block
+        lat_step, lon_step = float(atr['Y_STEP']), float(atr['X_STEP'])
+        def calc_rows(r0, r1, eht):
+            return calc_grid_kern_time(solid, mjd, fmjd, t_nodes,
+                                       time_offset[r0:r1] if t_nodes is not None else None,
+                                       lat0 + r0 * lat_step, lat_step, r1 - r0,
+                                       lon0, lon_step, out_shape[1], n_workers=n_workers,
+                                       ephemeris=ephemeris, eht=eht)
+
+        def get_rows(r0, r1):
+            enu = calc_rows(r0, r1, eht)
+            if dem is not None:
+                enu_dh = get_height_gradient(enu, calc_rows(r0, r1, eht + HEIGHT_STEP))
+                dem_rows = np.asarray(dem[r0:r1], dtype=np.float64)
+                enu = [data + dem_rows * data_dh for data, data_dh in zip(enu, enu_dh)]
+            return enu
+    else:
+        # resize to the input size
+        logger.info('PYSOLID: resize data to the shape of {} using {} interpolation'.format(
+            out_shape, 'linear' if order == 1 else 'cubic'))
+        plan = resample.get_plan(ys, xs, out_shape, order=order)
+        get_rows = get_interp_rows(enu, plan, inc_angle, az_angle)
+        if dem is not None:
+            get_rows_dh = get_interp_rows(enu_dh, plan, inc_angle, az_angle)
+            get_rows = get_height_rows(get_rows, get_rows_dh, dem)
+
+    # write block by block
+    los = inc_angle is not None or az_angle is not None
+    if los:
+        logger.info('PYSOLID: project to line-of-sight direction')
+    # the kernel is called block by block within, for the full resolution
+    with stage(func, 'kernel' if full_res else 'resample'):
+        out = write_grid_blocks(get_rows, out_shape, out=out, inc_angle=inc_angle, az_angle=az_angle)
+    if los:
+        return out
+
+    # plot
+    tide_e, tide_n, tide_u = out
+    if display:
+        plot_solid_earth_tides_grid(tide_e, tide_n, tide_u, dt_obj)
+
+    return tide_e, tide_n, tide_u
+
+
+@log_verbose
+def calc_solid_earth_tides_grid_stack(dt_list, atr, step_size=1e3, out=None, verbose=True,
+                                      backend='fortran', n_workers=1, ephemeris=None, order=1,
+                                      dtype=np.float64):
+    """Calculate SET in east/north/up direction for a spatial grid at multiple dates/times.
+
+    The Sun/Moon ephemeris is computed once per epoch, the geodetic terms of the grid once for all
+    epochs, within one Fortran call. All epochs and components share the same coarse grid and
+    resampling plan, computed once, as in calc_solid_earth_tides_grid(), see pysolid.resample.
+
+    Parameters: dt_list   - list of datetime.datetime objects or 1D np.ndarray in datetime64
+                atr       - dict, metadata including the following keys:
+                                LENGTH/WIDTTH
+                                X/Y_FIRST
+                                X/Y_STEP
+                step_size - float, grid step feeded into the fortran code in meters
+                                to speedup the calculation, 0 for the full resolution
+                out       - tuple of 3 np.ndarray (or np.memmap) in (n_epoch, length, width),
+                                to write tide_e/n/u into, e.g. to save memory or use float32.
+                verbose   - bool, log verbose message at INFO level, see profiler.log_verbose()
+                backend   - str, fortran or numpy, see pysolid.utils.get_backend()
+                n_workers - int, number of threads to split the grid rows into, None for all CPUs
+                ephemeris - pysolid.ephemeris.Ephemeris, precomputed Sun/Moon ephemeris table
+                                to interpolate from, instead of evaluating the series
+                order     - int, 1 for bilinear, 3 for bicubic interpolation from the coarse grid
+                dtype     - np.dtype, data type of the output if out is None, e.g. np.float32 to
+                                halve the memory usage and bandwidth of the resampling
+    Returns:    tide_e    - 3D np.ndarray in (n_epoch, length, width), SET in east  direction in meters
+                tide_n    - 3D np.ndarray in (n_epoch, length, width), SET in north direction in meters
+                tide_u    - 3D np.ndarray in (n_epoch, length, width), SET in up    direction in meters
+    Examples:   dt_list = [dt.datetime(2020, 12, 13, 14, 7, 44), dt.datetime(2020, 12, 25, 14, 7, 44)]
+                tide_e, tide_n, tide_u = calc_solid_earth_tides_grid_stack(dt_list, atr)
+    """
+    solid = get_backend(backend)
+    func = 'calc_solid_earth_tides_grid_stack'
+
+    # time
+    with stage(func, 'time'):
+        mjd, fmjd = datetime2mjd(dt_list)
+    num_date = mjd.size
+
+    # location
+    lat0 = float(atr['Y_FIRST'])
+    lon0 = float(atr['X_FIRST'])
+    out_shape = (num_date, int(atr['LENGTH']), int(atr['WIDTH']))
+    if out is not None:
+        if len(out) != 3 or any(x.shape != out_shape for x in out):
+            raise ValueError(f'out should be 3 arrays in the shape of {out_shape}!')
 
-    vprint('PYSOLID: ----------------------------------------')
-    vprint('PYSOLID: datetime: {}'.format(dt_obj.isoformat()))
-    vprint('PYSOLID: SNWE: {}'.format((lat1, lat0, lon0, lon1)))
+    logger.info('PYSOLID: ----------------------------------------')
+    logger.info(f'PYSOLID: number of datetimes: {num_date}')
 
     # step size
-    num_step = int(step_size / 108e3 / abs(float(atr['Y_STEP'])))
-    num_step = max(1, num_step)
-    length = np.rint(int(atr['LENGTH']) / num_step - 1e-4).astype(int)
-    width  = np.rint(int(atr['WIDTH'])  / num_step - 1e-4).astype(int)
-    lat_step = float(atr['Y_STEP']) * num_step
-    lon_step = float(atr['X_STEP']) * num_step
-    vprint('SOLID  : calculate solid Earth tides in east/north/up direction')
-    vprint('SOLID  : shape: {s}, step size: {la:.4f} by {lo:.4f} deg'.format(
-        s=(length, width), la=lat_step, lo=lon_step))
+    num_step, length, width, lat_step, lon_step = get_coarse_grid(atr, step_size)
+    logger.info('SOLID  : calculate solid Earth tides in east/north/up direction')
+    logger.info('SOLID  : shape: {s}, step size: {la:.4f} by {lo:.4f} deg'.format(
+        s=(num_date, length, width), la=lat_step, lo=lon_step))
 
     ## calc solid Earth tides
-    tide_e, tide_n, tide_u = solid_grid(dt_obj.year, dt_obj.month, dt_obj.day,
-                                        dt_obj.hour, dt_obj.minute, dt_obj.second,
-                                        lat0, lat_step, length,
-                                        lon0, lon_step, width)
+    with stage(func, 'kernel'):
+        enu = calc_grid_kern(solid, mjd, fmjd, lat0, lat_step, length, lon0, lon_step, width,
+                             n_workers=n_workers, ephemeris=ephemeris)
 
-    # resample to the input size
-    # via scipy.ndimage.zoom or skimage.transform.resize
+    # resample to the input size, using the same resampling plan for all epochs
     if num_step > 1:
-        in_shape = tide_e.shape
-        out_shape = (int(atr['LENGTH']), int(atr['WIDTH']))
-        vprint('PYSOLID: resize data to the shape of {} using order-1 spline interpolation'.format(out_shape))
+        logger.info('PYSOLID: resize data to the shape of {} using {} interpolation'.format(
+            out_shape, 'linear' if order == 1 else 'cubic'))
+        with stage(func, 'resample'):
+            ys = resample.get_zoom_positions(length, out_shape[1])
+            xs = resample.get_zoom_positions(width,  out_shape[2])
+            plan = resample.get_plan(ys, xs, out_shape[1:], order=order)
+            if out is None:
+                out = [np.empty(out_shape, dtype=dtype) for _ in range(3)]
+            for data, out_data in zip(enu, out):
+                resample.resample(data, plan, out=out_data)
+
+    elif out is not None:
+        with stage(func, 'copy'):
+            for data, out_data in zip(enu, out):
+                out_data[:] = data
+
+    else:
+        out = [x.astype(dtype, copy=False) for x in enu]
+
+    tide_e, tide_n, tide_u = out
+    return tide_e, tide_n, tide_u
+
+
+@log_verbose
+def calc_solid_earth_tides_grid_latlon(dt_obj, lat, lon, step_size=1e3, display=False, verbose=True,
+                                       backend='fortran', inc_angle=None, az_angle=None, out=None,
+                                       height=None, time_offset=None):
+    """Calculate SET in east/north/up direction for a grid with per-pixel lat/lon at a given date/time.
+
+    This is for grids not regular in lat/lon, e.g. in radar coordinates with 2D lat/lon lookup tables.
+    Similar to calc_solid_earth_tides_grid(), SET is calculated on a subset of pixels decimated by
+    step_size (plus the last row/column), then interpolated back to the full resolution linearly in
+    the row/column index space. Pixels with NaN in lat/lon result in NaN. If inc_angle/az_angle are
+    given, SET is projected onto LOS and returned as a single array. The output is written in blocks
+    of rows into out if given, as in calc_solid_earth_tides_grid().
+
+    The height of each pixel is applied directly at the full resolution, or via the height
+    correction on the decimated pixels otherwise, as in calc_solid_earth_tides_grid(). So is the
+    time offset of each row/pixel, e.g. the azimuth time in radar coordinates.
+
+    Parameters: dt_obj    - datetime.datetime object (with precision up to the microsecond)
+                lat/lon   - 2D np.ndarray (or np.memmap / h5py.Dataset) in (length, width),
+                                latitude/longitude in degrees
+                step_size - float, distance between the decimated pixels in meters,
+                                0 for the full resolution
+                display   - bool, plot the calculated SET
+                verbose   - bool, log verbose message at INFO level, see profiler.log_verbose()
+                backend   - str, fortran or numpy, see pysolid.utils.get_backend()
+                inc_angle - float or 2D np.ndarray in (length, width), incidence angle in degrees
+                az_angle  - float or 2D np.ndarray in (length, width), azimuth angle in degrees,
+                                see pysolid.utils.enu2los() for the convention
+                out       - tuple of 3 2D arrays for east/north/up, or one 2D array for LOS,
+                                to write the output into, see calc_solid_earth_tides_grid()
+                height    - float or 2D np.ndarray (or np.memmap / h5py.Dataset) in (length, width),
+                                ellipsoidal height in meters, None for 0
+                time_offset - 1D np.ndarray in (length,) or 2D np.ndarray in (length, width),
+                                time offset in seconds of each row/pixel w.r.t. dt_obj, None for dt_obj only
+    Returns:    tide_e    - 2D np.ndarray, SET in east  direction in meters
+                tide_n    - 2D np.ndarray, SET in north direction in meters
+                tide_u    - 2D np.ndarray, SET in up    direction in meters
+                OR
+                tide_los  - 2D np.ndarray, SET in LOS   direction in meters, if inc/az_angle are given
+    Examples:   lat = readfile.read('inputs/geometryRadar.h5', datasetName='latitude')[0]
+                lon = readfile.read('inputs/geometryRadar.h5', datasetName='longitude')[0]
+                hgt = readfile.read('inputs/geometryRadar.h5', datasetName='height')[0]
+                tide_e, tide_n, tide_u = calc_solid_earth_tides_grid_latlon(dt_obj, lat, lon, height=hgt)
+    """
+    solid = get_backend(backend)
 
-        enu = np.stack([tide_e, tide_n, tide_u])
-        zoom_factors = [1, *np.divide(out_shape, in_shape)]
-        kwargs = dict(order=1, mode="nearest", grid_mode=True)
-        tide_e, tide_n, tide_u = ndimage.zoom(enu, zoom_factors, **kwargs)
+    func = 'calc_solid_earth_tides_grid_latlon'
+
+    if lat.ndim != 2 or lat.shape != lon.shape:
+        raise ValueError(f'lat/lon should be 2D in the same shape, got {lat.shape} and {lon.shape}!')
+    length, width = lat.shape
+    eht, dem = split_height(height, (length, width))
+    time_offset = split_time(time_offset, (length, width))
+
+    logger.info('PYSOLID: ----------------------------------------')
+    logger.info('PYSOLID: datetime: {}'.format(dt_obj.isoformat()))
+    logger.info('PYSOLID: shape: {}'.format((length, width)))
+
+    ## calc solid Earth tides
+    mjd, fmjd, t_nodes = get_time_nodes(dt_obj, time_offset)
+    if t_nodes is not None:
+        logger.info('PYSOLID: time offset: [{:.3f}, {:.3f}] s, number of epochs: {}'.format(
+            t_nodes[0], t_nodes[-1], t_nodes.size))
+
+    def calc_points(lat_c, lon_c, hgt_c=eht, t_c=0.):
+        lat_c = np.asarray(lat_c, dtype=np.float64)
+        lon_c = np.asarray(lon_c, dtype=np.float64)
+        hgt_c = np.broadcast_to(np.asarray(hgt_c, dtype=np.float64), lat_c.shape)
+        t_c = np.broadcast_to(t_c, lat_c.shape)
+        flag = np.isfinite(lat_c) & np.isfinite(lon_c)
+        enu = np.full((3,) + lat_c.shape, np.nan, dtype=np.float64)
+        if np.any(flag):
+            # output in (3, n_epoch, n_point) in Fortran order
+            tide, lflag = solid.solid_points(lat_c[flag], lon_c[flag], mjd, fmjd, eht=hgt_c[flag])
+            enu[:, flag] = interp_time(list(tide), t_nodes, t_c[flag])
+            if lflag:
+                warn_leap_second()
+        return list(enu)
+
+    # decimated pixels
+    y_step, x_step = get_decimate_steps(lat, lon, step_size)
+    logger.info('SOLID  : calculate solid Earth tides in east/north/up direction')
+    if y_step == 1 and x_step == 1:
+        # calculate at the full resolution block by block
+        def get_rows(r0, r1):
+            hgt_c = eht if dem is None else dem[r0:r1]
+            t_c = 0. if t_nodes is None else time_offset[r0:r1]
+            return calc_points(lat[r0:r1], lon[r0:r1], hgt_c, t_c)
+
+    else:
+        ys = np.unique(np.append(np.arange(0, length, y_step), length - 1))
+        xs = np.unique(np.append(np.arange(0, width,  x_step), width  - 1))
+        logger.info('SOLID  : shape: {s}, step size: {y} by {x} pixels'.format(s=(ys.size, xs.size), y=y_step, x=x_step))
+        with stage(func, 'kernel'):
+            lat_c, lon_c = lat[ys, :][:, xs], lon[ys, :][:, xs]
+            t_c = 0. if t_nodes is None else sample_time(time_offset, ys, xs)
+            enu = calc_points(lat_c, lon_c, t_c=t_c)
+            if dem is not None:
+                enu_dh = get_height_gradient(enu, calc_points(lat_c, lon_c, eht + HEIGHT_STEP, t_c))
+
+        # interpolate to the full resolution
+        logger.info('PYSOLID: interpolate data to the shape of {} using linear interpolation'.format((length, width)))
+        plan = resample.get_plan(ys, xs, (length, width))
+        get_rows = get_interp_rows(enu, plan, inc_angle, az_angle)
+        if dem is not None:
+            get_rows_dh = get_interp_rows(enu_dh, plan, inc_angle, az_angle)
+            get_rows = get_height_rows(get_rows, get_rows_dh, dem)
+
+    # write block by block
+    los = inc_angle is not None or az_angle is not None
+    if los:
+        logger.info('PYSOLID: project to line-of-sight direction')
+    with stage(func, 'kernel' if y_step == 1 and x_step == 1 else 'resample'):
+        out = write_grid_blocks(get_rows, (length, width), out=out, inc_angle=inc_angle, az_angle=az_angle)
+    if los:
+        return out
 
     # plot
+    tide_e, tide_n, tide_u = out
     if display:
         plot_solid_earth_tides_grid(tide_e, tide_n, tide_u, dt_obj)
 
     return tide_e, tide_n, tide_u
 
 
+def calc_grid_kern(solid, mjd, fmjd, lat0, lat_step, length, lon0, lon_step, width, n_workers=1,
+                   ephemeris=None, eht=0.):
+    """Calculate SET for one spatial grid at multiple epochs, in parallel over blocks of rows.
+
+    The epoch terms are computed once via calc_epochs(), then the grid is split into blocks of
+    rows, each fed into grid_kern() in a thread. The Fortran grid_kern() releases the GIL and
+    does not touch any common block, thus scales with the number of cores.
+
+    Parameters: solid     - module, see pysolid.utils.get_backend()
+                mjd/fmjd  - 1D np.ndarray, modified julian day (and fraction) in UTC
+                lat0/lat_step/length - float/float/int, north/step/number of rows    of the grid
+                lon0/lon_step/width  - float/float/int, west /step/number of columns of the grid
+                n_workers - int, number of threads, None for all CPUs
+                ephemeris - pysolid.ephemeris.Ephemeris, precomputed Sun/Moon ephemeris table
+                eht       - float, ellipsoidal height in meters
+    Returns:    tide_e/n/u - 3D np.ndarray in (n_epoch, length, width), SET in east/north/up in m
+    """
+    epo, lflag = calc_epochs(solid, mjd, fmjd, ephemeris)
+    if lflag:
+        warn_leap_second()
+
+    # output in (width, length, num_date) in Fortran order, i.e. (num_date, length, width) in C order
+    enu = np.empty((3, mjd.size, length, width), dtype=np.float64)
+
+    def run_block(i0, i1):
+        data = solid.grid_kern(epo, lat0 + i0 * lat_step, lat_step, i1 - i0, lon0, lon_step, width, eht=eht)
+        for j in range(3):
+            enu[j, :, i0:i1, :] = data[j].T
+
+    run_row_blocks(run_block, length, n_workers)
+    return list(enu)
+
+
+def calc_grid_kern_time(solid, mjd, fmjd, t_nodes, time_offset, lat0, lat_step, length,
+                        lon0, lon_step, width, n_workers=1, ephemeris=None, eht=0.):
+    """Calculate SET for one spatial grid, at the time of each row/pixel, in parallel over blocks of rows.
+
+    The epoch terms are computed once at the epochs via calc_epochs(), then fed into grid_kern_time(),
+    which interpolates them linearly in time to each row/pixel. Thus the station terms, i.e. the bulk
+    of the cost, are computed once per pixel, instead of once per epoch and pixel.
+
+    Parameters: solid       - module, see pysolid.utils.get_backend()
+                mjd/fmjd    - 1D np.ndarray, modified julian day (and fraction) of the epochs in UTC
+                t_nodes     - 1D np.ndarray, time offset of the epochs in seconds, see get_time_nodes()
+                              None for one epoch, i.e. no time offset
+                time_offset - 2D np.ndarray in (length, 1) or (length, width), see split_time()
+                lat0/lat_step/length - float/float/int, north/step/number of rows    of the grid
+                lon0/lon_step/width  - float/float/int, west /step/number of columns of the grid
+                n_workers   - int, number of threads, see calc_grid_kern()
+                ephemeris   - pysolid.ephemeris.Ephemeris, see calc_grid_kern()
+                eht         - float, ellipsoidal height in meters
+    Returns:    tide_e/n/u  - 2D np.ndarray in (length, width), SET in east/north/up in m
+    """
+    if t_nodes is None:
+        return [x[0] for x in calc_grid_kern(solid, mjd, fmjd, lat0, lat_step, length, lon0, lon_step,
+                                             width, n_workers=n_workers, ephemeris=ephemeris, eht=eht)]
+
+    epo, lflag = calc_epochs(solid, mjd, fmjd, ephemeris)
+    if lflag:
+        warn_leap_second()
+
+    # output in (width, length) in Fortran order, i.e. (length, width) in C order
+    enu = np.empty((3, length, width), dtype=np.float64)
+
+    def run_block(i0, i1):
+        data = solid.grid_kern_time(epo, t_nodes, time_offset[i0:i1].T, lat0 + i0 * lat_step, lat_step,
+                                    lon0, lon_step, width, eht=eht)
+        for j in range(3):
+            enu[j, i0:i1, :] = data[j].T
+
+    run_row_blocks(run_block, length, n_workers)
+    return list(enu)
+
+
+def run_row_blocks(run_block, length, n_workers=1):
+    """Run run_block(i0, i1) over the blocks of rows of the grid, in parallel via threads.
+
+    Parameters: run_block - callable, to calculate the rows i0:i1 of the grid in place
+                length    - int, number of rows of the grid
+                n_workers - int, number of threads, None for all CPUs
+    """
+    n_workers = os.cpu_count() if n_workers is None else max(1, int(n_workers))
+    n_workers = min(n_workers, length)
+    if n_workers == 1:
+        run_block(0, length)
+        return
+
+    # split into more blocks than threads for a balanced load
+    num_block = min(length, n_workers * 4)
+    row_bounds = np.linspace(0, length, num_block + 1).astype(int)
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        futures = [executor.submit(run_block, i0, i1) for i0, i1 in zip(row_bounds[:-1], row_bounds[1:])]
+        for future in futures:
+            future.result()
+
+
+def write_grid_blocks(get_rows, shape, out=None, inc_angle=None, az_angle=None, block_pixel=2**20):
+    """Write SET in east/north/up (or LOS) direction block by block of rows.
+
+    Parameters: get_rows    - callable, get_rows(r0, r1) returns a list of 2D np.ndarray of rows r0:r1,
+                                  3 of them for east/north/up or 1 for LOS (projected already)
+                shape       - tuple of 2 int, output shape in (length, width)
+                out         - tuple of 3 2D arrays for east/north/up, or one 2D array for LOS,
+                                  any object supporting slice assignment, e.g. np.memmap or h5py.Dataset,
+                                  None to allocate np.ndarray in float64
+                inc_angle   - float or 2D array (np.memmap or h5py.Dataset) in shape, incidence angle in degrees
+                az_angle    - float or 2D array (np.memmap or h5py.Dataset) in shape, azimuth angle in degrees
+                block_pixel - int, approximate number of pixels per block
+    Returns:    out         - list of 3 2D arrays for east/north/up, or one 2D array for LOS
+    """
+    length, width = shape
+    los = inc_angle is not None or az_angle is not None
+    if los and (inc_angle is None or az_angle is None):
+        raise ValueError('Both inc_angle and az_angle are required for LOS projection!')
+
+    # output
+    num_out = 1 if los else 3
+    if out is None:
+        out = [np.empty(shape, dtype=np.float64) for _ in range(num_out)]
+    elif los:
+        out = [out]
+    if len(out) != num_out or any(tuple(x.shape) != tuple(shape) for x in out):
+        raise ValueError(f'out should be {num_out} array(s) in the shape of {shape}!')
+
+    block_size = max(1, int(block_pixel // max(width, 1)))
+    for r0 in range(0, length, block_size):
+        r1 = min(r0 + block_size, length)
+        rows = get_rows(r0, r1)
+        if los and len(rows) == 3:
+            inc = inc_angle if np.ndim(inc_angle) == 0 else inc_angle[r0:r1]
+            az = az_angle if np.ndim(az_angle) == 0 else az_angle[r0:r1]
+            rows = [enu2los(*rows, inc, az)]
+        for data, out_data in zip(rows, out):
+            out_data[r0:r1] = data
+
+    return out[0] if los else out
+
+
+def get_interp_rows(data_list, plan, inc_angle=None, az_angle=None):
+    """Get a function to resample data from the coarse grid to rows of the full grid.
+
+    The resampling is separable, first along the columns, then along the rows, for the coarse
+    rows covering the requested rows only, see pysolid.resample. For scalar inc/az_angle, data is
+    projected onto LOS first, thus only one array is resampled.
+
+    Parameters: data_list - list of 2D np.ndarray on the coarse grid, e.g. SET in east/north/up
+                plan      - pysolid.resample.Plan, from the coarse grid to the full grid,
+                            shared by all arrays in data_list, see pysolid.resample.get_plan()
+                inc_angle - float, incidence angle in degrees, to project data onto LOS
+                az_angle  - float, azimuth angle in degrees, to project data onto LOS
+    Returns:    get_rows  - callable, get_rows(r0, r1) returns a list of 2D np.ndarray of rows r0:r1
+    """
+    if np.ndim(inc_angle) == 0 and np.ndim(az_angle) == 0 and inc_angle is not None and az_angle is not None:
+        data_list = [enu2los(*data_list, inc_angle, az_angle)]
+
+    def get_rows(r0, r1):
+        return [resample.resample_rows(data, plan, r0, r1) for data in data_list]
+
+    return get_rows
+
+
+@log_verbose
+def calc_coarse_grid_adaptive(solid, mjd, fmjd, atr, tolerance, n_workers=1, num_check=16, verbose=True,
+                              ephemeris=None, eht=0.):
+    """Calculate SET on the coarsest grid with the linear interpolation error within tolerance.
+
+    The coarse grid covers the first/last rows/columns of the input grid, thus no extrapolation is
+    needed. Its step in meters is the same along both axes, with the longitude shrinkage at the
+    latitude closest to the equator. Starting from 100 km, the step is refined until the max error
+    of the linear interpolation, checked against the exact SET at up to num_check x num_check pixels
+    in the middle between the coarse nodes (where the error is the largest), is within tolerance.
+
+    Parameters: solid     - module, see pysolid.utils.get_backend()
+                mjd/fmjd  - 1D np.ndarray of size 1, modified julian day (and fraction) in UTC
+                atr       - dict, metadata including LENGTH/WIDTH and X/Y_FIRST/STEP
+                tolerance - float, max interpolation error in meters
+                n_workers - int, number of threads, see calc_grid_kern()
+                num_check - int, max number of rows/columns of the check pixels
+                verbose   - bool, log verbose message at INFO level, see profiler.log_verbose()
+                ephemeris - pysolid.ephemeris.Ephemeris, see calc_grid_kern()
+                eht       - float, ellipsoidal height in meters
+    Returns:    enu       - list of 3 2D np.ndarray, SET in east/north/up direction on the coarse grid
+                ys/xs     - 1D np.ndarray in float, row/column indices of the coarse grid nodes
+                max_err   - float, max interpolation error in meters at the check pixels
+    """
+    length, width = int(atr['LENGTH']), int(atr['WIDTH'])
+    lat0, lat_step = float(atr['Y_FIRST']), float(atr['Y_STEP'])
+    lon0, lon_step = float(atr['X_FIRST']), float(atr['X_STEP'])
+
+    # pixel spacing in meters, with the longitude shrinkage at the latitude closest to the equator
+    lat1 = lat0 + lat_step * (length - 1)
+    min_abs_lat = 0. if lat0 * lat1 <= 0 else min(abs(lat0), abs(lat1))
+    y_spacing = 108e3 * abs(lat_step)
+    x_spacing = 108e3 * abs(lon_step) * np.cos(np.deg2rad(min_abs_lat))
+
+    def get_nodes(num, num_pixel):
+        # coarse nodes every num_pixel pixels, covering the first and last pixel
+        if num_pixel <= 1 or num <= 2:
+            return np.arange(num, dtype=np.float64)
+        num_node = min(num, int(np.ceil((num - 1) / num_pixel)) + 1)
+        return np.linspace(0, num - 1, num_node)
+
+    def get_check_pixels(nodes, num):
+        # pixels in the middle of the coarse nodes, at most num_check of them
+        mid = np.unique(np.rint((nodes[:-1] + nodes[1:]) / 2).astype(int))
+        if mid.size > num_check:
+            mid = mid[np.linspace(0, mid.size - 1, num_check).astype(int)]
+        return mid
+
+    step = 100e3
+    while True:
+        ys = get_nodes(length, step / y_spacing)
+        xs = get_nodes(width,  step / x_spacing)
+        enu = calc_grid_nodes(solid, mjd, fmjd, atr, ys, xs, n_workers=n_workers,
+                              ephemeris=ephemeris, eht=eht)
+
+        # full resolution, no interpolation
+        if ys.size == length and xs.size == width:
+            max_err = 0.
+            break
+
+        # interpolation error at the check pixels
+        y_chk = get_check_pixels(ys, length)
+        x_chk = get_check_pixels(xs, width)
+        lat_chk, lon_chk = np.meshgrid(lat0 + lat_step * y_chk, lon0 + lon_step * x_chk, indexing='ij')
+        enu_chk = solid.solid_points(lat_chk.ravel(), lon_chk.ravel(), mjd, fmjd,
+                                     eht=np.full(lat_chk.size, eht))[0][:, 0, :]
+
+        i0, i1, wy = get_linear_weights(ys, y_chk)
+        j0, j1, wx = get_linear_weights(xs, x_chk)
+        wy, wx = wy[:, np.newaxis], wx[np.newaxis, :]
+        max_err = 0.
+        for data, data_chk in zip(enu, enu_chk):
+            data_int = ((1. - wy) * ((1. - wx) * data[i0][:, j0] + wx * data[i0][:, j1])
+                        +      wy * ((1. - wx) * data[i1][:, j0] + wx * data[i1][:, j1]))
+            max_err = max(max_err, np.abs(data_int.ravel() - data_chk).max())
+
+        logger.info(f'SOLID  : step size: {step:.0f} m, shape: {(ys.size, xs.size)}, max error: {max_err:.2e} m')
+        if max_err <= tolerance:
+            break
+
+        # error of linear interpolation is proportional to the squared step
+        step *= min(0.5, 0.9 * np.sqrt(tolerance / max_err))
+
+    y_step = (ys[1] - ys[0]) if ys.size > 1 else 1.
+    x_step = (xs[1] - xs[0]) if xs.size > 1 else 1.
+    logger.info('SOLID  : coarse grid shape: {s}, step size: {y:.1f} by {x:.1f} pixels, max error: {e:.2e} m'.format(
+        s=(ys.size, xs.size), y=y_step, x=x_step, e=max_err))
+    return enu, ys, xs, max_err
+
+
+def calc_grid_nodes(solid, mjd, fmjd, atr, ys, xs, n_workers=1, ephemeris=None, eht=0.,
+                    t_nodes=None, time_offset=None):
+    """Calculate SET at the regularly spaced nodes of the grid, e.g. from calc_coarse_grid_adaptive().
+
+    Parameters: solid       - module, see pysolid.utils.get_backend()
+                mjd/fmjd    - 1D np.ndarray, modified julian day (and fraction) in UTC,
+                              of size 1, or of the epochs from get_time_nodes()
+                atr         - dict, metadata including X/Y_FIRST/STEP
+                ys/xs       - 1D np.ndarray, regularly spaced row/column indices of the nodes, from 0
+                n_workers   - int, number of threads, see calc_grid_kern()
+                ephemeris   - pysolid.ephemeris.Ephemeris, see calc_grid_kern()
+                eht         - float, ellipsoidal height in meters
+                t_nodes     - 1D np.ndarray, time offset of the epochs in seconds, see calc_grid_kern_time()
+                time_offset - 2D np.ndarray, time offset of the nodes in seconds, see calc_grid_kern_time()
+    Returns:    enu         - list of 3 2D np.ndarray in (ys.size, xs.size), SET in east/north/up
+    """
+    y_step = (ys[1] - ys[0]) if ys.size > 1 else 1.
+    x_step = (xs[1] - xs[0]) if xs.size > 1 else 1.
+    return calc_grid_kern_time(solid, mjd, fmjd, t_nodes, time_offset,
+                               float(atr['Y_FIRST']), float(atr['Y_STEP']) * y_step, ys.size,
+                               float(atr['X_FIRST']), float(atr['X_STEP']) * x_step, xs.size,
+                               n_workers=n_workers, ephemeris=ephemeris, eht=eht)
+
+
+def get_coarse_grid(atr, step_size=1e3):
+    """Get the coarse grid fed into the Fortran code given the step size in meters.
+
+    Parameters: atr       - dict, metadata including LENGTH/WIDTH and X/Y_STEP
+                step_size - float, grid step in meters, 0 for the full resolution
+    Returns:    num_step  - int, number of pixels per coarse grid step
+                length    - int, number of rows    of the coarse grid
+                width     - int, number of columns of the coarse grid
+                lat_step  - float, latitude  step of the coarse grid in degrees
+                lon_step  - float, longitude step of the coarse grid in degrees
+    """
+    num_step = int(step_size / 108e3 / abs(float(atr['Y_STEP'])))
+    num_step = max(1, num_step)
+    length = np.rint(int(atr['LENGTH']) / num_step - 1e-4).astype(int)
+    width  = np.rint(int(atr['WIDTH'])  / num_step - 1e-4).astype(int)
+    lat_step = float(atr['Y_STEP']) * num_step
+    lon_step = float(atr['X_STEP']) * num_step
+    return num_step, length, width, lat_step, lon_step
+
+
+def get_decimate_steps(lat, lon, step_size=1e3):
+    """Get the decimation steps in rows/columns given the step size in meters for 2D lat/lon.
+
+    The pixel spacing is estimated from the neighboring pixels around the center, using the same
+    approximation of 108 km per degree as in get_coarse_grid().
+
+    Parameters: lat/lon   - 2D np.ndarray (or np.memmap), latitude/longitude in degrees
+                step_size - float, step size in meters, 0 for the full resolution
+    Returns:    y_step    - int, number of rows    per step
+                x_step    - int, number of columns per step
+    """
+    length, width = lat.shape
+    if step_size <= 0 or length < 2 or width < 2:
+        return 1, 1
+
+    # a small window at the center
+    y0, y1 = max(0, length // 2 - 5), min(length, length // 2 + 6)
+    x0, x1 = max(0, width  // 2 - 5), min(width,  width  // 2 + 6)
+    lat_w = np.asarray(lat[y0:y1, x0:x1], dtype=np.float64)
+    lon_w = np.asarray(lon[y0:y1, x0:x1], dtype=np.float64)
+
+    def pixel_spacing(dlat, dlon):
+        # wrap the longitude difference across the dateline
+        dlon = (dlon + 180.) % 360. - 180.
+        coslat = np.cos(np.deg2rad(lat_w[:dlat.shape[0], :dlat.shape[1]]))
+        dist = 108e3 * np.hypot(dlat, dlon * coslat)
+        return np.nanmedian(dist) if np.any(np.isfinite(dist)) else np.nan
+
+    y_spacing = pixel_spacing(np.diff(lat_w, axis=0), np.diff(lon_w, axis=0))
+    x_spacing = pixel_spacing(np.diff(lat_w, axis=1), np.diff(lon_w, axis=1))
+    steps = []
+    for spacing in [y_spacing, x_spacing]:
+        if np.isfinite(spacing) and spacing > 0:
+            steps.append(max(1, int(step_size / spacing)))
+        else:
+            steps.append(1)
+    return tuple(steps)
+
+
+def split_height(height, shape):
+    """Split the input height into the scalar one applied in the kernel and the 2D one.
+
+    Parameters: height - None, float or 2D array in shape, ellipsoidal height in meters
+                shape  - tuple of 2 int, shape of the grid in (length, width)
+    Returns:    eht    - float, height applied in the kernel
+                dem    - 2D array in shape, height applied via get_height_rows(), or None
+    """
+    if height is None:
+        return 0., None
+    if np.ndim(height) == 0:
+        return float(height), None
+    if tuple(height.shape) != tuple(shape):
+        raise ValueError(f'height should be a scalar or 2D array in the shape of {shape}, got {height.shape}!')
+    return 0., height
+
+
+def get_height_gradient(enu, enu_h):
+    """Get the derivative of SET w.r.t. the height, by the finite difference over HEIGHT_STEP.
+
+    Parameters: enu    - list of np.ndarray, SET at the reference height
+                enu_h  - list of np.ndarray, SET at the reference height + HEIGHT_STEP
+    Returns:    enu_dh - list of np.ndarray, derivative of SET in meter per meter
+    """
+    return [(data_h - data) / HEIGHT_STEP for data, data_h in zip(enu, enu_h)]
+
+
+def get_height_rows(get_rows, get_rows_dh, height):
+    """Get the rows of SET at the height of each pixel, as SET + height * dSET/dheight.
+
+    The height changes SET via the geocentric latitude only, smoothly and almost linearly, thus
+    the derivative is resized from the coarse grid the same way as SET itself, while the height is
+    applied at the full resolution, without calculating SET at the full resolution.
+
+    Parameters: get_rows    - callable, get_rows(r0, r1) returns a list of 2D np.ndarray of SET
+                              at the reference height, e.g. from get_interp_rows()
+                get_rows_dh - callable, the same for the derivative of SET w.r.t. the height
+                height      - 2D array (np.memmap or h5py.Dataset), height above the reference in meters
+    Returns:    get_rows    - callable, get_rows(r0, r1) returns a list of 2D np.ndarray of rows r0:r1
+    """
+    def get_height_rows_block(r0, r1):
+        height_rows = np.asarray(height[r0:r1], dtype=np.float64)
+        return [data + height_rows * data_dh for data, data_dh in zip(get_rows(r0, r1), get_rows_dh(r0, r1))]
+
+    return get_height_rows_block
+
+
+def split_time(time_offset, shape):
+    """Check the per-row/pixel time offset and reshape it to broadcast against the grid.
+
+    Parameters: time_offset - None, 1D np.ndarray in (length,) or 2D np.ndarray in (length, width),
+                              time offset in seconds w.r.t. the reference date/time
+                shape       - tuple of 2 int, shape of the grid in (length, width)
+    Returns:    time_offset - None, or 2D np.ndarray in float64 in (length, 1) or (length, width)
+    """
+    if time_offset is None:
+        return None
+    time_offset = np.asarray(time_offset, dtype=np.float64)
+    if time_offset.shape == shape[:1]:
+        time_offset = time_offset[:, np.newaxis]
+    elif time_offset.shape != tuple(shape):
+        raise ValueError(f'time_offset should be 1D in ({shape[0]},) or 2D in {shape}, got {time_offset.shape}!')
+    if not np.all(np.isfinite(time_offset)):
+        raise ValueError('time_offset should be all finite!')
+    return time_offset
+
+
+def get_time_nodes(dt_obj, time_offset, time_step=TIME_STEP):
+    """Get the epochs to calculate SET at, evenly spaced over the range of the time offsets.
+
+    SET varies by up to ~0.04 mm per second, but smoothly with the shortest period of ~12 hours,
+    thus the epochs are evaluated (the Sun/Moon ephemeris included) once each, then the epoch terms
+    or SET are interpolated linearly in time to the time of each pixel, see calc_grid_kern_time()
+    and interp_time().
+
+    Parameters: dt_obj      - datetime.datetime object, reference date/time in UTC
+                time_offset - None or np.ndarray, time offset in seconds w.r.t. dt_obj
+                time_step   - float, max spacing of the epochs in seconds
+    Returns:    mjd/fmjd    - 1D np.ndarray, modified julian day (and fraction) of the epochs in UTC
+                t_nodes     - 1D np.ndarray in float64, time offset of the epochs in seconds,
+                              None if time_offset is None, i.e. dt_obj only
+    """
+    if time_offset is None:
+        return (*datetime2mjd(dt_obj), None)
+
+    t0, t1 = float(np.min(time_offset)), float(np.max(time_offset))
+    num = int(np.ceil((t1 - t0) / time_step)) + 1 if t1 > t0 else 1
+    t_nodes = np.linspace(t0, t1, num)
+    t_us = np.rint(t_nodes * 1e6).astype(np.int64).astype('timedelta64[us]')
+    return (*datetime2mjd(np.datetime64(dt_obj, 'us') + t_us), t_nodes)
+
+
+def sample_time(time_offset, ys, xs):
+    """Sample the time offset at the row/column positions of the coarse grid linearly.
+
+    Parameters: time_offset - 2D np.ndarray in (length, 1) or (length, width), see split_time()
+                ys/xs       - 1D np.ndarray, increasing row/column positions (in int or float)
+    Returns:    time_c      - 2D np.ndarray in (ys.size, 1) or (ys.size, xs.size)
+    """
+    i0, i1, wy = get_linear_weights(np.arange(time_offset.shape[0]), ys)
+    time_c = time_offset[i0] * (1. - wy[:, np.newaxis]) + time_offset[i1] * wy[:, np.newaxis]
+    if time_offset.shape[1] > 1:
+        j0, j1, wx = get_linear_weights(np.arange(time_offset.shape[1]), xs)
+        time_c = time_c[:, j0] * (1. - wx) + time_c[:, j1] * wx
+    return time_c
+
+
+def interp_time(enu, t_nodes, time_offset):
+    """Interpolate SET linearly in time from the epochs to the time of each pixel.
+
+    Parameters: enu         - list of np.ndarray in (n_epoch, ...), SET at the epochs
+                t_nodes     - 1D np.ndarray, time offset of the epochs in seconds, see get_time_nodes()
+                              None for one epoch, i.e. no interpolation
+                time_offset - np.ndarray broadcastable to (...), time offset of each pixel in seconds
+    Returns:    enu         - list of np.ndarray in (...), SET at the time of each pixel
+    """
+    if t_nodes is None:
+        return [x[0] for x in enu]
+
+    shape = enu[0].shape[1:]
+    time_offset = np.broadcast_to(time_offset, shape)
+    i0, i1, w1 = get_linear_weights(t_nodes, time_offset.ravel())
+    i0, i1, w1 = i0.reshape((1,) + shape), i1.reshape((1,) + shape), w1.reshape(shape)
+    return [np.take_along_axis(data, i0, axis=0)[0] * (1. - w1)
+            + np.take_along_axis(data, i1, axis=0)[0] * w1 for data in enu]
+
+
 #########################################  Plot  ###############################################
 def plot_solid_earth_tides_grid(tide_e, tide_n, tide_u, dt_obj=None,
                                 out_fig=None, save=False, display=True):
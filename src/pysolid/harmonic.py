@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+#######################################################################
+# Harmonic synthesis of solid Earth tides from the tidal constituents.
+# Copyright 2020, by the California Institute of Technology.
+#######################################################################
+# Recommend usage:
+#   import pysolid
+#   from pysolid import harmonic
+#   harm = harmonic.fit_harmonics(34.0, -118.0, dt.datetime(2006,1,1), dt.datetime(2025,1,1))
+#   dt_out, tide_e, tide_n, tide_u = harmonic.calc_solid_earth_tides_harmonic(harm, dt0, dt1, step_sec=1)
+#
+# The amplitudes and phases of the tidal constituents at one point are fitted once, via least
+#   squares, to the SET time-series from solid.for, then SET at any date/time is evaluated as a
+#   sum of cosines, e.g. for decade-long or Monte-Carlo simulations at dense sampling.
+# The 18.61-year lunar nodal modulation is modeled via a pair of sidelines at the speed of the
+#   lunar node for each constituent, thus the fit span should cover the nodal cycle, for the
+#   harmonics to be valid beyond the fit span.
+#
+# For long series computed chunk by chunk, e.g. years at 1 s sampling, the least squares is
+#   accumulated incrementally with constant memory, then solved for the per-constituent table:
+#   analysis = harmonic.init_analysis()
+#   for dt0, dt1 in chunks:
+#       analysis = harmonic.update_analysis(analysis, *calc_solid_earth_tides_point(lat, lon, dt0, dt1, step_sec=1))
+#   print(harmonic.format_table(harmonic.get_constituent_table(analysis)))
+
+
+import collections
+import logging
+
+import numpy as np
+
+from pysolid.point import TIDES, Tag, calc_solid_earth_tides_point, get_point_times
+from pysolid.profiler import log_verbose
+
+
+logger = logging.getLogger(__name__)
+
+# minor constituents of the diurnal/semi-diurnal/long-period bands, which are not in TIDES but
+# above 0.5 mm in SET, from the Doodson numbers
+TIDES_MINOR = (
+    # Semi-diurnal
+    Tag('Lunar elliptic semidiurnal second-order'   , r'$\epsilon_2$', 13.12726747, 27.4238337, 227.655, np.nan),
+    Tag('Lunar elliptic semidiurnal'                , r'$\eta_2$'    , 11.75452174, 30.6265119, 285.455, np.nan),
+
+    # Diurnal
+    Tag('Lunar diurnal'                             , r'$\sigma_1$'  , 27.84838762, 12.9271398, 127.555, np.nan),
+    Tag('Lunar diurnal'                             , r'$\tau_1$'    , 25.66813294, 14.0251728, 147.555, np.nan),
+    Tag('Smaller lunar elliptic diurnal'            , r'$NO_1$'      , 24.83324836, 14.4966939, 155.655, np.nan),
+    Tag('Lunar diurnal'                             , r'$\chi_1$'    , 24.70907212, 14.5695475, 157.455, np.nan),
+    Tag('Solar diurnal'                             , r'$\pi_1$'     , 24.13213988, 14.9178648, 162.556, np.nan),
+    Tag('Solar diurnal'                             , r'$\psi_1$'    , 23.86929935, 15.0821352, 166.554, np.nan),
+    Tag('Solar diurnal'                             , r'$\phi_1$'    , 23.80447669, 15.1232058, 167.555, np.nan),
+    Tag('Lunar diurnal'                             , r'$\theta_1$'  , 23.20695686, 15.5125897, 173.655, np.nan),
+    Tag('Lunar diurnal'                             , r'$SO_1$'      , 22.42017800, 16.0569644, 183.555, np.nan),
+
+    # Long period
+    Tag('Lunar terdiurnal monthly'                  , r'$M_{tm}$'    , 219.1903996, 1.6424077 , 85.455 , np.nan),
+    Tag('Lunisolar monthly'                         , r'$MS_m$'      , 763.4865121, 0.4715211 , 63.655 , np.nan),
+)
+
+# speed of the lunar node in deg per hour, for the 18.61-year nodal modulation
+NODE_SPEED = 0.0022064
+NODE_PERIOD_YEAR = 18.61
+
+# reference date/time of the phases, J2000
+REF_TIME = np.datetime64('2000-01-01T12:00:00', 'us')
+
+# number of rows of the design matrix per chunk
+CHUNK_SIZE = 2**14
+
+
+# harmonics of SET at a point
+#   lat/lon - float, latitude/longitude of the point in degree
+#   speed   - 1D np.ndarray in (n_tide,), speed of the constituents in deg per hour,
+#             with the constant (0) and the nodal sidelines if fitted
+#   coef    - 2D np.ndarray in (n_tide, 3) in complex128, amplitude * exp(-1j * phase) in meters
+#             of the east/north/up components, relative to REF_TIME
+#   rms     - 1D np.ndarray in (3,), root mean square of the fitting residual in meters
+#   max_err - 1D np.ndarray in (3,), maximum absolute fitting residual in meters
+#   span    - tuple of 2 np.datetime64, date/time range of the fit
+Harmonics = collections.namedtuple('Harmonics', 'lat lon speed coef rms max_err span')
+
+# running least squares of the harmonics, see init_analysis() and update_analysis()
+#   tides     - list of Tag, tidal constituents, at speed[1:len(tides)+1]
+#   speed     - 1D np.ndarray in (n_speed,), speeds in deg per hour, see get_tide_speeds()
+#   gram_diff - 2D np.ndarray in (n_speed, n_speed) in complex128, sum of exp(1j * (w_i - w_j) * t)
+#   gram_sum  - 2D np.ndarray in (n_speed, n_speed) in complex128, sum of exp(1j * (w_i + w_j) * t)
+#   proj      - 2D np.ndarray in (n_speed, 3) in complex128, sum of SET * exp(1j * w * t)
+#   sum_sq    - 1D np.ndarray in (3,), sum of the squared SET in east/north/up
+#   num       - int, number of samples
+#   span      - tuple of 2 np.datetime64, date/time range of the samples, None if no sample
+TideAnalysis = collections.namedtuple('TideAnalysis', 'tides speed gram_diff gram_sum proj sum_sq num span')
+
+# amplitude and phase of one tidal constituent
+#   tag   - Tag, tidal constituent
+#   amp   - 1D np.ndarray in (3,), amplitude in meters of the east/north/up components
+#   phase - 1D np.ndarray in (3,), phase lag in degrees in [0, 360), relative to REF_TIME,
+#           i.e. SET = amp * cos(speed * hour - phase)
+Constituent = collections.namedtuple('Constituent', 'tag amp phase')
+
+
+def get_tide_speeds(tides=None, nodal=True):
+    """Get the speeds of the tidal constituents of SET to fit.
+
+    Parameters: tides  - list of Tag, tidal constituents, default: TIDES and TIDES_MINOR
+                         except for the shallow water ones, which are absent in SET
+                nodal  - bool, add the nodal sidelines of each constituent
+    Returns:    speed  - 1D np.ndarray in float64, speeds in deg per hour, starting with 0
+    """
+    if tides is None:
+        tides = get_default_tides()
+    speed = np.concatenate([[0.], [x.speed for x in tides]])
+    if nodal:
+        speed = np.concatenate([speed, speed + NODE_SPEED, speed[1:] - NODE_SPEED])
+    return speed
+
+
+def get_default_tides():
+    """Get the tidal constituents of SET, i.e. TIDES and TIDES_MINOR except the shallow water ones."""
+    return [x for x in TIDES + TIDES_MINOR if not x.species.startswith('Shallow water')]
+
+
+@log_verbose
+def fit_harmonics(lat, lon, dt0, dt1, step_sec=3600, tides=None, nodal=None, verbose=True,
+                  backend='fortran', ephemeris=None):
+    """Fit the amplitudes and phases of the tidal constituents to SET at the given point.
+
+    The accuracy of the harmonics is bounded by the residual of the fit, returned as rms/max_err,
+    e.g. ~2 mm RMS and ~9 mm max in the up direction at 34N/118W for the fit over 2006-2024,
+    compared to the SET amplitude of ~0.3 m. They are valid within the fit span, and beyond it
+    only with the nodal sidelines. Without them, i.e. for a fit span shorter than 18.61 years,
+    the error beyond the fit span grows up to ~5 cm with the nodal modulation. The span should
+    be longer than 1 year at least, to separate the K1/P1/S1 and S2/T2/R2/K2 constituents.
+
+    Parameters: lat/lon   - float, latitude/longitude of the point of interest
+                dt0/1     - datetime.datetime object, start/end date and time of the fit
+                step_sec  - int, time step in seconds of the SET samples to fit
+                tides     - list of Tag, tidal constituents, see get_tide_speeds()
+                nodal     - bool, fit the nodal sidelines, default: if the span >= 18.61 years
+                verbose   - bool, log verbose message at INFO level, see profiler.log_verbose()
+                backend   - str, fortran or numpy, see pysolid.utils.get_backend()
+                ephemeris - pysolid.ephemeris.Ephemeris, precomputed Sun/Moon ephemeris table
+    Returns:    harm      - Harmonics namedtuple
+    Examples:   harm = fit_harmonics(34.0, -118.0, dt.datetime(2006,1,1), dt.datetime(2025,1,1))
+    """
+    dt_out = get_point_times(dt0, dt1, step_sec)
+    span_year = (dt_out[-1] - dt_out[0]) / np.timedelta64(1, 'D') / 365.25
+    if nodal is None:
+        nodal = span_year >= NODE_PERIOD_YEAR
+    speed = get_tide_speeds(tides, nodal=nodal)
+
+    # SET time-series
+    tide_enu = np.stack(calc_solid_earth_tides_point(
+        lat, lon,
+        times=dt_out,
+        verbose=False,
+        backend=backend,
+        ephemeris=ephemeris,
+    )[1:], axis=-1)
+
+    logger.info(f'PYSOLID: fit {speed.size} harmonics to {dt_out.size} samples over {span_year:.1f} years')
+
+    # least squares via the normal equations, accumulated in chunks
+    analysis = update_analysis(init_analysis(tides, nodal=nodal), dt_out, *tide_enu.T)
+    coef = solve_analysis(analysis)[0]
+    x = np.empty((speed.size * 2, 3))
+    x[0::2], x[1::2] = coef.real, -coef.imag
+
+    # residual
+    hour = get_hours(dt_out)
+    rms = np.zeros(3)
+    max_err = np.zeros(3)
+    for i0 in range(0, hour.size, CHUNK_SIZE):
+        res = tide_enu[i0:i0+CHUNK_SIZE] - get_design_matrix(hour[i0:i0+CHUNK_SIZE], speed) @ x
+        rms += np.sum(res**2, axis=0)
+        max_err = np.maximum(max_err, np.max(np.abs(res), axis=0))
+    rms = np.sqrt(rms / hour.size)
+
+    logger.info(f'PYSOLID: fitting residual RMS in east/north/up: {rms[0]*1e3:.2f}/{rms[1]*1e3:.2f}/{rms[2]*1e3:.2f} mm')
+    logger.info(f'PYSOLID: fitting residual max in east/north/up: {max_err[0]*1e3:.2f}/{max_err[1]*1e3:.2f}/{max_err[2]*1e3:.2f} mm')
+
+    return Harmonics(float(lat), float(lon), speed, coef, rms, max_err, (dt_out[0], dt_out[-1]))
+
+
+def init_analysis(tides=None, nodal=False):
+    """Initialize the running least squares of the harmonics, for update_analysis().
+
+    Parameters: tides    - list of Tag, tidal constituents, see get_default_tides()
+                nodal    - bool, fit the nodal sidelines, for spans longer than 18.61 years
+    Returns:    analysis - TideAnalysis namedtuple, with no sample
+    """
+    tides = list(get_default_tides() if tides is None else tides)
+    speed = get_tide_speeds(tides, nodal=nodal)
+    return TideAnalysis(
+        tides=tides,
+        speed=speed,
+        gram_diff=np.zeros((speed.size, speed.size), dtype=np.complex128),
+        gram_sum=np.zeros((speed.size, speed.size), dtype=np.complex128),
+        proj=np.zeros((speed.size, 3), dtype=np.complex128),
+        sum_sq=np.zeros(3),
+        num=0,
+        span=None,
+    )
+
+
+def update_analysis(analysis, dt_out, tide_e, tide_n, tide_u):
+    """Accumulate one chunk of SET into the running least squares of the harmonics.
+
+    The normal equations of the cos/sin at the constituent speeds are accumulated as sums of
+    phasors. For regularly sampled chunks, the Gram matrix is summed in closed form, as geometric
+    series, and the projections via the phasors at the start of each block of samples and within
+    one block only, thus the cost is linear in the number of samples and constituents, as for
+    the Goertzel algorithm, while the constituents close in speed, e.g. K1/P1/S1, are separated
+    by the least squares, instead of leaking into each other. The memory usage is bounded by
+    CHUNK_SIZE, independent of the chunk size and the number of chunks.
+
+    Parameters: analysis - TideAnalysis namedtuple, see init_analysis()
+                dt_out   - 1D np.ndarray in datetime64 or list of datetime.datetime objects, in UTC
+                tide_e/n/u - 1D np.ndarray, SET in east/north/up direction in meters
+    Returns:    analysis - TideAnalysis namedtuple, a new one, the input analysis is left unchanged
+    Examples:   analysis = update_analysis(analysis, *calc_solid_earth_tides_point(lat, lon, dt0, dt1, step_sec=1))
+    """
+    tus = np.atleast_1d(np.asarray(dt_out, dtype='datetime64[us]'))
+    data = np.stack([tide_e, tide_n, tide_u], axis=-1).astype(np.float64)
+    if tus.ndim != 1 or data.shape != (tus.size, 3):
+        raise ValueError(f'Input dt_out and tide_e/n/u should be 1D in the same size, got {tus.shape} and {data.shape}!')
+    if tus.size == 0:
+        return analysis
+
+    # accumulated into copies, thus the input analysis could be reused, e.g. as a common base
+    gram_diff, gram_sum = analysis.gram_diff.copy(), analysis.gram_sum.copy()
+    proj, sum_sq = analysis.proj.copy(), analysis.sum_sq.copy()
+    omega = np.deg2rad(analysis.speed)
+    omega_diff = omega[:, np.newaxis] - omega[np.newaxis, :]
+    omega_sum = omega[:, np.newaxis] + omega[np.newaxis, :]
+    for i0 in range(0, tus.size, CHUNK_SIZE):
+        t = tus[i0:i0+CHUNK_SIZE]
+        d = data[i0:i0+CHUNK_SIZE]
+        hour = get_hours(t)
+        dus = np.diff(t.astype(np.int64))
+
+        if t.size > 1 and np.all(dus == dus[0]):
+            # regular sampling: geometric series for the Gram matrix
+            hour_step = dus[0] / 3.6e9
+            gram_diff += sum_phasors(omega_diff, hour[0], hour_step, t.size)
+            gram_sum += sum_phasors(omega_sum, hour[0], hour_step, t.size)
+
+            # t = t_block + t_step, phasor(t) = phasor(t_block) * phasor(t_step)
+            num_step = int(np.sqrt(t.size)) + 1
+            num_block = -(-t.size // num_step)
+            d_pad = np.zeros((num_block * num_step, 3))
+            d_pad[:t.size] = d
+            z_step = np.exp(1j * (hour_step * np.arange(num_step))[:, np.newaxis] * omega)
+            z_block = np.exp(1j * (hour[0] + hour_step * num_step * np.arange(num_block))[:, np.newaxis] * omega)
+            # (n_speed, num_step) @ (num_step, num_block * 3)
+            y = z_step.T @ d_pad.reshape(num_block, num_step, 3).transpose(1, 0, 2).reshape(num_step, -1)
+            proj += np.einsum('bk,kbc->kc', z_block, y.reshape(omega.size, num_block, 3))
+
+        else:
+            z = np.exp(1j * hour[:, np.newaxis] * omega)
+            gram_diff += z.T @ z.conj()
+            gram_sum += z.T @ z
+            proj += z.T @ d
+
+        sum_sq += np.sum(d**2, axis=0)
+
+    span = (tus.min(), tus.max())
+    if analysis.span is not None:
+        span = (min(span[0], analysis.span[0]), max(span[1], analysis.span[1]))
+    return analysis._replace(gram_diff=gram_diff, gram_sum=gram_sum, proj=proj, sum_sq=sum_sq,
+                             num=analysis.num + tus.size, span=span)
+
+
+def sum_phasors(omega, hour0, hour_step, num):
+    """Sum of exp(1j * omega * (hour0 + hour_step * k)) for k in [0, num), as a geometric series.
+
+    Parameters: omega     - np.ndarray, angular speeds in rad per hour
+                hour0     - float, first hour
+                hour_step - float, time step in hours
+                num       - int, number of samples
+    Returns:    sum       - np.ndarray in complex128 in the shape of omega
+    """
+    x = 1j * omega * hour_step
+    den = np.expm1(x)
+    # exp(x) == 1, i.e. omega * hour_step is a multiple of 2 pi, including omega == 0
+    flag = np.abs(den) < 1e-12
+    ratio = np.where(flag, num, np.expm1(x * num) / np.where(flag, 1., den))
+    return np.exp(1j * omega * hour0) * ratio
+
+
+def solve_analysis(analysis):
+    """Solve the running least squares of the harmonics, see update_analysis().
+
+    Parameters: analysis - TideAnalysis namedtuple
+    Returns:    coef     - 2D np.ndarray in (n_speed, 3) in complex128, amplitude * exp(-1j * phase)
+                           in meters of the east/north/up components, relative to REF_TIME
+                rms      - 1D np.ndarray in (3,), root mean square of the fitting residual in meters
+    """
+    if analysis.num == 0:
+        raise ValueError('No sample in the analysis, call update_analysis() first!')
+
+    # cos_i * cos_j = (cos(w_i - w_j) + cos(w_i + w_j)) / 2, etc.
+    gd, gs = analysis.gram_diff, analysis.gram_sum
+    num_coef = analysis.speed.size * 2
+    ata = np.empty((num_coef, num_coef))
+    ata[0::2, 0::2] = 0.5 * (gd.real + gs.real)
+    ata[1::2, 1::2] = 0.5 * (gd.real - gs.real)
+    ata[0::2, 1::2] = 0.5 * (gs.imag - gd.imag)
+    ata[1::2, 0::2] = ata[0::2, 1::2].T
+    atd = np.empty((num_coef, 3))
+    atd[0::2] = analysis.proj.real
+    atd[1::2] = analysis.proj.imag
+    x = np.linalg.lstsq(ata, atd, rcond=1e-12)[0]
+
+    # residual sum of squares: d.T d - x.T A.T d, for the least squares solution
+    rms = np.sqrt(np.maximum(analysis.sum_sq - np.sum(x * atd, axis=0), 0.) / analysis.num)
+
+    # a * cos + b * sin = Re((a - 1j * b) * exp(1j * phase))
+    coef = x[0::2] - 1j * x[1::2]
+    return coef, rms
+
+
+def get_constituent_table(analysis):
+    """Get the amplitude and phase of each tidal constituent from the running least squares.
+
+    The constituents are separated only if the span is longer than the reciprocal of their
+    frequency difference, e.g. 1 year for K1/P1/S1 and S2/T2/R2/K2, ~1 month for M2/N2.
+
+    Parameters: analysis - TideAnalysis namedtuple, see update_analysis()
+    Returns:    table    - list of Constituent namedtuple, in the same order as analysis.tides
+    Examples:   table = get_constituent_table(analysis)
+                print(format_table(table))
+    """
+    coef = solve_analysis(analysis)[0]
+    table = []
+    for i, tag in enumerate(analysis.tides):
+        c = coef[i + 1]
+        table.append(Constituent(tag, np.abs(c), np.rad2deg(-np.angle(c)) % 360.))
+    return table
+
+
+def format_table(table):
+    """Format the per-constituent table as text, sorted by the amplitude in up, for printing."""
+    lines = ['{:<12} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+        'constituent', 'period[h]', 'amp_e[mm]', 'amp_n[mm]', 'amp_u[mm]', 'pha_u[deg]', 'speed')]
+    for x in sorted(table, key=lambda x: -x.amp[2]):
+        symbol = x.tag.symbol.replace('$', '').replace('\\', '').replace('_', '').replace('{', '').replace('}', '')
+        lines.append('{:<12} {:>10.4f} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.2f} {:>10.7f}'.format(
+            symbol, x.tag.period, *(x.amp * 1e3), x.phase[2], x.tag.speed))
+    return '\n'.join(lines)
+
+
+def calc_solid_earth_tides_harmonic(harm, dt0=None, dt1=None, step_sec=60, times=None):
+    """Calculate SET in east/north/up direction from the harmonics, see fit_harmonics().
+
+    For regularly sampled date/times, the phasors of the constituents are evaluated at the start
+    of each block of samples and within one block only, then combined via matrix products.
+
+    Parameters: harm     - Harmonics namedtuple
+                dt0/1    - datetime.datetime object, start/end date and time
+                step_sec - int, time step in seconds
+                times    - 1D np.ndarray in datetime64 or list of datetime.datetime objects,
+                           date/times in UTC to evaluate, instead of dt0/dt1/step_sec
+    Returns:    dt_out   - 1D np.ndarray in datetime64[s], or the same as times if given
+                tide_e   - 1D np.ndarray in float64, SET in east  direction in meters
+                tide_n   - 1D np.ndarray in float64, SET in north direction in meters
+                tide_u   - 1D np.ndarray in float64, SET in up    direction in meters
+    Examples:   harm = fit_harmonics(34.0, -118.0, dt.datetime(2006,1,1), dt.datetime(2025,1,1))
+                dt_out, tide_e, tide_n, tide_u = calc_solid_earth_tides_harmonic(
+                    harm, dt.datetime(2020,1,1), dt.datetime(2021,1,1), step_sec=1)
+    """
+    if times is not None:
+        if dt0 is not None or dt1 is not None:
+            raise ValueError('Input times and dt0/dt1 are mutually exclusive!')
+        dt_out = np.atleast_1d(np.asarray(times))
+        if not np.issubdtype(dt_out.dtype, np.datetime64):
+            dt_out = dt_out.astype('datetime64[us]')
+        if dt_out.ndim != 1:
+            raise ValueError(f'Input times should be 1D, got shape of {dt_out.shape}!')
+    elif dt0 is not None and dt1 is not None:
+        dt_out = get_point_times(dt0, dt1, step_sec)
+    else:
+        raise ValueError('Either dt0/dt1 or times is required!')
+
+    tide_enu = np.empty((dt_out.size, 3), dtype=np.float64)
+    omega = np.deg2rad(harm.speed)
+    tus = dt_out.astype('datetime64[us]').astype(np.int64)
+    dus = np.diff(tus)
+
+    if dt_out.size > 1 and np.all(dus == dus[0]):
+        # regular sampling: t = t_block + t_step, phasor(t) = phasor(t_block) * phasor(t_step)
+        num_step = min(int(np.sqrt(dt_out.size)) + 1, CHUNK_SIZE)
+        num_block = -(-dt_out.size // num_step)
+        num_chunk = max(1, CHUNK_SIZE // num_step)
+        hour_step = dus[0] / 3.6e9
+        z_step = np.exp(1j * (hour_step * np.arange(num_step))[:, np.newaxis] * omega)
+
+        hour0 = get_hours(dt_out[0])
+        for i0 in range(0, num_block, num_chunk):
+            i1 = min(i0 + num_chunk, num_block)
+            hour_block = hour0 + hour_step * num_step * np.arange(i0, i1)
+            z_block = np.exp(1j * hour_block[:, np.newaxis] * omega)
+
+            # (num_step, n_tide) @ (n_tide, n_block * 3)
+            w = (z_block[:, :, np.newaxis] * harm.coef).transpose(1, 0, 2).reshape(omega.size, -1)
+            data = (z_step @ w).real.reshape(num_step, i1 - i0, 3).transpose(1, 0, 2).reshape(-1, 3)
+            j0 = i0 * num_step
+            j1 = min(i1 * num_step, dt_out.size)
+            tide_enu[j0:j1] = data[:j1-j0]
+
+    else:
+        hour = get_hours(dt_out)
+        for i0 in range(0, dt_out.size, CHUNK_SIZE):
+            z = np.exp(1j * hour[i0:i0+CHUNK_SIZE, np.newaxis] * omega)
+            tide_enu[i0:i0+CHUNK_SIZE] = (z @ harm.coef).real
+
+    tide_e, tide_n, tide_u = tide_enu.T
+    return dt_out, tide_e, tide_n, tide_u
+
+
+def get_hours(dt_objs):
+    """Get the hours since REF_TIME of the date/times."""
+    tus = np.asarray(dt_objs, dtype='datetime64[us]') - REF_TIME
+    return tus.astype(np.int64) / 3.6e9
+
+
+def get_design_matrix(hour, speed):
+    """Get the design matrix of the harmonics with cos/sin columns interleaved.
+
+    Parameters: hour   - 1D np.ndarray in (n,), hours since REF_TIME
+                speed  - 1D np.ndarray in (n_tide,), speeds in deg per hour
+    Returns:    a      - 2D np.ndarray in (n, n_tide * 2)
+    """
+    phase = hour[:, np.newaxis] * np.deg2rad(speed)
+    a = np.empty((hour.size, speed.size * 2))
+    a[:, 0::2] = np.cos(phase)
+    a[:, 1::2] = np.sin(phase)
+    return a
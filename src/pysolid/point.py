@@ -13,10 +13,18 @@
 
 import collections
 import datetime as dt
+import logging
 import os
 
 import numpy as np
 
+from pysolid import cache
+from pysolid.profiler import log_verbose, stage
+from pysolid.ephemeris import calc_epochs
+from pysolid.utils import datetime2mjd, get_backend, warn_leap_second
+
+
+logger = logging.getLogger(__name__)
 
 ## Tidal constituents
 # https://en.wikipedia.org/wiki/Theory_of_tides#Tidal_constituents. Accessed on: 2022-03-07.
@@ -71,85 +79,322 @@ TIDES = (
 
 
 ##################################  Earth tides - point mode  ##################################
-def calc_solid_earth_tides_point(lat, lon, dt0, dt1, step_sec=60, display=False, verbose=True):
+@log_verbose
+def calc_solid_earth_tides_point(lat, lon, dt0=None, dt1=None, step_sec=60, display=False, verbose=True,
+                                 backend='fortran', times=None, cache_dir=None, ephemeris=None, height=0.,
+                                 interp_step=None, return_err=False):
     """Calculate SET in east/north/up direction for the given time period at the given point (lat/lon).
 
-    Parameters: lat/lon  - float32, latitude/longitude of the point of interest
-                dt0/1    - datetime.datetime object, start/end date and time
-                step_sec - int16, time step in seconds
-                display  - bool, plot the calculated SET
-                verbose  - bool, print verbose message
-    Returns:    dt_out   - 1D np.ndarray in dt.datetime objects
-                tide_e   - 1D np.ndarray in float32, SET in east  direction in meters
-                tide_n   - 1D np.ndarray in float32, SET in north direction in meters
-                tide_u   - 1D np.ndarray in float32, SET in up    direction in meters
+    The date/times are sampled every step_sec seconds starting from the midnight of dt0, within
+    [dt0, dt1], or given explicitly via times, e.g. the irregular acquisition times of GNSS/InSAR.
+    All of them are computed in one call into preallocated arrays.
+
+    With cache_dir given, the result is cached on disk and read back for the same inputs in later
+    runs, see pysolid.cache. With ephemeris given, the Sun/Moon positions are interpolated from
+    the precomputed table instead of evaluating the series at every date/time, see pysolid.ephemeris.
+    Within pysolid.profiler.profile(), the run time of each stage is recorded, see pysolid.profiler.
+
+    For dense date/times, e.g. the 1 s series of high-rate GNSS, set interp_step to evaluate the
+    model every interp_step seconds only and reconstruct the date/times by the cubic spline
+    interpolation, as SET varies smoothly over minutes. The max interpolation error, checked
+    against the model in the middle of the coarse steps, is logged at INFO level (with verbose),
+    and returned with return_err=True, see calc_spline_in_time().
+    E.g. interp_step=300 is ~300 times cheaper for a 1 s series, with an error of ~1e-8 m.
+
+    Parameters: lat/lon   - float32, latitude/longitude of the point of interest
+                dt0/1     - datetime.datetime object, start/end date and time
+                step_sec  - int16, time step in seconds
+                display   - bool, plot the calculated SET
+                verbose   - bool, log verbose message at INFO level, see profiler.log_verbose()
+                backend   - str, fortran or numpy, see pysolid.utils.get_backend()
+                times     - 1D np.ndarray in datetime64 or list of datetime.datetime objects,
+                            date/times in UTC to evaluate, instead of dt0/dt1/step_sec
+                cache_dir - str, path of the cache directory, None to disable the cache
+                ephemeris - pysolid.ephemeris.Ephemeris, precomputed Sun/Moon ephemeris table
+                height    - float, ellipsoidal height of the point in meters
+                interp_step - float, time step in seconds to evaluate the model at before the cubic
+                            spline interpolation, None to evaluate at every date/time
+                return_err  - bool, also return the max interpolation error
+    Returns:    dt_out    - 1D np.ndarray in datetime64[s], or the same as times if given
+                tide_e    - 1D np.ndarray in float64, SET in east  direction in meters
+                tide_n    - 1D np.ndarray in float64, SET in north direction in meters
+                tide_u    - 1D np.ndarray in float64, SET in up    direction in meters
+                max_err   - float, max interpolation error in meters, 0 if not interpolated,
+                            returned with return_err=True only
     Examples:   dt0 = dt.datetime(2020,11,1,4,0,0)
                 dt1 = dt.datetime(2020,12,31,2,0,0)
                 (dt_out,
                  tide_e,
                  tide_n,
                  tide_u) = calc_solid_earth_tides_point(34.0, -118.0, dt0, dt1)
-    """
 
-    print('PYSOLID: calculate solid Earth tides in east/north/up direction')
-    print(f'PYSOLID: lot/lon: {lat}/{lon} degree')
-    print(f'PYSOLID: start UTC: {dt0.isoformat()}')
-    print(f'PYSOLID: end   UTC: {dt1.isoformat()}')
-    print(f'PYSOLID: time step: {step_sec} seconds')
-
-    dt_out = []
-    tide_e = []
-    tide_n = []
-    tide_u = []
-
-    ndays = (dt1.date() - dt0.date()).days + 1
-    for i in range(ndays):
-        di = dt0.date() + dt.timedelta(days=i)
-        if verbose:
-            print(f'SOLID  : {di.isoformat()} {i+1}/{ndays} ...')
-
-        # calc tide_u/n/u for the whole day
-        (dt_outi,
-         tide_ei,
-         tide_ni,
-         tide_ui) = calc_solid_earth_tides_point_per_day(lat, lon,
-                                                         date_str=di.strftime('%Y%m%d'),
-                                                         step_sec=int(step_sec))
-
-        # flag to mark the first/last datetime
-        if i == 0:
-            flag = dt_outi >= dt0
-        elif i == ndays - 1:
-            flag = dt_outi <= dt1
+                # at the given date/times
+                times = np.array(['2020-11-01T04:00:12.5', '2020-11-13T04:00:13'], dtype='datetime64[ms]')
+                dt_out, tide_e, tide_n, tide_u = calc_solid_earth_tides_point(34.0, -118.0, times=times)
+
+                # 1 s series, interpolated from every 5 min
+                dt_out, tide_e, tide_n, tide_u = calc_solid_earth_tides_point(34.0, -118.0, dt0, dt1, step_sec=1,
+                                                                              interp_step=300)
+                # with the max interpolation error, e.g. to check against a tolerance
+                *_, max_err = calc_solid_earth_tides_point(34.0, -118.0, dt0, dt1, step_sec=1,
+                                                           interp_step=300, return_err=True)
+    """
+    solid = get_backend(backend)
+    func = 'calc_solid_earth_tides_point'
+
+    if not -90. <= lat <= 90.:
+        raise ValueError(f'lat NOT in [-90,+90]: {lat}')
+    if not -360. <= lon <= 360.:
+        raise ValueError(f'lon NOT in [-360,+360]: {lon}')
+
+    # time
+    if times is not None:
+        if dt0 is not None or dt1 is not None:
+            raise ValueError('Input times and dt0/dt1 are mutually exclusive!')
+    elif dt0 is None or dt1 is None:
+        raise ValueError('Either dt0/dt1 or times is required!')
+
+    with stage(func, 'time'):
+        if times is not None:
+            dt_out = np.atleast_1d(np.asarray(times))
+            if not np.issubdtype(dt_out.dtype, np.datetime64):
+                dt_out = dt_out.astype('datetime64[us]')
+            if dt_out.ndim != 1:
+                raise ValueError(f'Input times should be 1D, got shape of {dt_out.shape}!')
         else:
-            flag = np.ones(dt_outi.size, dtype=np.bool_)
+            dt_out = get_point_times(dt0, dt1, step_sec)
+        mjd, fmjd = datetime2mjd(dt_out)
+
+    logger.info('PYSOLID: calculate solid Earth tides in east/north/up direction')
+    logger.info(f'PYSOLID: lot/lon: {lat}/{lon} degree')
+    if times is None:
+        logger.info(f'PYSOLID: start UTC: {dt0.isoformat()}')
+        logger.info(f'PYSOLID: end   UTC: {dt1.isoformat()}')
+        logger.info(f'PYSOLID: time step: {step_sec} seconds')
+    elif dt_out.size > 0:
+        logger.info(f'PYSOLID: start UTC: {dt_out.min()}')
+        logger.info(f'PYSOLID: end   UTC: {dt_out.max()}')
+    logger.info(f'SOLID  : number of date/times: {dt_out.size}')
+
+    # calc solid Earth tides
+    if dt_out.size == 0:
+        tide_e, tide_n, tide_u = [np.empty(0, dtype=np.float64) for _ in range(3)]
+        return (dt_out, tide_e, tide_n, tide_u) + ((0.,) if return_err else ())
+
+    data = None
+    max_err = 0.
+    if cache_dir is not None:
+        with stage(func, 'cache'):
+            kwargs = dict(interp_step=float(interp_step)) if interp_step is not None else {}
+            if ephemeris is not None:
+                kwargs['ephemeris'] = ephemeris
+            cache_key = cache.get_key('point', lat=float(lat), lon=float(lon), mjd=mjd, fmjd=fmjd,
+                                      backend=backend, height=float(height), **kwargs)
+            data = cache.load(cache_dir, cache_key)
+
+    def calc_point(mjd, fmjd):
+        # output in (3, n_time)
+        if ephemeris is not None:
+            epo, lflag = calc_epochs(solid, mjd, fmjd, ephemeris)
+            return np.stack([x.ravel() for x in solid.grid_kern(epo, lat, 0., 1, lon, 0., 1, eht=height)]), lflag
+        tide_e, tide_n, tide_u, lflag = solid.solid_point_stack(lat, lon, mjd, fmjd, eht=height)
+        return np.stack([tide_e, tide_n, tide_u]), lflag
+
+    if data is not None:
+        logger.info(f'PYSOLID: read from cache: {cache_key}')
+        tide_e, tide_n, tide_u = data['enu']
+        max_err = float(data.get('max_err', np.nan))
+
+    elif interp_step is not None and get_spline_times(dt_out, interp_step) is not None:
+        with stage(func, 'kernel'):
+            enu, max_err, lflag = calc_spline_in_time(calc_point, dt_out, interp_step)
+            tide_e, tide_n, tide_u = enu
+        logger.info(f'PYSOLID: interpolate from every {interp_step} seconds via cubic spline, max error: {max_err:.1e} m')
+
+    elif ephemeris is not None:
+        with stage(func, 'ephemeris'):
+            epo, lflag = calc_epochs(solid, mjd, fmjd, ephemeris)
+        with stage(func, 'kernel'):
+            tide_e, tide_n, tide_u = [x.ravel() for x in solid.grid_kern(epo, lat, 0., 1, lon, 0., 1,
+                                                                         eht=height)]
+
+    else:
+        with stage(func, 'kernel'):
+            tide_e, tide_n, tide_u, lflag = solid.solid_point_stack(lat, lon, mjd, fmjd, eht=height)
 
-        # update
-        dt_out += dt_outi[flag].tolist()
-        tide_e += tide_ei[flag].tolist()
-        tide_n += tide_ni[flag].tolist()
-        tide_u += tide_ui[flag].tolist()
+    if data is None:
+        if lflag:
+            warn_leap_second()
 
-    # list --> np.ndarray for output
-    dt_out = np.array(dt_out)
-    tide_e = np.array(tide_e)
-    tide_n = np.array(tide_n)
-    tide_u = np.array(tide_u)
+        if cache_dir is not None:
+            with stage(func, 'cache'):
+                cache.save(cache_dir, cache_key, enu=np.stack([tide_e, tide_n, tide_u]), max_err=max_err)
 
     # plot
     if display:
         plot_solid_earth_tides_point(dt_out, tide_e, tide_n, tide_u, lalo=[lat, lon])
 
+    if return_err:
+        return dt_out, tide_e, tide_n, tide_u, max_err
     return dt_out, tide_e, tide_n, tide_u
 
 
-def calc_solid_earth_tides_point_per_day(lat, lon, date_str, step_sec=60):
+@log_verbose
+def calc_solid_earth_tides_points(lats, lons, times, verbose=True, backend='fortran', heights=0.,
+                                  interp_step=None, return_err=False):
+    """Calculate SET in east/north/up direction at multiple points for multiple date/times.
+
+    The Sun/Moon ephemeris is computed once per date/time and shared by all points, e.g. for the
+    stations of a GNSS network, instead of once per point via calc_solid_earth_tides_point().
+    With interp_step, the model is evaluated at a coarse time step and interpolated in time, as
+    in calc_solid_earth_tides_point(), with the max interpolation error logged at INFO level.
+
+    Parameters: lats/lons - 1D np.ndarray in float, latitude/longitude of the points of interest
+                times     - 1D np.ndarray in datetime64 or list of datetime.datetime objects, in UTC
+                verbose   - bool, log verbose message at INFO level, see profiler.log_verbose()
+                backend   - str, fortran or numpy, see pysolid.utils.get_backend()
+                heights   - float or 1D np.ndarray in float, ellipsoidal height of the points in meters
+                interp_step - float, time step in seconds to evaluate the model at before the cubic
+                            spline interpolation, None to evaluate at every date/time
+                return_err  - bool, also return the max interpolation error
+    Returns:    tide_enu  - 3D np.ndarray in (n_point, n_time, 3) in float64,
+                            SET in east/north/up direction in meters
+                max_err   - float, max interpolation error in meters, 0 if not interpolated,
+                            returned with return_err=True only
+    Examples:   lats, lons = np.array([34.0, 35.2]), np.array([-118.0, -116.5])
+                times = np.arange('2020-11-01', '2020-11-02', np.timedelta64(30, 's'), dtype='datetime64[s]')
+                tide_enu = calc_solid_earth_tides_points(lats, lons, times)
+                tide_u = tide_enu[:, :, 2]
+    """
+    solid = get_backend(backend)
+
+    lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+    lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+    if lats.ndim != 1 or lats.shape != lons.shape:
+        raise ValueError(f'lats/lons should be 1D in the same shape, got {lats.shape} and {lons.shape}!')
+    heights = np.asarray(heights, dtype=np.float64)
+    if heights.ndim > 0 and heights.shape != lats.shape:
+        raise ValueError(f'heights should be a scalar or 1D in the shape of {lats.shape}, got {heights.shape}!')
+    heights = np.ascontiguousarray(np.broadcast_to(heights, lats.shape))
+    if np.any(np.abs(lats) > 90.):
+        raise ValueError('lats NOT in [-90,+90]!')
+    if np.any(np.abs(lons) > 360.):
+        raise ValueError('lons NOT in [-360,+360]!')
+
+    func = 'calc_solid_earth_tides_points'
+    with stage(func, 'time'):
+        mjd, fmjd = datetime2mjd(times)
+    logger.info('PYSOLID: calculate solid Earth tides in east/north/up direction')
+    logger.info(f'PYSOLID: number of points    : {lats.size}')
+    logger.info(f'PYSOLID: number of date/times: {mjd.size}')
+
+    if lats.size == 0 or mjd.size == 0:
+        tide_enu = np.empty((lats.size, mjd.size, 3), dtype=np.float64)
+        return (tide_enu, 0.) if return_err else tide_enu
+
+    # output in (3, n_time, n_point) in Fortran order, i.e. (n_point, n_time, 3) in C order
+    with stage(func, 'kernel'):
+        calc_points = lambda mjd, fmjd: solid.solid_points(lats, lons, mjd, fmjd, eht=heights)
+        if interp_step is not None and get_spline_times(times, interp_step) is not None:
+            tide_enu, max_err, lflag = calc_spline_in_time(calc_points, times, interp_step)
+            logger.info(f'PYSOLID: interpolate from every {interp_step} seconds via cubic spline, max error: {max_err:.1e} m')
+        else:
+            tide_enu, lflag = calc_points(mjd, fmjd)
+            max_err = 0.
+    if lflag:
+        warn_leap_second()
+
+    if return_err:
+        return tide_enu.T, max_err
+    return tide_enu.T
+
+
+def get_point_times(dt0, dt1, step_sec=60):
+    """Get the date/times every step_sec seconds from the midnight of dt0, within [dt0, dt1].
+
+    Parameters: dt0/1    - datetime.datetime object, start/end date and time
+                step_sec - int, time step in seconds, 1 at minimum
+    Returns:    dt_out   - 1D np.ndarray in datetime64[s]
+    """
+    step = np.timedelta64(int(step_sec), 's')
+    if step < np.timedelta64(1, 's'):
+        raise ValueError(f'step_sec should be an integer >= 1, got {step_sec}!')
+
+    t0 = np.datetime64(dt0, 'us')
+    t1 = np.datetime64(dt1, 'us')
+    day0 = t0.astype('datetime64[D]').astype('datetime64[s]')
+
+    # ceil division for the first step since the midnight
+    num0 = -((day0 - t0) // step)
+    dt_out = np.arange(day0 + num0 * step, t1 + np.timedelta64(1, 'us'), step)
+    return dt_out.astype('datetime64[s]')
+
+
+def get_spline_times(times, step_sec, num_check=64):
+    """Get the coarse date/times to evaluate the model at for calc_spline_in_time().
+
+    The coarse date/times are evenly spaced, at most step_sec apart, over the span of the input
+    date/times, 4 at minimum for the cubic spline. The check date/times are in the middle of the
+    coarse ones, where the interpolation error is the largest, at most num_check of them evenly
+    spread, including the first and last intervals.
+
+    Parameters: times     - 1D np.ndarray in datetime64 or list of datetime.datetime objects
+                step_sec  - float, max time step of the coarse date/times in seconds
+                num_check - int, max number of the check date/times
+    Returns:    t_node    - 1D np.ndarray in float64, coarse date/times in seconds since t0
+                t_check   - 1D np.ndarray in float64, check date/times in seconds since t0
+                t0        - np.datetime64 in us, the first date/time
+                OR None, if the coarse and check date/times are not fewer than the input ones
+    """
+    tus = np.asarray(times, dtype='datetime64[us]')
+    t0 = tus.min()
+    span = (tus.max() - t0).astype(np.int64) / 1e6
+    num = max(4, int(np.ceil(span / step_sec)) + 1)
+    if num * 2 - 1 >= tus.size or span <= 0:
+        return None
+
+    t_node = np.linspace(0., span, num)
+    t_check = (t_node[:-1] + t_node[1:]) / 2.
+    if t_check.size > num_check:
+        t_check = t_check[np.linspace(0, t_check.size - 1, num_check).astype(int)]
+    return t_node, t_check, t0
+
+
+def calc_spline_in_time(calc_func, times, step_sec, num_check=64):
+    """Calculate SET at the given date/times by the cubic spline interpolation from a coarse time step.
+
+    Parameters: calc_func - callable, calc_func(mjd, fmjd) returns SET in np.ndarray in (3, n_time, ...)
+                            and the leap second flag, e.g. solid_points()
+                times     - 1D np.ndarray in datetime64 or list of datetime.datetime objects
+                step_sec  - float, max time step of the coarse date/times in seconds
+                num_check - int, max number of the check date/times, see get_spline_times()
+    Returns:    enu       - np.ndarray in (3, n_time, ...), SET in east/north/up at the date/times
+                max_err   - float, max interpolation error in meters at the check date/times
+                lflag     - bool, leap second table limit flag
+    """
+    from scipy import interpolate
+
+    t_node, t_check, t0 = get_spline_times(times, step_sec, num_check=num_check)
+    t_all = np.concatenate([t_node, t_check])
+    mjd, fmjd = datetime2mjd(t0 + np.rint(t_all * 1e6).astype(np.int64).astype('timedelta64[us]'))
+    enu_all, lflag = calc_func(mjd, fmjd)
+    enu_node, enu_check = enu_all[:, :t_node.size], enu_all[:, t_node.size:]
+
+    spline = interpolate.CubicSpline(t_node, enu_node, axis=1)
+    max_err = float(np.abs(spline(t_check) - enu_check).max())
+
+    t = (np.asarray(times, dtype='datetime64[us]') - t0).astype(np.int64) / 1e6
+    return spline(t), max_err, lflag
+
+
+def calc_solid_earth_tides_point_per_day(lat, lon, date_str, step_sec=60, backend='fortran'):
     """Calculate solid Earth tides (SET) in east/north/up direction
     for one day at the given point (lat/lon).
 
     Parameters: lat/lon  - float32, latitude/longitude of the point of interest
                 date_str - str, date in YYYYMMDD
                 step_sec - int16, time step in seconds
+                backend  - str, fortran or numpy, see pysolid.utils.get_backend()
     Returns:    dt_out   - 1D np.ndarray in dt.datetime objects
                 tide_e   - 1D np.ndarray in float32, SET in east  direction in meters
                 tide_n   - 1D np.ndarray in float32, SET in north direction in meters
@@ -159,22 +404,21 @@ def calc_solid_earth_tides_point_per_day(lat, lon, date_str, step_sec=60):
                  tide_n,
                  tide_u) = calc_solid_earth_tides_point_per_day(34.0, -118.0, '20180219')
     """
-    try:
-        from pysolid.solid import solid_point
-    except ImportError:
-        msg = "Cannot import name 'solid' from 'pysolid'!"
-        msg += '\n    Maybe solid.for is NOT compiled yet.'
-        msg += '\n    Check instruction at: https://github.com/insarlab/PySolid.'
-        raise ImportError(msg)
+    solid = get_backend(backend)
+    func = 'calc_solid_earth_tides_point_per_day'
 
     # calc solid Earth tides
     t = dt.datetime.strptime(date_str, '%Y%m%d')
-    secs, tide_e, tide_n, tide_u  = solid_point(
-        lat, lon, t.year, t.month, t.day, step_sec
-    )
-
-    dt_out = [t + dt.timedelta(seconds=sec) for sec in secs]
-    dt_out = np.array(dt_out)
+    with stage(func, 'kernel'):
+        secs, tide_e, tide_n, tide_u = solid.solid_point(
+            lat, lon, t.year, t.month, t.day, step_sec
+        )
+    if solid.limitflag.leapflag:
+        warn_leap_second()
+
+    with stage(func, 'time'):
+        dt_out = [t + dt.timedelta(seconds=sec) for sec in secs]
+        dt_out = np.array(dt_out)
 
     return dt_out, tide_e, tide_n, tide_u
 
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+#######################################################################
+# Stage-level timing and memory profiling, and logging of the calc_* functions.
+# Copyright 2020, by the California Institute of Technology.
+#######################################################################
+# Recommend usage:
+#   import pysolid
+#   from pysolid import profiler
+#   with profiler.profile(trace_mem=True) as stages:
+#       pysolid.calc_solid_earth_tides_grid(dt_obj, atr, verbose=False)
+#   print(profiler.format_report(stages))
+#
+#   # or emit each stage as it finishes, via a callback or the logging module
+#   with profiler.profile(callback=lambda x: print(x)):
+#       ...
+#   logging.getLogger('pysolid.profiler').setLevel(logging.DEBUG)
+#
+# The calc_* functions wrap their stages, e.g. the date/time conversion, the Fortran kernel and
+#   the resampling, in stage(). Without any active profile and with the logger disabled for DEBUG,
+#   stage() returns a shared no-op context manager, thus there is no timing overhead.
+#
+# The calc_* functions report their progress at INFO level on the loggers of their modules, e.g.
+#   pysolid.grid, children of the pysolid logger. Their verbose argument is a shortcut for the
+#   log level via log_verbose(): verbose=True logs at INFO level, to stdout if logging is not
+#   configured; verbose=False leaves the logging configuration as it is, e.g.
+#   logging.basicConfig(level=logging.INFO)
+#   pysolid.calc_solid_earth_tides_grid(dt_obj, atr, verbose=False)
+
+
+import collections
+import contextlib
+import functools
+import logging
+import sys
+import time
+import tracemalloc
+
+
+# run time in seconds and peak memory in bytes traced by tracemalloc (None if not traced)
+Stage = collections.namedtuple('Stage', 'func name seconds peak_mem')
+Profile = collections.namedtuple('Profile', 'stages callback trace_mem')
+
+logger = logging.getLogger(__name__)
+# parent logger of all pysolid modules, and its levels before the verbose=True calls, outermost first
+pkg_logger = logging.getLogger('pysolid')
+_pkg_levels = []
+
+# active profiles, the innermost last
+_profiles = []
+_null_stage = contextlib.nullcontext()
+
+
+@contextlib.contextmanager
+def profile(callback=None, trace_mem=False):
+    """Record the stages of the calc_* functions called within the context.
+
+    Parameters: callback  - callable, called with each Stage object once it finishes
+                trace_mem - bool, trace the peak memory allocated within each stage with
+                            tracemalloc, which slows down the allocations
+    Returns:    stages    - list of Stage objects, appended as the stages finish
+    Examples:   with profile() as stages:
+                    calc_solid_earth_tides_point(34.0, -118.0, dt0, dt1, verbose=False)
+                print(format_report(stages))
+    """
+    prof = Profile([], callback, trace_mem)
+    start_trace = trace_mem and not tracemalloc.is_tracing()
+    if start_trace:
+        tracemalloc.start()
+    _profiles.append(prof)
+    try:
+        yield prof.stages
+    finally:
+        _profiles.remove(prof)
+        if start_trace:
+            tracemalloc.stop()
+
+
+def stage(func, name):
+    """Context manager to time the given stage of a function, if any profile is active.
+
+    Parameters: func - str, name of the calling function, e.g. calc_solid_earth_tides_grid
+                name - str, name of the stage, e.g. time, kernel, resample
+    Returns:    context manager
+    Examples:   with stage('calc_solid_earth_tides_grid', 'kernel'):
+                    enu = calc_grid_kern(...)
+    """
+    if not _profiles and not logger.isEnabledFor(logging.DEBUG):
+        return _null_stage
+    return _timed_stage(func, name)
+
+
+@contextlib.contextmanager
+def _timed_stage(func, name):
+    trace_mem = tracemalloc.is_tracing() and any(x.trace_mem for x in _profiles)
+    if trace_mem:
+        tracemalloc.reset_peak()
+        mem0 = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - t0
+        peak_mem = tracemalloc.get_traced_memory()[1] - mem0 if trace_mem else None
+        record = Stage(func, name, seconds, peak_mem)
+        for prof in _profiles:
+            prof.stages.append(record)
+            if prof.callback is not None:
+                prof.callback(record)
+        logger.debug('%s: %s: %.6f s', func, name, seconds)
+
+
+def format_report(stages):
+    """Format the recorded stages as a table, with the total run time (and peak memory) per stage.
+
+    Parameters: stages - list of Stage objects, e.g. from profile()
+    Returns:    report - str
+    """
+    # aggregate by function and stage, in the order of first appearance
+    total = collections.OrderedDict()
+    for x in stages:
+        num, seconds, peak_mem = total.get((x.func, x.name), (0, 0., None))
+        if x.peak_mem is not None:
+            peak_mem = max(peak_mem or 0, x.peak_mem)
+        total[(x.func, x.name)] = (num + 1, seconds + x.seconds, peak_mem)
+
+    sum_seconds = sum(x[1] for x in total.values())
+    lines = ['{:<36} {:<10} {:>6} {:>10} {:>6} {:>12}'.format(
+        'function', 'stage', 'calls', 'time [s]', '%', 'peak [MiB]')]
+    for (func, name), (num, seconds, peak_mem) in total.items():
+        percent = seconds / sum_seconds * 100 if sum_seconds > 0 else 0.
+        peak_mem = f'{peak_mem / 2**20:.1f}' if peak_mem is not None else '-'
+        lines.append(f'{func:<36} {name:<10} {num:>6} {seconds:>10.4f} {percent:>6.1f} {peak_mem:>12}')
+    return '\n'.join(lines)
+
+
+def log_verbose(func):
+    """Decorator to apply the verbose argument of the function as the level of the pysolid logger.
+
+    Parameters: func - callable, with a verbose argument
+    Returns:    callable, with the pysolid logger at INFO level if verbose, with a stdout handler
+                if logging is not configured; and with the level of the user otherwise, even
+                when called within another verbose function
+    Examples:   @log_verbose
+                def calc_solid_earth_tides_point(lat, lon, ..., verbose=True, ...):
+                    logger.info('PYSOLID: ...')
+    """
+    code = func.__code__
+    idx = code.co_varnames[:code.co_argcount].index('verbose')
+    default = func.__defaults__[idx - (code.co_argcount - len(func.__defaults__))]
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        verbose = args[idx] if len(args) > idx else kwargs.get('verbose', default)
+        with _verbose_level(verbose):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+@contextlib.contextmanager
+def _verbose_level(verbose):
+    level = pkg_logger.level
+    handler = None
+    if verbose:
+        _pkg_levels.append(level)
+        if not pkg_logger.isEnabledFor(logging.INFO):
+            pkg_logger.setLevel(logging.INFO)
+        if not pkg_logger.hasHandlers():
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            pkg_logger.addHandler(handler)
+    elif _pkg_levels:
+        pkg_logger.setLevel(_pkg_levels[0])
+    try:
+        yield
+    finally:
+        if verbose:
+            _pkg_levels.pop()
+        if handler is not None:
+            pkg_logger.removeHandler(handler)
+        pkg_logger.setLevel(level)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+#######################################################################
+# Separable resampling from the coarse grid to the full grid.
+# Copyright 2020, by the California Institute of Technology.
+#######################################################################
+# Recommend usage:
+#   from pysolid import resample
+#   plan = resample.get_plan(ys, xs, (length, width), order=1)
+#   tide_u = resample.resample(tide_u_coarse, plan, dtype=np.float32)
+#
+# The row/column neighbors and weights are computed once per geometry in get_plan(), then applied
+#   to any number of components/epochs: along the columns first, for the coarse rows covering the
+#   requested rows only, then along the rows, block by block of rows into the preallocated output.
+
+
+import collections
+
+import numpy as np
+
+
+# resampling plan from the coarse grid to the full grid, see get_plan()
+#   row_idx/col_idx - 2D np.ndarray in int in (length/width, n_tap), neighbors in the coarse grid
+#   row_wgt/col_wgt - 2D np.ndarray in float64 in (length/width, n_tap), weights of the neighbors
+Plan = collections.namedtuple('Plan', 'row_idx row_wgt col_idx col_wgt')
+
+
+def get_plan(ys, xs, shape, order=1):
+    """Get the plan to resample from the coarse grid to the full grid, see resample().
+
+    Parameters: ys/xs - 1D np.ndarray, increasing row/column positions (in int or float) of the
+                        coarse grid in the full grid, constant beyond the first/last one
+                shape - tuple of 2 int, shape of the full grid in (length, width)
+                order - int, 1 for bilinear, 3 for bicubic interpolation, see get_weights()
+    Returns:    plan  - Plan namedtuple
+    """
+    row_idx, row_wgt = get_weights(np.asarray(ys, dtype=np.float64), np.arange(shape[0]), order=order)
+    col_idx, col_wgt = get_weights(np.asarray(xs, dtype=np.float64), np.arange(shape[1]), order=order)
+    return Plan(row_idx, row_wgt, col_idx, col_wgt)
+
+
+def get_zoom_positions(num_in, num_out):
+    """Get the positions of the input pixels in the output grid, as in ndimage.zoom(grid_mode=True).
+
+    Parameters: num_in  - int, number of the input  pixels
+                num_out - int, number of the output pixels
+    Returns:    pos     - 1D np.ndarray in float64, positions of the input pixels
+    """
+    return (np.arange(num_in) + 0.5) * num_out / num_in - 0.5
+
+
+def get_weights(idx, x, order=1):
+    """Get the neighbors and weights of the interpolation from positions idx to positions x.
+
+    For order=3, it is the cubic Lagrange interpolation through the 4 nearest samples, exact for
+    irregular positions, with the 4 samples shifted inwards at the first/last intervals. It falls
+    back to the linear interpolation for less than 4 samples.
+
+    Parameters: idx   - 1D np.ndarray, increasing positions of the input samples
+                x     - 1D np.ndarray, positions to interpolate to, constant beyond the first/last sample
+                order - int, 1 for linear, 3 for cubic interpolation
+    Returns:    i     - 2D np.ndarray in int in (x.size, order+1), index of the neighbors in idx
+                w     - 2D np.ndarray in float64 in (x.size, order+1), weights of the neighbors
+    """
+    if order not in [1, 3]:
+        raise ValueError(f'Un-supported interpolation order: {order}, use 1 or 3!')
+
+    if order == 1 or idx.size < 4:
+        i0, i1, w1 = get_linear_weights(idx, x)
+        return np.stack([i0, i1], axis=1), np.stack([1. - w1, w1], axis=1)
+
+    x = np.clip(np.asarray(x, dtype=np.float64), idx[0], idx[-1])
+    i0 = np.clip(np.searchsorted(idx, x, side='right') - 2, 0, idx.size - 4)
+    i = i0[:, np.newaxis] + np.arange(4)
+    xi = idx[i]
+    w = np.ones(i.shape, dtype=np.float64)
+    for k in range(4):
+        for m in range(4):
+            if m != k:
+                w[:, k] *= (x - xi[:, m]) / (xi[:, k] - xi[:, m])
+    return i, w
+
+
+def get_linear_weights(idx, x):
+    """Get the neighbors and weights of linear interpolation from positions idx to positions x.
+
+    Parameters: idx - 1D np.ndarray, increasing positions of the input samples
+                x   - 1D np.ndarray, positions to interpolate to
+    Returns:    i0  - 1D np.ndarray in int, index of the left  neighbor in idx
+                i1  - 1D np.ndarray in int, index of the right neighbor in idx
+                w1  - 1D np.ndarray in float, weight of the right neighbor,
+                      clipped to [0, 1], i.e. constant beyond the first/last sample
+    """
+    i0 = np.clip(np.searchsorted(idx, x, side='right') - 1, 0, max(idx.size - 2, 0))
+    if idx.size == 1:
+        return i0, i0, np.zeros(np.size(x))
+    w1 = np.clip((x - idx[i0]) / (idx[i0 + 1] - idx[i0]), 0., 1.)
+    return i0, i0 + 1, w1
+
+
+def resample_rows(data, plan, r0, r1, out=None, dtype=np.float64):
+    """Resample data from the coarse grid to the rows r0:r1 of the full grid.
+
+    Parameters: data  - 2D np.ndarray, data on the coarse grid
+                plan  - Plan namedtuple, see get_plan()
+                r0/r1 - int, rows of the full grid
+                out   - 2D np.ndarray in (r1-r0, width), to write the output into
+                dtype - np.dtype, data type of the calculation and the output, if out is None
+    Returns:    out   - 2D np.ndarray in (r1-r0, width), data on the rows r0:r1 of the full grid
+    """
+    dtype = out.dtype if out is not None else np.dtype(dtype)
+    row_idx, row_wgt = plan.row_idx[r0:r1], plan.row_wgt[r0:r1].astype(dtype)
+    col_wgt = plan.col_wgt.astype(dtype)
+
+    # along the columns, for the coarse rows covering r0:r1 only, to bound the memory usage
+    k0, k1 = row_idx.min(), row_idx.max() + 1
+    data = np.asarray(data[k0:k1], dtype=dtype)
+    data_x = data[:, plan.col_idx[:, 0]] * col_wgt[:, 0]
+    for k in range(1, col_wgt.shape[1]):
+        data_x += data[:, plan.col_idx[:, k]] * col_wgt[:, k]
+
+    # along the rows
+    row_idx = row_idx - k0
+    if out is None:
+        out = np.empty((r1 - r0, data_x.shape[1]), dtype=dtype)
+    np.multiply(data_x[row_idx[:, 0]], row_wgt[:, 0:1], out=out)
+    for k in range(1, row_wgt.shape[1]):
+        out += data_x[row_idx[:, k]] * row_wgt[:, k:k+1]
+    return out
+
+
+def resample(data, plan, out=None, dtype=np.float64, block_pixel=2**20):
+    """Resample data from the coarse grid to the full grid, block by block of rows.
+
+    Parameters: data        - 2D np.ndarray in (ny, nx), or 3D np.ndarray in (n_epoch, ny, nx),
+                              data on the coarse grid
+                plan        - Plan namedtuple, see get_plan()
+                out         - 2D/3D array in (length, width) / (n_epoch, length, width), to write
+                              the output into, e.g. np.memmap or h5py.Dataset
+                dtype       - np.dtype, data type of the calculation and the output, if out is None,
+                              e.g. np.float32 to halve the memory usage and bandwidth
+                block_pixel - int, approximate number of pixels per block
+    Returns:    out         - 2D/3D array in (length, width) / (n_epoch, length, width)
+    """
+    shape = (plan.row_idx.shape[0], plan.col_idx.shape[0])
+    data = np.asarray(data)
+    stack = data.ndim == 3
+    out_shape = (data.shape[0],) + shape if stack else shape
+    if out is None:
+        out = np.empty(out_shape, dtype=dtype)
+    elif tuple(out.shape) != out_shape:
+        raise ValueError(f'out should be in the shape of {out_shape}, got {out.shape}!')
+
+    # write into out directly, or via a copy, e.g. for h5py.Dataset
+    direct = isinstance(out, np.ndarray)
+    block_size = max(1, int(block_pixel // max(shape[1], 1)))
+    for i in range(data.shape[0] if stack else 1):
+        data_i = data[i] if stack else data
+        for r0 in range(0, shape[0], block_size):
+            r1 = min(r0 + block_size, shape[0])
+            idx = (i, slice(r0, r1)) if stack else slice(r0, r1)
+            if direct:
+                resample_rows(data_i, plan, r0, r1, out=out[idx])
+            else:
+                out[idx] = resample_rows(data_i, plan, r0, r1, dtype=out.dtype)
+    return out
@@ -0,0 +1,917 @@
+#!/usr/bin/env python3
+#######################################################################
+# A pure NumPy implementation of solid.for, vectorized over stations and epochs.
+#   Fortran code is originally written by Dennis Milbert, 2018-06-01.
+#   Available at: http://geodesyworld.github.io/SOFTS/solid.htm.
+# Copyright 2020, by the California Institute of Technology.
+#######################################################################
+# Recommend usage:
+#   import pysolid
+#   pysolid.calc_solid_earth_tides_grid(dt_obj, atr, backend='numpy')
+#
+# The subroutines follow those in solid.for with the same names, except that:
+#   1. inputs are np.ndarray, and vectors are stored in the last axis (of size 3),
+#      thus stations (...,3) and epochs (...,12) broadcast against each other.
+#   2. outputs are returned instead of passed by reference.
+#   3. the top level solid_grid, solid_point(_stack), solid_points, solid_epochs,
+#      solid_epochs_eph and grid_kern(_time) share the same calling sequence as the f2py wrapper
+#      of solid.for, thus could be used as a drop-in replacement.
+# Note that the single precision constants in solid.for are kept as is (via _f32)
+# to reproduce the Fortran results to the round-off level.
+
+
+import types
+
+import numpy as np
+
+from pysolid.utils import datetime2mjd, get_leap_seconds
+
+
+def _f32(x):
+    """Single precision literal (REAL*4) promoted to double precision, as in Fortran."""
+    return np.float64(np.float32(x))
+
+
+## constants
+PI = 4. * np.arctan(1.)
+PI2 = PI + PI
+RAD = 180. / PI
+DEG2RAD = 0.017453292519943295769
+
+# grs80
+A = 6378137.
+E2 = 6.69438002290341574957e-03
+
+# table 7.5a of IERS conventions 2003 (TN.32, pg.82), as edited in solid.for
+# columns are s,h,p,N',ps, dR(ip),dR(op),dT(ip),dT(op), in units of mm
+STEP2DIU_TABLE = np.array([
+    [-3., 0., 2., 0., 0.,-0.01,-0.01, 0.0 , 0.0 ],
+    [-3., 2., 0., 0., 0.,-0.01,-0.01, 0.0 , 0.0 ],
+    [-2., 0., 1.,-1., 0.,-0.02,-0.01, 0.0 , 0.0 ],
+    [-2., 0., 1., 0., 0.,-0.08, 0.00, 0.01, 0.01],
+    [-2., 2.,-1., 0., 0.,-0.02,-0.01, 0.0 , 0.0 ],
+    [-1., 0., 0.,-1., 0.,-0.10, 0.00, 0.00, 0.00],
+    [-1., 0., 0., 0., 0.,-0.51, 0.00,-0.02, 0.03],
+    [-1., 2., 0., 0., 0., 0.01, 0.0 , 0.0 , 0.0 ],
+    [ 0.,-2., 1., 0., 0., 0.01, 0.0 , 0.0 , 0.0 ],
+    [ 0., 0.,-1., 0., 0., 0.02, 0.01, 0.0 , 0.0 ],
+    [ 0., 0., 1., 0., 0., 0.06, 0.00, 0.00, 0.00],
+    [ 0., 0., 1., 1., 0., 0.01, 0.0 , 0.0 , 0.0 ],
+    [ 0., 2.,-1., 0., 0., 0.01, 0.0 , 0.0 , 0.0 ],
+    [ 1.,-3., 0., 0., 1.,-0.06, 0.00, 0.00, 0.00],
+    [ 1.,-2., 0., 1., 0., 0.01, 0.0 , 0.0 , 0.0 ],
+    [ 1.,-2., 0., 0., 0.,-1.23,-0.07, 0.06, 0.01],
+    [ 1.,-1., 0., 0.,-1., 0.02, 0.0 , 0.0 , 0.0 ],
+    [ 1.,-1., 0., 0., 1., 0.04, 0.0 , 0.0 , 0.0 ],
+    [ 1., 0., 0.,-1., 0.,-0.22, 0.01, 0.01, 0.00],
+    [ 1., 0., 0., 0., 0.,12.00,-0.78,-0.67,-0.03],
+    [ 1., 0., 0., 1., 0., 1.73,-0.12,-0.10, 0.00],
+    [ 1., 0., 0., 2., 0.,-0.04, 0.0 , 0.0 , 0.0 ],
+    [ 1., 1., 0., 0.,-1.,-0.50,-0.01, 0.03, 0.00],
+    [ 1., 1., 0., 0., 1., 0.01, 0.0 , 0.0 , 0.0 ],
+    [ 1., 1., 0., 1.,-1.,-0.01, 0.0 , 0.0 , 0.0 ],
+    [ 1., 2.,-2., 0., 0.,-0.01, 0.0 , 0.0 , 0.0 ],
+    [ 1., 2., 0., 0., 0.,-0.11, 0.01, 0.01, 0.00],
+    [ 2.,-2., 1., 0., 0.,-0.01, 0.0 , 0.0 , 0.0 ],
+    [ 2., 0.,-1., 0., 0.,-0.02, 0.02, 0.0 , 0.01],
+    [ 3., 0., 0., 0., 0., 0.0 , 0.01, 0.0 , 0.01],
+    [ 3., 0., 0., 1., 0., 0.0 , 0.01, 0.0 , 0.0 ],
+], dtype=np.float32).astype(np.float64)
+
+# table 7.5b of IERS conventions 2003 (TN.32, pg.82)
+# columns are s,h,p,N',ps, dR(ip),dT(ip),dR(op),dT(op), in units of mm
+STEP2LON_TABLE = np.array([
+    [0, 0, 0, 1, 0,  0.47, 0.23, 0.16, 0.07],
+    [0, 2, 0, 0, 0, -0.20,-0.12,-0.11,-0.05],
+    [1, 0,-1, 0, 0, -0.11,-0.08,-0.09,-0.04],
+    [2, 0, 0, 0, 0, -0.13,-0.11,-0.15,-0.07],
+    [2, 0, 0, 1, 0, -0.05,-0.05,-0.06,-0.03],
+], dtype=np.float32).astype(np.float64)
+
+
+##################################  Top level  #################################################
+# leap second table limit flag of the last solid_grid/point() call, as /limitflag/ in solid.for
+limitflag = types.SimpleNamespace(leapflag=False)
+
+
+def solid_grid(iyr, imo, idy, ihh, imm, iss, glad0, steplat, nlat, glod0, steplon, nlon):
+    """Calculate SET for one spatial grid given the date/time, same as solid_grid() in solid.for.
+
+    Parameters: iyr/imo/idy/ihh/imm/iss - int, date/time for YYYY/MM/DD/HH/MM/SS
+                glad0/steplat/nlat      - float/float/int, north(Y_FIRST)/step(negative)/number in lat
+                glod0/steplon/nlon      - float/float/int, west (X_FIRST)/step(positive)/number in lon
+    Returns:    tide_e/tide_n/tide_u    - 2D np.ndarray in (nlat, nlon), SET in east/north/up in m
+                                          with the leap second table limit flag in limitflag.leapflag
+    """
+    check_date(iyr, imo, idy, ihh, imm, iss)
+    mjd, fmjd = datetime2mjd(np.datetime64(f'{iyr:04d}-{imo:02d}-{idy:02d}', 's')
+                             + np.timedelta64(ihh * 3600 + imm * 60 + iss, 's'))
+    epo, limitflag.leapflag = solid_epochs(mjd, fmjd)
+    tide_e, tide_n, tide_u = grid_kern(epo, glad0, steplat, nlat, glod0, steplon, nlon)
+    return tide_e[:, :, 0].T, tide_n[:, :, 0].T, tide_u[:, :, 0].T
+
+
+def solid_epochs(mjd, fmjd):
+    """Calculate the epoch terms of SET at multiple epochs, same as solid_epochs() in solid.for.
+
+    Parameters: mjd/fmjd - 1D np.ndarray, modified julian day (and fraction) in UTC
+    Returns:    epo      - 2D np.ndarray in (12, nt), epoch terms for grid_kern()
+                lflag    - bool, leap second table limit flag
+    """
+    epo, lflag = solid_epoch(np.atleast_1d(mjd), np.atleast_1d(fmjd))
+    return epo.T, lflag
+
+
+def solid_epochs_eph(mjd, fmjd, eph, eph0, ephstep, norder):
+    """Calculate the epoch terms of SET interpolated from a precomputed ephemeris table,
+    same as solid_epochs_eph() in solid.for.
+
+    Parameters: mjd/fmjd     - 1D np.ndarray, modified julian day (and fraction) in UTC
+                eph          - 2D np.ndarray in (16, nnode), ephemeris table at TT of
+                               eph0 + ephstep * i, see solid_epochs_eph() in solid.for
+                eph0/ephstep - float, MJD in TT of the first node / node spacing in days
+                norder       - int, number of nodes of the Lagrange interpolation
+    Returns:    epo          - 2D np.ndarray in (12, nt), epoch terms for grid_kern()
+                lflag        - bool, leap second table limit flag
+    """
+    mjd = np.atleast_1d(mjd)
+    fmjd = np.atleast_1d(fmjd)
+    eph = np.asarray(eph).T
+
+    # TT time, as in detide_epo()
+    fmjdtt, lflag = utc2ttt(mjd, fmjd)
+    dmjdtt = mjd + fmjdtt
+    fhr = (dmjdtt - np.trunc(dmjdtt)) * 24.
+
+    # first node of the interpolation window
+    ieph0 = int(eph0)
+    x = ((mjd - ieph0) + (fmjdtt - (eph0 - ieph0))) / ephstep
+    i0 = np.trunc(x).astype(np.int64) - (norder // 2 - 1)
+    i0 = np.clip(i0, 0, eph.shape[0] - norder)
+    dx = (x - i0)[:, np.newaxis]
+
+    # Lagrange interpolation
+    nodes = np.arange(norder)
+    w = np.ones((mjd.size, norder), dtype=np.float64)
+    for k in range(norder):
+        w *= np.where(nodes == k, 1., (dx - k) / np.where(nodes == k, 1., nodes - k))
+    p = np.einsum('ij,ijk->ik', w, eph[i0[:, np.newaxis] + nodes])
+
+    # sun/moon in ECEF (ignore polar motion/LOD)
+    ghar = getghar(mjd, fmjd)
+    xsun = rot3(ghar, p[:, 0], p[:, 1], p[:, 2])
+    xmon = rot3(ghar, p[:, 3], p[:, 4], p[:, 5])
+
+    # step 2 sums
+    alpha = (fhr * 15. * DEG2RAD)[:, np.newaxis]
+    sdiu = np.cos(alpha) * p[:, 6:10] + np.sin(alpha) * p[:, 10:14]
+    epo = np.concatenate([xsun, xmon, sdiu, p[:, 14:16]], axis=-1)
+    return epo.T, lflag
+
+
+def grid_kern(epo, glad0, steplat, nlat, glod0, steplon, nlon, eht=0., chunk_size=2**16):
+    """Calculate the station terms of SET for one spatial grid, same as grid_kern() in solid.for.
+
+    Parameters: epo                     - 2D np.ndarray in (12, nt), epoch terms from solid_epochs()
+                glad0/steplat/nlat      - float/float/int, north(Y_FIRST)/step(negative)/number in lat
+                glod0/steplon/nlon      - float/float/int, west (X_FIRST)/step(positive)/number in lon
+                eht                     - float, ellipsoidal height in m
+                chunk_size              - int, number of pixels x epochs per chunk, to bound the memory
+    Returns:    tide_e/tide_n/tide_u    - 3D np.ndarray in (nlon, nlat, nt), SET in east/north/up in m
+    """
+    epo = np.asarray(epo).T
+    num_date = epo.shape[0]
+
+    glad = glad0 + np.arange(nlat) * steplat
+    glod = glod0 + np.arange(nlon) * steplon
+    glod[glod <    0.] += 360.
+    glod[glod >= 360.] -= 360.
+    gla, glo = np.meshgrid(glad / RAD, glod / RAD, indexing='ij')
+    xsta = geoxyz(gla, glo, eht)
+
+    # output in (nt, nlat, nlon) in C order, i.e. (nlon, nlat, nt) in Fortran order
+    tide_e = np.empty((num_date, nlat, nlon), dtype=np.float64)
+    tide_n = np.empty((num_date, nlat, nlon), dtype=np.float64)
+    tide_u = np.empty((num_date, nlat, nlon), dtype=np.float64)
+    step = max(1, chunk_size // (nlat * nlon))
+    for i0 in range(0, num_date, step):
+        i1 = min(i0 + step, num_date)
+        etide = detide_sta(xsta, epo[i0:i1, np.newaxis, np.newaxis, :])
+        tide_n[i0:i1], tide_e[i0:i1], tide_u[i0:i1] = rge(gla, glo, etide)
+
+    return tide_e.T, tide_n.T, tide_u.T
+
+
+def grid_kern_time(epo, tnode, toff, glad0, steplat, glod0, steplon, nlon, eht=0., chunk_size=2**16):
+    """Calculate the station terms of SET for one spatial grid at the time of each row/pixel,
+    same as grid_kern_time() in solid.for.
+
+    Parameters: epo                     - 2D np.ndarray in (12, nt), epoch terms from solid_epochs()
+                tnode                   - 1D np.ndarray in (nt,), increasing time of the epochs in sec
+                toff                    - 2D np.ndarray in (ntx, nlat), time of each row (ntx=1)
+                                          or each pixel (ntx=nlon) in sec
+                glad0/steplat           - float/float, north(Y_FIRST)/step(negative) in lat
+                glod0/steplon/nlon      - float/float/int, west (X_FIRST)/step(positive)/number in lon
+                eht                     - float, ellipsoidal height in m
+                chunk_size              - int, number of pixels per chunk, to bound the memory
+    Returns:    tide_e/tide_n/tide_u    - 2D np.ndarray in (nlon, nlat), SET in east/north/up in m
+    """
+    epo = np.asarray(epo).T
+    tnode = np.asarray(tnode, dtype=np.float64)
+    toff = np.asarray(toff, dtype=np.float64).T
+    nlat, ntx = toff.shape
+    if ntx not in (1, nlon):
+        raise ValueError(f'toff should be in (1, nlat) or ({nlon}, nlat), got {toff.T.shape}!')
+
+    glad = glad0 + np.arange(nlat) * steplat
+    glod = glod0 + np.arange(nlon) * steplon
+    glod[glod <    0.] += 360.
+    glod[glod >= 360.] -= 360.
+    gla, glo = np.meshgrid(glad / RAD, glod / RAD, indexing='ij')
+    xsta = geoxyz(gla, glo, eht)
+
+    # output in (nlat, nlon) in C order, i.e. (nlon, nlat) in Fortran order
+    tide_e = np.empty((nlat, nlon), dtype=np.float64)
+    tide_n = np.empty((nlat, nlon), dtype=np.float64)
+    tide_u = np.empty((nlat, nlon), dtype=np.float64)
+    step = max(1, chunk_size // nlon)
+    for i0 in range(0, nlat, step):
+        i1 = min(i0 + step, nlat)
+        etide = detide_sta(xsta[i0:i1], interp_epo(epo, tnode, toff[i0:i1]))
+        tide_n[i0:i1], tide_e[i0:i1], tide_u[i0:i1] = rge(gla[i0:i1], glo[i0:i1], etide)
+
+    return tide_e.T, tide_n.T, tide_u.T
+
+
+def interp_epo(epo, tnode, t):
+    """Interpolate the epoch terms linearly in time, constant beyond the first/last epoch,
+    as interp_epo() in solid.for.
+
+    Parameters: epo   - 2D np.ndarray in (nt, 12), epoch terms at the epochs
+                tnode - 1D np.ndarray in (nt,), increasing time of the epochs in sec
+                t     - np.ndarray, time to interpolate to in sec
+    Returns:    epi   - np.ndarray in (..., 12), epoch terms at the time t
+    """
+    if tnode.size == 1:
+        return np.broadcast_to(epo[0], t.shape + (12,))
+    i0 = np.clip(np.searchsorted(tnode, t, side='right') - 1, 0, tnode.size - 2)
+    w1 = np.clip((t - tnode[i0]) / (tnode[i0 + 1] - tnode[i0]), 0., 1.)[..., np.newaxis]
+    return epo[i0] * (1. - w1) + epo[i0 + 1] * w1
+
+
+def solid_point(glad, glod, iyr, imo, idy, step_sec):
+    """Calculate SET at given location for one day, same as solid_point() in solid.for.
+
+    Parameters: glad/glod            - float, latitude/longitude in deg
+                iyr/imo/idy          - int, start date/time in UTC
+                step_sec             - int, time step in seconds
+    Returns:    secs                 - 1D np.ndarray, seconds since start
+                tide_e/tide_n/tide_u - 1D np.ndarray, east/north/up component of SET in m
+                                       with the leap second table limit flag in limitflag.leapflag
+    """
+    check_date(iyr, imo, idy)
+    if not -90. <= glad <= 90.:
+        raise ValueError(f'lat NOT in [-90,+90]: {glad}')
+    if not -360. <= glod <= 360.:
+        raise ValueError(f'lon NOT in [-360,+360]: {glod}')
+
+    # time
+    secs = np.arange(86400 // step_sec, dtype=np.float64) * step_sec
+    mjd = datetime2mjd(np.datetime64(f'{iyr:04d}-{imo:02d}-{idy:02d}', 's'))[0]
+    mjd = np.full(secs.size, mjd[0])
+    fmjd = secs / 86400.
+
+    # location
+    glod = glod + 360. if glod < 0. else glod
+    glod = glod - 360. if glod >= 360. else glod
+    gla, glo = glad / RAD, glod / RAD
+    xsta = geoxyz(gla, glo)
+
+    # SET
+    epo, limitflag.leapflag = solid_epoch(mjd, fmjd)
+    etide = detide_sta(xsta, epo)
+    tide_n, tide_e, tide_u = rge(gla, glo, etide)
+    return secs, tide_e, tide_n, tide_u
+
+
+def solid_point_stack(glad, glod, mjd, fmjd, eht=0., chunk_size=2**16):
+    """Calculate SET at given location for multiple epochs, same as solid_point_stack() in solid.for.
+
+    Parameters: glad/glod            - float, latitude/longitude in deg
+                mjd/fmjd             - 1D np.ndarray, modified julian day (and fraction) in UTC
+                eht                  - float, ellipsoidal height in m
+                chunk_size           - int, number of epochs per chunk, to bound the memory usage
+    Returns:    tide_e/tide_n/tide_u - 1D np.ndarray, east/north/up component of SET in m
+                lflag                - bool, leap second table limit flag
+    """
+    mjd = np.atleast_1d(mjd)
+    fmjd = np.atleast_1d(fmjd)
+
+    # location
+    glod = glod + 360. if glod < 0. else glod
+    glod = glod - 360. if glod >= 360. else glod
+    gla, glo = glad / RAD, glod / RAD
+    xsta = geoxyz(gla, glo, eht)
+
+    # SET
+    tide_e = np.empty(mjd.size, dtype=np.float64)
+    tide_n = np.empty(mjd.size, dtype=np.float64)
+    tide_u = np.empty(mjd.size, dtype=np.float64)
+    lflag = False
+    for i0 in range(0, mjd.size, chunk_size):
+        i1 = min(i0 + chunk_size, mjd.size)
+        epo, flag = solid_epoch(mjd[i0:i1], fmjd[i0:i1])
+        etide = detide_sta(xsta, epo)
+        tide_n[i0:i1], tide_e[i0:i1], tide_u[i0:i1] = rge(gla, glo, etide)
+        lflag = lflag or flag
+
+    return tide_e, tide_n, tide_u, lflag
+
+
+def solid_points(glad, glod, mjd, fmjd, eht=0., chunk_size=2**10):
+    """Calculate SET at multiple locations for multiple epochs, same as solid_points() in solid.for.
+
+    Parameters: glad/glod  - 1D np.ndarray, latitude/longitude in deg
+                mjd/fmjd   - 1D np.ndarray, modified julian day (and fraction) in UTC
+                eht        - 1D np.ndarray, ellipsoidal height in m
+                chunk_size - int, number of epochs per chunk, to bound the memory usage
+    Returns:    tide       - 3D np.ndarray in (3, nt, nsta), east/north/up component of SET in m
+                lflag      - bool, leap second table limit flag
+    """
+    mjd = np.atleast_1d(mjd)
+    fmjd = np.atleast_1d(fmjd)
+
+    # location
+    glad = np.atleast_1d(np.asarray(glad, dtype=np.float64))
+    glod = np.atleast_1d(np.array(glod, dtype=np.float64))
+    glod[glod <    0.] += 360.
+    glod[glod >= 360.] -= 360.
+    gla, glo = glad / RAD, glod / RAD
+    eht = np.broadcast_to(np.asarray(eht, dtype=np.float64), glad.shape)
+    xsta = geoxyz(gla, glo, eht)
+
+    # SET in (nsta, nt, 3) in C order, i.e. (3, nt, nsta) in Fortran order
+    tide = np.empty((glad.size, mjd.size, 3), dtype=np.float64)
+    lflag = False
+    for i0 in range(0, mjd.size, chunk_size):
+        i1 = min(i0 + chunk_size, mjd.size)
+        epo, flag = solid_epoch(mjd[i0:i1], fmjd[i0:i1])
+        etide = detide_sta(xsta[:, np.newaxis, :], epo[np.newaxis, :, :])
+        tide_n, tide_e, tide_u = rge(gla[:, np.newaxis], glo[:, np.newaxis], etide)
+        tide[:, i0:i1, 0] = tide_e
+        tide[:, i0:i1, 1] = tide_n
+        tide[:, i0:i1, 2] = tide_u
+        lflag = lflag or flag
+
+    return tide.T, lflag
+
+
+def check_date(iyr, imo, idy, ihh=0, imm=0, iss=0):
+    """Check the input date/time, as in solid_grid/point() in solid.for."""
+    for name, val, vmin, vmax in [('year', iyr, 1901, 2099), ('month', imo, 1, 12),
+                                  ('day', idy, 1, 31), ('hour', ihh, 0, 23),
+                                  ('minute', imm, 0, 59), ('second', iss, 0, 59)]:
+        if not vmin <= val <= vmax:
+            raise ValueError(f'{name} NOT in [{vmin}-{vmax}]: {val}')
+
+
+##################################  Epoch terms  ###############################################
+def solid_epoch(mjd, fmjd):
+    """Compute all time-dependent terms of the tidal displacement, as solid_epoch() in solid.for.
+
+    Parameters: mjd/fmjd - np.ndarray, modified julian day (and fraction) in UTC
+    Returns:    epo      - np.ndarray in (..., 12), epoch terms, see detide_epo()
+                lflag    - bool, leap second table limit flag
+    """
+    rsun, lflag = sunxyz(mjd, fmjd)
+    rmoon = moonxyz(mjd, fmjd)[0]
+    epo = detide_epo(mjd, fmjd, rsun, rmoon)[0]
+    return epo, lflag
+
+
+def detide_epo(mjd, fmjd, xsun, xmon):
+    """Time-dependent part of detide(), as detide_epo() in solid.for.
+
+    Parameters: mjd/fmjd  - np.ndarray, modified julian day (and fraction) in UTC
+                xsun/xmon - np.ndarray in (..., 3), geoc. position of the sun/moon (ECEF)
+    Returns:    epo       - np.ndarray in (..., 12), sun (0:3), moon (3:6) positions
+                            and the step 2 sums of the diurnal (6:10) and long-period (10:12) bands
+                lflag     - bool, leap second table limit flag
+    """
+    fmjdtt, lflag = utc2ttt(mjd, fmjd)
+    dmjdtt = mjd + fmjdtt
+    t = (dmjdtt - 51544.) / 36525.                # days to centuries, TT
+    fhr = (dmjdtt - np.trunc(dmjdtt)) * 24.       # hours in the day, TT
+    epo = np.concatenate([xsun, xmon, step2diu_epo(fhr, t), step2lon_epo(t)], axis=-1)
+    return epo, lflag
+
+
+def utc2ttt(mjd, fmjd):
+    """Convert UTC into TT time, in fraction of the day.
+
+    Parameters: mjd/fmjd - np.ndarray, modified julian day (and fraction) in UTC
+    Returns:    fmjdtt   - np.ndarray, fraction of the day in TT
+                lflag    - bool, leap second table limit flag
+    """
+    utc_tai, lflag = getutcmtai(mjd)
+    tsectt = fmjd * 86400. - utc_tai + 32.184
+    return tsectt / 86400., lflag
+
+
+def getutcmtai(mjd):
+    """Get UTC - TAI in seconds, with the boundary edge value used outside of the leap second table.
+
+    Parameters: mjd     - np.ndarray in int, modified julian day in UTC
+    Returns:    utc_tai - np.ndarray, UTC - TAI in seconds
+                lflag   - bool, leap second table limit flag
+    """
+    leap_sec = get_leap_seconds()
+    mjd = np.asarray(mjd)
+    idx = np.searchsorted(leap_sec.mjd, mjd, side='right') - 1
+    utc_tai = -leap_sec.tai_utc[np.clip(idx, 0, None)]
+    lflag = bool(np.any(mjd > leap_sec.mjd_upper) or np.any(mjd < leap_sec.mjd[0]))
+    return utc_tai, lflag
+
+
+def getghar(mjd, fmjd):
+    """Convert mjd/fmjd in UTC time to Greenwich hour angle (in radians)."""
+    d = (mjd - 51544) + (fmjd - 0.5)                      # days since J2000
+    ghad = 280.46061837504 + 360.9856473662862 * d        # eq. 2.85 (+digits)
+    ghar = np.fmod(ghad, 360.) / RAD
+    return np.where(ghar < 0., ghar + PI2, ghar)
+
+
+def sunxyz(mjd, fmjd):
+    """Get low-precision, geocentric coordinates for sun (ECEF).
+
+    Parameters: mjd/fmjd - np.ndarray, modified julian day (and fraction) in UTC
+    Returns:    rs       - np.ndarray in (..., 3), geocentric solar position vector [m] in ECEF
+                lflag    - bool, leap second table limit flag
+    """
+    # julian centuries since 1.5 january 2000 (J2000), TT
+    fmjdtt, lflag = utc2ttt(mjd, fmjd)
+    tjdtt = mjd + fmjdtt + 2400000.5
+    t = (tjdtt - 2451545.) / 36525.
+    rs = sun_eme2000(t)
+
+    # convert position vector of sun to ECEF (ignore polar motion/LOD)
+    ghar = getghar(mjd, fmjd)
+    return rot3(ghar, rs[..., 0], rs[..., 1], rs[..., 2]), lflag
+
+
+def sun_eme2000(t):
+    """Get low-precision, geocentric coordinates for sun (mean equinox & ecliptic of J2000).
+
+    Parameters: t  - np.ndarray, julian centuries since 1.5 january 2000 (J2000), TT
+    Returns:    rs - np.ndarray in (..., 3), geocentric solar position vector [m] in EME2000
+    """
+    # mean elements for year 2000, sun ecliptic orbit wrt. Earth
+    obe = 23.43929111 / RAD        # obliquity of the J2000 ecliptic
+    sobe = np.sin(obe)
+    cobe = np.cos(obe)
+    opod = 282.9400                # RAAN + arg.peri. (deg.)
+
+    emdeg = 357.5256 + 35999.049 * t
+    em = emdeg / RAD
+    em2 = em + em
+
+    # series expansions in mean anomaly, em (eq. 3.43, p.71)
+    r = (149.619 - 2.499 * np.cos(em) - 0.021 * np.cos(em2)) * 1.e9
+    slond = opod + emdeg + (6892. * np.sin(em) + 72. * np.sin(em2)) / 3600.
+
+    # precession of equinox wrt. J2000 (p.71)
+    slond = slond + 1.3972 * t
+
+    # position vector of sun (mean equinox & ecliptic of J2000) (EME2000, ICRF)
+    slon = slond / RAD
+    sslon = np.sin(slon)
+    cslon = np.cos(slon)
+    rs1 = r * cslon
+    rs2 = r * sslon * cobe
+    rs3 = r * sslon * sobe
+    return np.stack(np.broadcast_arrays(rs1, rs2, rs3), axis=-1)
+
+
+def moonxyz(mjd, fmjd):
+    """Get low-precision, geocentric coordinates for moon (ECEF).
+
+    Parameters: mjd/fmjd - np.ndarray, modified julian day (and fraction) in UTC
+    Returns:    rm       - np.ndarray in (..., 3), geocentric lunar position vector [m] in ECEF
+                lflag    - bool, leap second table limit flag
+    """
+    # julian centuries since 1.5 january 2000 (J2000), TT
+    fmjdtt, lflag = utc2ttt(mjd, fmjd)
+    tjdtt = mjd + fmjdtt + 2400000.5
+    t = (tjdtt - 2451545.) / 36525.
+    rm = moon_eme2000(t)
+
+    # convert position vector of moon to ECEF (ignore polar motion/LOD)
+    ghar = getghar(mjd, fmjd)
+    return rot3(ghar, rm[..., 0], rm[..., 1], rm[..., 2]), lflag
+
+
+def moon_eme2000(t):
+    """Get low-precision, geocentric coordinates for moon (mean equinox & ecliptic of J2000).
+
+    Parameters: t  - np.ndarray, julian centuries since 1.5 january 2000 (J2000), TT
+    Returns:    rm - np.ndarray in (..., 3), geocentric lunar position vector [m] in EME2000
+    """
+    # mean longitude/anomaly of Moon, mean anomaly of Sun, mean angular distance of Moon
+    # from ascending node, difference between mean longitudes of Sun and Moon (eq. 3.47, p.72)
+    el0 = 218.31617 + 481267.88088 * t - _f32(1.3972) * t
+    el  = 134.96292 + 477198.86753 * t
+    elp = 357.52543 +  35999.04944 * t
+    f   =  93.27283 + 483202.01873 * t
+    d   = 297.85027 + 445267.11135 * t
+
+    # longitude w.r.t. equinox and ecliptic of year 2000 (eq 3.48, p.72)
+    selond = (el0
+              + 22640. / 3600. * np.sin((el          ) / RAD)
+              +   769. / 3600. * np.sin((el + el     ) / RAD)
+              -  4586. / 3600. * np.sin((el - d - d  ) / RAD)
+              +  2370. / 3600. * np.sin((d + d       ) / RAD)
+              -   668. / 3600. * np.sin((elp         ) / RAD)
+              -   412. / 3600. * np.sin((f + f       ) / RAD)
+              -   212. / 3600. * np.sin((el + el - d - d ) / RAD)
+              -   206. / 3600. * np.sin((el + elp - d - d) / RAD)
+              +   192. / 3600. * np.sin((el + d + d  ) / RAD)
+              -   165. / 3600. * np.sin((elp - d - d ) / RAD)
+              +   148. / 3600. * np.sin((el - elp    ) / RAD)
+              -   125. / 3600. * np.sin((d           ) / RAD)
+              -   110. / 3600. * np.sin((el + elp    ) / RAD)
+              -    55. / 3600. * np.sin((f + f - d - d ) / RAD))
+
+    # latitude w.r.t. equinox and ecliptic of year 2000 (eq 3.49, p.72)
+    q = 412. / 3600. * np.sin((f + f) / RAD) + 541. / 3600. * np.sin((elp) / RAD)
+    selatd = (18520. / 3600. * np.sin((f + selond - el0 + q) / RAD)
+              -  526. / 3600. * np.sin((f - d - d       ) / RAD)
+              +   44. / 3600. * np.sin((el + f - d - d  ) / RAD)
+              -   31. / 3600. * np.sin((-el + f - d - d ) / RAD)
+              -   25. / 3600. * np.sin((-el - el + f    ) / RAD)
+              -   23. / 3600. * np.sin((elp + f - d - d ) / RAD)
+              +   21. / 3600. * np.sin((-el + f         ) / RAD)
+              +   11. / 3600. * np.sin((-elp + f - d - d) / RAD))
+
+    # distance from Earth center to Moon (m) (eq 3.50, p.72)
+    rse = (385000. * 1000.
+           - 20905. * 1000. * np.cos((el          ) / RAD)
+           -  3699. * 1000. * np.cos((d + d - el  ) / RAD)
+           -  2956. * 1000. * np.cos((d + d       ) / RAD)
+           -   570. * 1000. * np.cos((el + el     ) / RAD)
+           +   246. * 1000. * np.cos((el + el - d - d ) / RAD)
+           -   205. * 1000. * np.cos((elp - d - d ) / RAD)
+           -   171. * 1000. * np.cos((el + d + d  ) / RAD)
+           -   152. * 1000. * np.cos((el + elp - d - d) / RAD))
+
+    # precession of equinox wrt. J2000 (p.71)
+    selond = selond + 1.3972 * t
+
+    # position vector of moon (mean equinox & ecliptic of J2000) (EME2000, ICRF)
+    oblir = 23.43929111 / RAD      # obliquity of the J2000 ecliptic
+    sselat = np.sin(selatd / RAD)
+    cselat = np.cos(selatd / RAD)
+    sselon = np.sin(selond / RAD)
+    cselon = np.cos(selond / RAD)
+    t1 = rse * cselon * cselat
+    t2 = rse * sselon * cselat
+    t3 = rse *          sselat
+    return rot1(-oblir, t1, t2, t3)
+
+
+def _step2_args(t):
+    """Get the fundamental arguments s, h, p, N', ps (deg) for step 2, as in step2diu/lon()."""
+    s = 218.31664563 + 481267.88194 * t - 0.0014663889 * t * t + 0.00000185139 * t**3
+    pr = (_f32(1.396971278) * t + _f32(0.000308889) * t * t
+          + _f32(0.000000021) * t**3 + _f32(0.000000007) * t**4)
+    h = (280.46645 + 36000.7697489 * t + 0.00030322222 * t * t
+         + _f32(0.000000020) * t**3 - _f32(0.00000000654) * t**4)
+    p = (83.35324312 + 4069.01363525 * t - 0.01032172222 * t * t
+         - 0.0000124991 * t**3 + 0.00000005263 * t**4)
+    zns = (234.95544499 + 1934.13626197 * t - 0.00207561111 * t * t
+           - 0.00000213944 * t**3 + 0.00000001650 * t**4)
+    ps = (282.93734098 + 1.71945766667 * t + 0.00045688889 * t * t
+          - 0.00000001778 * t**3 - 0.00000000334 * t**4)
+    return s, pr, h, p, zns, ps
+
+
+def step2diu_epo(fhr, t):
+    """Time-dependent part of step2diu(), as step2diu_epo() in solid.for.
+
+    Parameters: fhr  - np.ndarray, hours in the day, TT
+                t    - np.ndarray, julian centuries since J2000, TT
+    Returns:    sdiu - np.ndarray in (..., 4), dR/dN coefficients of cos/sin(longitude) in mm
+    """
+    s, pr, h, p, zns, ps = _step2_args(t)
+    tau = (fhr * 15. + 280.4606184 + 36000.7700536 * t + 0.00038793 * t * t
+           - 0.0000000258 * t**3 - s)
+    s = s + pr
+
+    # reduce angles to between 0 and 360
+    args = np.stack([np.fmod(x, 360.) for x in [s, h, p, zns, ps]], axis=-1)
+    tau = np.fmod(tau, 360.)
+
+    tbl = STEP2DIU_TABLE
+    thetaf = (tau[..., np.newaxis] + args @ tbl[:, :5].T) * DEG2RAD
+    sth = np.sin(thetaf)
+    cth = np.cos(thetaf)
+    sdiu = np.stack([sth @ tbl[:, 5] + cth @ tbl[:, 6],
+                     cth @ tbl[:, 5] - sth @ tbl[:, 6],
+                     sth @ tbl[:, 7] + cth @ tbl[:, 8],
+                     cth @ tbl[:, 7] - sth @ tbl[:, 8]], axis=-1)
+    return sdiu
+
+
+def step2lon_epo(t):
+    """Time-dependent part of step2lon(), as step2lon_epo() in solid.for.
+
+    Parameters: t    - np.ndarray, julian centuries since J2000, TT
+    Returns:    slon - np.ndarray in (..., 2), dR/dN coefficients in mm
+    """
+    s, pr, h, p, zns, ps = _step2_args(t)
+    s = s + pr
+
+    # reduce angles to between 0 and 360
+    args = np.stack([np.fmod(x, 360.) for x in [s, h, p, zns, ps]], axis=-1)
+
+    tbl = STEP2LON_TABLE
+    thetaf = (args @ tbl[:, :5].T) * DEG2RAD
+    sth = np.sin(thetaf)
+    cth = np.cos(thetaf)
+    slon = np.stack([cth @ tbl[:, 5] + sth @ tbl[:, 7],
+                     cth @ tbl[:, 6] + sth @ tbl[:, 8]], axis=-1)
+    return slon
+
+
+##################################  Station terms  #############################################
+def detide(xsta, mjd, fmjd, xsun, xmon):
+    """Computation of tidal corrections of station displacements caused by lunar and solar
+    gravitational attraction, as detide() in solid.for.
+
+    Parameters: xsta      - np.ndarray in (..., 3), geocentric position of the station (ECEF)
+                mjd/fmjd  - np.ndarray, modified julian day (and fraction) in UTC
+                xsun/xmon - np.ndarray in (..., 3), geoc. position of the sun/moon (ECEF)
+    Returns:    dxtide    - np.ndarray in (..., 3), displacement vector (ECEF)
+                lflag     - bool, leap second table limit flag
+    """
+    epo, lflag = detide_epo(mjd, fmjd, xsun, xmon)
+    return detide_sta(xsta, epo), lflag
+
+
+def detide_sta(xsta, epo):
+    """Station-dependent part of detide(), as detide_sta() in solid.for.
+
+    Parameters: xsta   - np.ndarray in (..., 3), geocentric position of the station (ECEF)
+                epo    - np.ndarray in (..., 12), epoch terms from solid_epoch()
+    Returns:    dxtide - np.ndarray in (..., 3), displacement vector (ECEF)
+    """
+    # nominal second degree and third degree love numbers and shida numbers
+    h20, l20, h3, l3 = 0.6078, 0.0847, 0.292, 0.015
+
+    xsun = epo[..., 0:3]
+    xmon = epo[..., 3:6]
+
+    # scalar product of station vector with sun/moon vector
+    rsta = _norm(xsta)
+    rsun = _norm(xsun)
+    rmon = _norm(xmon)
+    scsun = _dot(xsta, xsun) / rsta / rsun
+    scmon = _dot(xsta, xmon) / rsta / rmon
+
+    # computation of new h2 and l2
+    cosphi = np.sqrt(xsta[..., 0] * xsta[..., 0] + xsta[..., 1] * xsta[..., 1]) / rsta
+    h2 = h20 - 0.0006 * (1. - 3. / 2. * cosphi * cosphi)
+    l2 = l20 + 0.0002 * (1. - 3. / 2. * cosphi * cosphi)
+
+    # p2/p3-term
+    p2sun = 3. * (h2 / 2. - l2) * scsun * scsun - h2 / 2.
+    p2mon = 3. * (h2 / 2. - l2) * scmon * scmon - h2 / 2.
+    p3sun = 5. / 2. * (h3 - 3. * l3) * scsun**3 + 3. / 2. * (l3 - h3) * scsun
+    p3mon = 5. / 2. * (h3 - 3. * l3) * scmon**3 + 3. / 2. * (l3 - h3) * scmon
+
+    # term in direction of sun/moon vector
+    x2sun = 3. * l2 * scsun
+    x2mon = 3. * l2 * scmon
+    x3sun = 3. * l3 / 2. * (5. * scsun * scsun - 1.)
+    x3mon = 3. * l3 / 2. * (5. * scmon * scmon - 1.)
+
+    # factors for sun/moon
+    mass_ratio_sun = 332945.943062
+    mass_ratio_moon = 0.012300034
+    re = 6378136.55
+    fac2sun = mass_ratio_sun * re * (re / rsun)**3
+    fac2mon = mass_ratio_moon * re * (re / rmon)**3
+    fac3sun = fac2sun * (re / rsun)
+    fac3mon = fac2mon * (re / rmon)
+
+    # total displacement
+    e = np.newaxis
+    dxtide = (fac2sun[..., e] * (x2sun[..., e] * xsun / rsun[..., e] + p2sun[..., e] * xsta / rsta[..., e])
+              + fac2mon[..., e] * (x2mon[..., e] * xmon / rmon[..., e] + p2mon[..., e] * xsta / rsta[..., e])
+              + fac3sun[..., e] * (x3sun[..., e] * xsun / rsun[..., e] + p3sun[..., e] * xsta / rsta[..., e])
+              + fac3mon[..., e] * (x3mon[..., e] * xmon / rmon[..., e] + p3mon[..., e] * xsta / rsta[..., e]))
+
+    # corrections for the out-of-phase part of love numbers (part h_2^(0)i and l_2^(0)i)
+    # first, for the diurnal band; second, for the semi-diurnal band
+    dxtide = dxtide + st1idiu(xsta, xsun, xmon, fac2sun, fac2mon)
+    dxtide = dxtide + st1isem(xsta, xsun, xmon, fac2sun, fac2mon)
+
+    # corrections for the latitude dependence of love numbers (part l^(1))
+    dxtide = dxtide + st1l1(xsta, xsun, xmon, fac2sun, fac2mon)
+
+    # consider corrections for step 2: the diurnal and long-period bands
+    # (in-phase and out-of-phase frequency dependence)
+    dxtide = dxtide + step2diu_sta(xsta, epo[..., 6:10])
+    dxtide = dxtide + step2lon_sta(xsta, epo[..., 10:12])
+
+    return dxtide
+
+
+def st1l1(xsta, xsun, xmon, fac2sun, fac2mon):
+    """Corrections induced by the latitude dependence given by l^(1) in mahtews et al (1991)."""
+    l1d, l1sd = 0.0012, 0.0024
+    sinphi, cosphi, sinla, cosla = _sta_angles(xsta)
+    rsun = _norm(xsun)
+    rmon = _norm(xmon)
+    xs, ys, zs = xsun[..., 0], xsun[..., 1], xsun[..., 2]
+    xm, ym, zm = xmon[..., 0], xmon[..., 1], xmon[..., 2]
+
+    # for the diurnal band
+    l1 = l1d
+    dnsun = -l1 * sinphi**2 * fac2sun * zs * (xs * cosla + ys * sinla) / rsun**2
+    dnmon = -l1 * sinphi**2 * fac2mon * zm * (xm * cosla + ym * sinla) / rmon**2
+    desun = l1 * sinphi * (cosphi**2 - sinphi**2) * fac2sun * zs * (xs * sinla - ys * cosla) / rsun**2
+    demon = l1 * sinphi * (cosphi**2 - sinphi**2) * fac2mon * zm * (xm * sinla - ym * cosla) / rmon**2
+    de = 3. * (desun + demon)
+    dn = 3. * (dnsun + dnmon)
+    x1 = -de * sinla - dn * sinphi * cosla
+    x2 =  de * cosla - dn * sinphi * sinla
+    x3 =               dn * cosphi
+
+    # for the semi-diurnal band
+    l1 = l1sd
+    costwola = cosla**2 - sinla**2
+    sintwola = 2. * cosla * sinla
+    dnsun = (-l1 / 2. * sinphi * cosphi * fac2sun
+             * ((xs**2 - ys**2) * costwola + 2. * xs * ys * sintwola) / rsun**2)
+    dnmon = (-l1 / 2. * sinphi * cosphi * fac2mon
+             * ((xm**2 - ym**2) * costwola + 2. * xm * ym * sintwola) / rmon**2)
+    desun = (-l1 / 2. * sinphi**2 * cosphi * fac2sun
+             * ((xs**2 - ys**2) * sintwola - 2. * xs * ys * costwola) / rsun**2)
+    demon = (-l1 / 2. * sinphi**2 * cosphi * fac2mon
+             * ((xm**2 - ym**2) * sintwola - 2. * xm * ym * costwola) / rmon**2)
+    de = 3. * (desun + demon)
+    dn = 3. * (dnsun + dnmon)
+    x1 = x1 - de * sinla - dn * sinphi * cosla
+    x2 = x2 + de * cosla - dn * sinphi * sinla
+    x3 = x3              + dn * cosphi
+
+    return np.stack([x1, x2, x3], axis=-1)
+
+
+def st1idiu(xsta, xsun, xmon, fac2sun, fac2mon):
+    """Out-of-phase corrections induced by mantle inelasticity in the diurnal band."""
+    dhi, dli = -0.0025, -0.0007
+    sinphi, cosphi, sinla, cosla = _sta_angles(xsta)
+    cos2phi = cosphi**2 - sinphi**2
+    rsun = _norm(xsun)
+    rmon = _norm(xmon)
+    xs, ys, zs = xsun[..., 0], xsun[..., 1], xsun[..., 2]
+    xm, ym, zm = xmon[..., 0], xmon[..., 1], xmon[..., 2]
+
+    drsun = -3. * dhi * sinphi * cosphi * fac2sun * zs * (xs * sinla - ys * cosla) / rsun**2
+    drmon = -3. * dhi * sinphi * cosphi * fac2mon * zm * (xm * sinla - ym * cosla) / rmon**2
+    dnsun = -3. * dli * cos2phi * fac2sun * zs * (xs * sinla - ys * cosla) / rsun**2
+    dnmon = -3. * dli * cos2phi * fac2mon * zm * (xm * sinla - ym * cosla) / rmon**2
+    desun = -3. * dli * sinphi * fac2sun * zs * (xs * cosla + ys * sinla) / rsun**2
+    demon = -3. * dli * sinphi * fac2mon * zm * (xm * cosla + ym * sinla) / rmon**2
+    dr = drsun + drmon
+    dn = dnsun + dnmon
+    de = desun + demon
+    return _rne2xyz(dr, dn, de, sinphi, cosphi, sinla, cosla)
+
+
+def st1isem(xsta, xsun, xmon, fac2sun, fac2mon):
+    """Out-of-phase corrections induced by mantle inelasticity in the semi-diurnal band."""
+    dhi, dli = -0.0022, -0.0007
+    sinphi, cosphi, sinla, cosla = _sta_angles(xsta)
+    costwola = cosla**2 - sinla**2
+    sintwola = 2. * cosla * sinla
+    rsun = _norm(xsun)
+    rmon = _norm(xmon)
+    xs, ys = xsun[..., 0], xsun[..., 1]
+    xm, ym = xmon[..., 0], xmon[..., 1]
+
+    drsun = (-3. / 4. * dhi * cosphi**2 * fac2sun
+             * ((xs**2 - ys**2) * sintwola - 2. * xs * ys * costwola) / rsun**2)
+    drmon = (-3. / 4. * dhi * cosphi**2 * fac2mon
+             * ((xm**2 - ym**2) * sintwola - 2. * xm * ym * costwola) / rmon**2)
+    dnsun = (1.5 * dli * sinphi * cosphi * fac2sun
+             * ((xs**2 - ys**2) * sintwola - 2. * xs * ys * costwola) / rsun**2)
+    dnmon = (1.5 * dli * sinphi * cosphi * fac2mon
+             * ((xm**2 - ym**2) * sintwola - 2. * xm * ym * costwola) / rmon**2)
+    desun = (-3. / 2. * dli * cosphi * fac2sun
+             * ((xs**2 - ys**2) * costwola + 2. * xs * ys * sintwola) / rsun**2)
+    demon = (-3. / 2. * dli * cosphi * fac2mon
+             * ((xm**2 - ym**2) * costwola + 2. * xm * ym * sintwola) / rmon**2)
+    dr = drsun + drmon
+    dn = dnsun + dnmon
+    de = desun + demon
+    return _rne2xyz(dr, dn, de, sinphi, cosphi, sinla, cosla)
+
+
+def step2diu(xsta, fhr, t):
+    """Frequency dependence of the love numbers in the diurnal band, as step2diu() in solid.for."""
+    return step2diu_sta(xsta, step2diu_epo(fhr, t))
+
+
+def step2diu_sta(xsta, sdiu):
+    """Station-dependent part of step2diu(), given sdiu from step2diu_epo()."""
+    sinphi, cosphi, sinla, cosla = _sta_angles(xsta)
+    dr = 2. * sinphi * cosphi * (sdiu[..., 0] * cosla + sdiu[..., 1] * sinla)
+    dn = (cosphi**2 - sinphi**2) * (sdiu[..., 2] * cosla + sdiu[..., 3] * sinla)
+    de = sinphi * (sdiu[..., 3] * cosla - sdiu[..., 2] * sinla)
+    return _rne2xyz(dr, dn, de, sinphi, cosphi, sinla, cosla) / 1000.
+
+
+def step2lon(xsta, fhr, t):
+    """Frequency dependence of the love numbers in the long-period band, as step2lon() in solid.for."""
+    return step2lon_sta(xsta, step2lon_epo(t))
+
+
+def step2lon_sta(xsta, slon):
+    """Station-dependent part of step2lon(), given slon from step2lon_epo()."""
+    sinphi, cosphi, sinla, cosla = _sta_angles(xsta)
+    dr = slon[..., 0] * (3. * sinphi**2 - 1.) / 2.
+    dn = slon[..., 1] * (cosphi * sinphi * 2.)
+    de = np.zeros_like(dr)
+    return _rne2xyz(dr, dn, de, sinphi, cosphi, sinla, cosla) / 1000.
+
+
+##################################  Coordinates  ###############################################
+def geoxyz(gla, glo, eht=0.):
+    """Convert geodetic lat, long (radians), ellip ht. (m) to x,y,z in np.ndarray in (..., 3)."""
+    sla = np.sin(gla)
+    cla = np.cos(gla)
+    w2 = 1. - E2 * sla * sla
+    w = np.sqrt(w2)
+    en = A / w
+
+    x = (en + eht) * cla * np.cos(glo)
+    y = (en + eht) * cla * np.sin(glo)
+    z = (en * (1. - E2) + eht) * sla
+    return np.stack(np.broadcast_arrays(x, y, z), axis=-1)
+
+
+def rge(gla, glo, xyz):
+    """Given a rectangular cartesian system (x,y,z) in (..., 3),
+    compute a geodetic h cartesian sys (u,v,w), i.e. north, east and up."""
+    sb = np.sin(gla)
+    cb = np.cos(gla)
+    sl = np.sin(glo)
+    cl = np.cos(glo)
+    x, y, z = xyz[..., 0], xyz[..., 1], xyz[..., 2]
+
+    u = -sb * cl * x - sb * sl * y + cb * z
+    v = -     sl * x +      cl * y
+    w =  cb * cl * x + cb * sl * y + sb * z
+    return u, v, w
+
+
+def rot1(theta, x, y, z):
+    """Rotate coordinate axes about 1 axis by angle of theta radians."""
+    s = np.sin(theta)
+    c = np.cos(theta)
+    return np.stack(np.broadcast_arrays(x, c * y + s * z, c * z - s * y), axis=-1)
+
+
+def rot3(theta, x, y, z):
+    """Rotate coordinate axes about 3 axis by angle of theta radians."""
+    s = np.sin(theta)
+    c = np.cos(theta)
+    return np.stack(np.broadcast_arrays(c * x + s * y, c * y - s * x, z), axis=-1)
+
+
+def _norm(x):
+    return np.sqrt(x[..., 0] * x[..., 0] + x[..., 1] * x[..., 1] + x[..., 2] * x[..., 2])
+
+
+def _dot(x, y):
+    return x[..., 0] * y[..., 0] + x[..., 1] * y[..., 1] + x[..., 2] * y[..., 2]
+
+
+def _sta_angles(xsta):
+    """Get sin/cos of the geocentric latitude and longitude of the station."""
+    rsta = _norm(xsta)
+    sinphi = xsta[..., 2] / rsta
+    cosphi = np.sqrt(xsta[..., 0]**2 + xsta[..., 1]**2) / rsta
+    sinla = xsta[..., 1] / cosphi / rsta
+    cosla = xsta[..., 0] / cosphi / rsta
+    return sinphi, cosphi, sinla, cosla
+
+
+def _rne2xyz(dr, dn, de, sinphi, cosphi, sinla, cosla):
+    """Convert displacement in radial/north/east into x,y,z in np.ndarray in (..., 3)."""
+    x1 = dr * cosla * cosphi - de * sinla - dn * sinphi * cosla
+    x2 = dr * sinla * cosphi + de * cosla - dn * sinphi * sinla
+    x3 = dr * sinphi + dn * cosphi
+    return np.stack([x1, x2, x3], axis=-1)
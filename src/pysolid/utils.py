@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+#######################################################################
+# Utilities shared by the grid and point modes.
+# Copyright 2020, by the California Institute of Technology.
+#######################################################################
+
+
+import collections
+import datetime as dt
+import os
+import re
+import sys
+import warnings
+
+import numpy as np
+
+
+# modified julian day zero: 1858-11-17T00:00:00
+MJD_EPOCH = np.datetime64('1858-11-17T00:00:00', 'us')
+US_PER_DAY = 86400 * 1_000_000
+
+# leap second table, in the format of https://hpiers.obspm.fr/iers/bul/bulc/Leap_Second.dat
+LEAP_SECOND_FILE = os.path.join(os.path.dirname(__file__), 'Leap_Second.dat')
+MAX_NUM_LEAP_SECOND = 200   # max number of entries, as MAXLEAP in solid.for
+
+# leap second table
+#   mjd       - 1D np.ndarray in int32, MJD of the first day with the new TAI-UTC value, sorted
+#   tai_utc   - 1D np.ndarray in float64, TAI-UTC in seconds
+#   mjd_upper - int, upper limit of the table in MJD, i.e. the expiration date of the file
+LeapSeconds = collections.namedtuple('LeapSeconds', 'mjd tai_utc mjd_upper')
+
+# the leap second table in use, loaded on the first use, and the one set into solid.for
+_leap_seconds = None
+_leap_seconds_fortran = None
+
+# the compiled solid.for module, bound on the first use
+_solid = None
+
+
+def datetime2mjd(dt_objs):
+    """Convert date/time(s) in UTC into modified julian day (MJD) and fraction of the day.
+
+    Parameters: dt_objs - datetime.datetime / np.datetime64 object, or list/np.ndarray of them,
+                          with precision up to the microsecond
+    Returns:    mjd     - 1D np.ndarray in int32, integer part of MJD
+                fmjd    - 1D np.ndarray in float64, fractional part of MJD in [0, 1)
+    Examples:   mjd, fmjd = datetime2mjd(dt.datetime(2020, 12, 25, 14, 7, 44))
+    """
+    tus = np.atleast_1d(np.asarray(dt_objs, dtype='datetime64[us]'))
+    tus = (tus - MJD_EPOCH).astype(np.int64)
+    mjd = (tus // US_PER_DAY).astype(np.int32)
+    fmjd = (tus % US_PER_DAY) / float(US_PER_DAY)
+    return mjd, fmjd
+
+
+def get_backend(backend='fortran'):
+    """Get the module to calculate solid Earth tides.
+
+    Parameters: backend - str, fortran (default) for solid.for compiled via f2py,
+                               numpy   for the pure NumPy implementation in solid_numpy.py
+    Returns:    module  - module with the functions called by the grid/point modes:
+                          solid_epochs/solid_epochs_eph - epoch terms, see pysolid.ephemeris.calc_epochs()
+                          grid_kern/grid_kern_time      - station terms on a grid, see pysolid.grid
+                          solid_point/solid_point_stack - SET at one location, see pysolid.point
+                          solid_points                  - SET at multiple locations
+                          set_leapsec (fortran only)    - leap second table, see set_leap_seconds()
+    """
+    if backend == 'fortran':
+        global _solid, _leap_seconds_fortran
+        if _solid is None:
+            try:
+                from pysolid import solid
+            except ImportError:
+                msg = "Cannot import name 'solid' from 'pysolid'!"
+                msg += '\n    Maybe solid.for is NOT compiled yet.'
+                msg += '\n    Check instruction at: https://github.com/insarlab/PySolid.'
+                msg += "\n    Or use the pure NumPy implementation via backend='numpy'."
+                raise ImportError(msg)
+            _solid = solid
+
+        # pass the leap second table into solid.for, once per table
+        leap_sec = get_leap_seconds()
+        if _leap_seconds_fortran is not leap_sec:
+            _solid.set_leapsec(leap_sec.mjd, leap_sec.tai_utc, leap_sec.mjd_upper)
+            _leap_seconds_fortran = leap_sec
+        return _solid
+
+    elif backend == 'numpy':
+        from pysolid import solid_numpy
+        return solid_numpy
+
+    else:
+        raise ValueError(f'Un-recognized backend: {backend}! Available: fortran, numpy.')
+
+
+def enu2los(e, n, u, inc_angle, az_angle):
+    """Project east/north/up components onto the line-of-sight (LOS) direction.
+
+    The angles follow the convention of MintPy, i.e. positive LOS for motion toward the satellite.
+
+    Parameters: e/n/u     - float or np.ndarray, displacement in east/north/up direction
+                inc_angle - float or np.ndarray, incidence angle of the LOS vector in degrees
+                az_angle  - float or np.ndarray, azimuth angle of the LOS vector from the ground to the
+                            satellite, measured from the north with anti-clockwise as positive,
+                            in degrees, e.g. -102 for ascending and 102 for descending Sentinel-1
+    Returns:    los       - float or np.ndarray, displacement in LOS direction
+    Examples:   tide_los = enu2los(tide_e, tide_n, tide_u, inc_angle=34, az_angle=-102)
+    """
+    inc_angle = np.deg2rad(inc_angle)
+    az_angle = np.deg2rad(az_angle)
+    los = (  e * np.sin(inc_angle) * np.sin(az_angle) * -1
+           + n * np.sin(inc_angle) * np.cos(az_angle)
+           + u * np.cos(inc_angle))
+    return los
+
+
+################################  Leap seconds  ###############################################
+def read_leap_seconds(fname=LEAP_SECOND_FILE):
+    """Read the leap second table from a text file.
+
+    Parameters: fname    - str, path of the leap second file in the format of the IERS, i.e.
+                           lines of MJD, day, month, year and TAI-UTC, with the expiration date
+                           in the comment line of "File expires on DD Month YYYY"
+    Returns:    leap_sec - LeapSeconds namedtuple
+    Examples:   leap_sec = read_leap_seconds('Leap_Second.dat')
+    """
+    mjd, tai_utc = [], []
+    mjd_upper = None
+    with open(fname) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('#'):
+                m = re.search(r'File expires on\s+(\d+\s+\w+\s+\d{4})', line)
+                if m:
+                    mjd_upper = datetime2mjd(dt.datetime.strptime(m.group(1), '%d %B %Y'))[0][0]
+            elif line:
+                fields = line.split()
+                mjd.append(int(float(fields[0])))
+                tai_utc.append(float(fields[-1]))
+
+    if len(mjd) == 0:
+        raise ValueError(f'No leap second found in file: {fname}!')
+
+    # without the expiration date, the table is valid until the last leap second only
+    mjd_upper = mjd[-1] if mjd_upper is None else mjd_upper
+    return check_leap_seconds(LeapSeconds(mjd, tai_utc, mjd_upper), src=f'file: {fname}')
+
+
+def check_leap_seconds(leap_sec, src='the input table'):
+    """Check the leap second table and convert it into the data types in use.
+
+    Both backends look up the table via bisection, thus assume it is sorted.
+
+    Parameters: leap_sec - LeapSeconds namedtuple, or tuple of (mjd, tai_utc, mjd_upper)
+                src      - str, source of the table, for the error message
+    Returns:    leap_sec - LeapSeconds namedtuple, with mjd in int32, tai_utc in float64 and
+                           mjd_upper in int
+    """
+    mjd, tai_utc, mjd_upper = leap_sec
+    mjd = np.array(mjd, dtype=np.int32).ravel()
+    tai_utc = np.array(tai_utc, dtype=np.float64).ravel()
+    if mjd.size != tai_utc.size:
+        raise ValueError(f'Leap seconds in different sizes of MJD ({mjd.size}) and TAI-UTC '
+                         f'({tai_utc.size}) in {src}!')
+    if mjd.size == 0:
+        raise ValueError(f'No leap second found in {src}!')
+    if mjd.size > MAX_NUM_LEAP_SECOND:
+        raise ValueError(f'Too many leap seconds ({mjd.size} > {MAX_NUM_LEAP_SECOND}) in {src}!')
+    if np.any(np.diff(mjd) <= 0):
+        raise ValueError(f'Leap seconds NOT sorted in time in {src}!')
+    mjd_upper = int(mjd_upper)
+    if mjd_upper < mjd[-1]:
+        raise ValueError(f'Expiration date (MJD {mjd_upper}) before the last leap second '
+                         f'(MJD {mjd[-1]}) in {src}!')
+    return LeapSeconds(mjd, tai_utc, mjd_upper)
+
+
+def get_leap_seconds():
+    """Get the leap second table in use, read from LEAP_SECOND_FILE by default."""
+    global _leap_seconds
+    if _leap_seconds is None:
+        _leap_seconds = read_leap_seconds()
+    return _leap_seconds
+
+
+def set_leap_seconds(leap_sec=None):
+    """Set the leap second table in use, for both the fortran and numpy backends.
+
+    Parameters: leap_sec - str, path of the leap second file, see read_leap_seconds(), or
+                           LeapSeconds namedtuple, see check_leap_seconds(),
+                           or None to reset to LEAP_SECOND_FILE
+    Examples:   # use the latest table from the IERS, without re-compiling solid.for
+                set_leap_seconds('Leap_Second.dat')
+    """
+    global _leap_seconds
+    if leap_sec is None or isinstance(leap_sec, (str, os.PathLike)):
+        leap_sec = read_leap_seconds(LEAP_SECOND_FILE if leap_sec is None else leap_sec)
+    else:
+        leap_sec = check_leap_seconds(leap_sec)
+    _leap_seconds = leap_sec
+
+
+def warn_leap_second():
+    """Warn that the date/times crossed the leap second table boundaries.
+
+    The warning points at the first caller outside of pysolid, e.g. the user script calling
+    calc_solid_earth_tides_grid(), at any call depth within pysolid, see get_stacklevel().
+    """
+    warnings.warn('Time crossed leap second table boundaries. Boundary edge value used instead. '
+                  'Update the table via pysolid.utils.set_leap_seconds().',
+                  RuntimeWarning, stacklevel=get_stacklevel())
+
+
+def get_stacklevel():
+    """Get the stacklevel of the first frame outside of the pysolid package, for the caller of
+    warnings.warn(), as skip_file_prefixes in python 3.12+.
+
+    Returns:    level - int, stacklevel for warnings.warn() called by the caller of this function
+    """
+    pkg_dir = os.path.dirname(os.path.abspath(__file__)) + os.sep
+    frame = sys._getframe(1)
+    level = 1
+    while frame.f_back is not None and os.path.abspath(frame.f_code.co_filename).startswith(pkg_dir):
+        frame = frame.f_back
+        level += 1
+    return level
@@ -5,11 +5,14 @@
 
 import os
 import sys
+import tempfile
+import time
 import datetime as dt
 
 import numpy as np
 
 import pysolid
+from pysolid import profiler
 
 
 if __name__ == '__main__':
@@ -55,15 +58,246 @@ if __name__ == '__main__':
          [-0.05468968, -0.05453776, -0.05437757, -0.05421719, -0.05405664]],
     )
 
-    # calculate
-    (tide_e,
-     tide_n,
-     tide_u) = pysolid.calc_solid_earth_tides_grid(dt_obj, atr, verbose=True)
+    for backend in ['fortran', 'numpy']:
+        print(f'backend: {backend}')
 
-    # compare
-    assert np.allclose(tide_e[::80, ::100], tide_e_80_100)
-    assert np.allclose(tide_n[::80, ::100], tide_n_80_100)
-    assert np.allclose(tide_u[::80, ::100], tide_u_80_100)
+        # calculate
+        (tide_e,
+         tide_n,
+         tide_u) = pysolid.calc_solid_earth_tides_grid(dt_obj, atr, verbose=True, backend=backend)
+
+        # compare
+        assert np.allclose(tide_e[::80, ::100], tide_e_80_100)
+        assert np.allclose(tide_n[::80, ::100], tide_n_80_100)
+        assert np.allclose(tide_u[::80, ::100], tide_u_80_100)
+
+        # calculate for multiple datetimes in one call
+        dt_list = [dt_obj - dt.timedelta(days=12), dt_obj]
+        (tide_e_stack,
+         tide_n_stack,
+         tide_u_stack) = pysolid.calc_solid_earth_tides_grid_stack(dt_list, atr, verbose=True, backend=backend)
+
+        # compare
+        assert tide_e_stack.shape == (len(dt_list), atr['LENGTH'], atr['WIDTH'])
+        assert np.allclose(tide_e_stack[-1], tide_e)
+        assert np.allclose(tide_n_stack[-1], tide_n)
+        assert np.allclose(tide_u_stack[-1], tide_u)
+
+        # resample in float32
+        tide_stack_32 = pysolid.calc_solid_earth_tides_grid_stack(dt_list, atr, verbose=False, backend=backend,
+                                                                  dtype=np.float32)
+        for data, data_ref in zip(tide_stack_32, [tide_e_stack, tide_n_stack, tide_u_stack]):
+            assert data.dtype == np.float32
+            assert np.allclose(data, data_ref, rtol=0, atol=1e-7)
+
+        # calculate with the precomputed ephemeris table
+        eph = pysolid.ephemeris.build_ephemeris(dt_list[0], dt_list[-1])
+        tide_stack_eph = pysolid.calc_solid_earth_tides_grid_stack(dt_list, atr, verbose=False, backend=backend,
+                                                                   ephemeris=eph)
+        for data, data_ref in zip(tide_stack_eph, [tide_e_stack, tide_n_stack, tide_u_stack]):
+            assert np.allclose(data, data_ref, rtol=0, atol=1e-9)
+
+        # calculate in parallel over blocks of rows
+        (tide_e_par,
+         tide_n_par,
+         tide_u_par) = pysolid.calc_solid_earth_tides_grid(dt_obj, atr, verbose=False, backend=backend, n_workers=3)
+
+        # compare
+        assert np.allclose(tide_e_par, tide_e, rtol=0, atol=1e-12)
+        assert np.allclose(tide_n_par, tide_n, rtol=0, atol=1e-12)
+        assert np.allclose(tide_u_par, tide_u, rtol=0, atol=1e-12)
+
+        # calculate in LOS direction, with scalar and 2D angles
+        inc_angle = np.linspace(30, 45, atr['WIDTH'])[np.newaxis, :] * np.ones((atr['LENGTH'], 1))
+        az_angle = -102.
+        for inc in [34., inc_angle]:
+            tide_los = pysolid.calc_solid_earth_tides_grid(dt_obj, atr, verbose=False, backend=backend,
+                                                           inc_angle=inc, az_angle=az_angle)
+            tide_los_ref = pysolid.utils.enu2los(tide_e, tide_n, tide_u, inc, az_angle)
+            assert np.allclose(tide_los, tide_los_ref, rtol=0, atol=1e-12)
+
+        # write into memory-mapped files block by block
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            shape = (atr['LENGTH'], atr['WIDTH'])
+            out = [np.memmap(os.path.join(tmp_dir, f'{x}.bin'), dtype=np.float32, mode='w+', shape=shape)
+                   for x in ['east', 'north', 'up']]
+            pysolid.calc_solid_earth_tides_grid(dt_obj, atr, verbose=False, backend=backend, out=out)
+            for data, data_ref in zip(out, [tide_e, tide_n, tide_u]):
+                assert np.allclose(data, data_ref, rtol=0, atol=1e-8)
+            del out
+
+        # calculate with the on-disk cache, the 2nd call reads the coarse grid from the cache
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for _ in range(2):
+                tide_cache = pysolid.calc_solid_earth_tides_grid(dt_obj, atr, verbose=True, backend=backend,
+                                                                 cache_dir=cache_dir)
+                assert len(os.listdir(cache_dir)) == 1
+                for data, data_ref in zip(tide_cache, [tide_e, tide_n, tide_u]):
+                    assert np.allclose(data, data_ref, rtol=0, atol=1e-12)
+            # the ephemeris table is part of the key, thus a new entry
+            for _ in range(2):
+                tide_cache = pysolid.calc_solid_earth_tides_grid(dt_obj, atr, verbose=False, backend=backend,
+                                                                 cache_dir=cache_dir, ephemeris=eph)
+                assert len(os.listdir(cache_dir)) == 2
+                for data, data_ref in zip(tide_cache, [tide_e, tide_n, tide_u]):
+                    assert np.allclose(data, data_ref, rtol=0, atol=1e-9)
+
+        # calculate with per-pixel lat/lon, e.g. in radar coordinates
+        lat = atr['Y_FIRST'] + atr['Y_STEP'] * np.arange(atr['LENGTH'])
+        lon = atr['X_FIRST'] + atr['X_STEP'] * np.arange(atr['WIDTH'])
+        lat, lon = np.meshgrid(lat, lon, indexing='ij')
+        (tide_e_ll,
+         tide_n_ll,
+         tide_u_ll) = pysolid.calc_solid_earth_tides_grid_latlon(dt_obj, lat, lon, verbose=True, backend=backend)
+
+        # compare against the full resolution
+        (tide_e_full,
+         tide_n_full,
+         tide_u_full) = pysolid.calc_solid_earth_tides_grid(dt_obj, atr, step_size=0, verbose=False, backend=backend)
+        assert tide_e_ll.shape == (atr['LENGTH'], atr['WIDTH'])
+        assert np.allclose(tide_e_ll, tide_e_full, rtol=0, atol=1e-8)
+        assert np.allclose(tide_n_ll, tide_n_full, rtol=0, atol=1e-8)
+        assert np.allclose(tide_u_ll, tide_u_full, rtol=0, atol=1e-8)
+
+        # calculate with the adaptive coarse grid
+        tolerance = 1e-6
+        (tide_e_ad,
+         tide_n_ad,
+         tide_u_ad) = pysolid.calc_solid_earth_tides_grid(dt_obj, atr, verbose=True, backend=backend,
+                                                          tolerance=tolerance)
+
+        # compare against the full resolution
+        assert np.allclose(tide_e_ad, tide_e_full, rtol=0, atol=tolerance)
+        assert np.allclose(tide_n_ad, tide_n_full, rtol=0, atol=tolerance)
+        assert np.allclose(tide_u_ad, tide_u_full, rtol=0, atol=tolerance)
+
+        # bicubic interpolation, far more accurate than the bilinear one on the same coarse grid
+        tide_ad_cubic = pysolid.calc_solid_earth_tides_grid(dt_obj, atr, verbose=False, backend=backend,
+                                                            tolerance=1e-7, order=3)
+        for data, data_ref in zip(tide_ad_cubic, [tide_e_full, tide_n_full, tide_u_full]):
+            assert np.allclose(data, data_ref, rtol=0, atol=1e-10)
+
+        # calculate with the station height of 0-5000 m, directly at each pixel as reference
+        rows, cols = np.mgrid[0:atr['LENGTH'], 0:atr['WIDTH']]
+        dem = 2500. + 2500. * np.sin(rows / 37.) * np.cos(cols / 23.)
+        tide_dem_ref = pysolid.calc_solid_earth_tides_grid_latlon(dt_obj, lat, lon, step_size=0, verbose=False,
+                                                                  backend=backend, height=dem)
+        assert np.abs(tide_dem_ref[2] - tide_u_full).max() > 1e-7
+
+        # compare the height correction on the coarse grid against the reference
+        for kwargs, atol in [(dict(step_size=0), 1e-9), (dict(tolerance=1e-7), 1e-7)]:
+            tide_dem = pysolid.calc_solid_earth_tides_grid(dt_obj, atr, verbose=False, backend=backend,
+                                                           height=dem, **kwargs)
+            for data, data_ref in zip(tide_dem, tide_dem_ref):
+                assert np.allclose(data, data_ref, rtol=0, atol=atol)
+        tide_dem = pysolid.calc_solid_earth_tides_grid_latlon(dt_obj, lat, lon, verbose=False, backend=backend,
+                                                              height=dem)
+        for data, data_ref in zip(tide_dem, tide_dem_ref):
+            assert np.allclose(data, data_ref, rtol=0, atol=1e-8)
+
+        # calculate with the time offset of each row, over 31 s with fractional seconds,
+        # against the point mode at the exact time of each pixel as reference
+        t_row = np.linspace(-12.3, 18.7, atr['LENGTH']) + 0.25
+        ys, xs = np.arange(0, atr['LENGTH'], 37), np.arange(0, atr['WIDTH'], 41)
+        tide_t_ref = np.empty((3, ys.size, xs.size))
+        for i, y in enumerate(ys):
+            t_obj = np.datetime64(dt_obj, 'us') + np.timedelta64(int(round(t_row[y] * 1e6)), 'us')
+            tide_t_ref[:, i, :] = pysolid.calc_solid_earth_tides_points(lat[y, xs], lon[y, xs], [t_obj],
+                                                                        verbose=False, backend=backend)[:, 0, :].T
+        assert np.abs(tide_u_full[ys][:, xs] - tide_t_ref[2]).max() > 1e-4
+
+        for kwargs, atol in [(dict(step_size=0), 1e-8), (dict(tolerance=1e-7), 2e-7)]:
+            tide_t = pysolid.calc_solid_earth_tides_grid(dt_obj, atr, verbose=False, backend=backend,
+                                                         time_offset=t_row, **kwargs)
+            for data, data_ref in zip(tide_t, tide_t_ref):
+                assert np.allclose(data[ys][:, xs], data_ref, rtol=0, atol=atol)
+        tide_t = pysolid.calc_solid_earth_tides_grid_latlon(dt_obj, lat, lon, verbose=False, backend=backend,
+                                                            time_offset=t_row)
+        for data, data_ref in zip(tide_t, tide_t_ref):
+            assert np.allclose(data[ys][:, xs], data_ref, rtol=0, atol=1e-8)
+
+        # calculate with the time offset of each pixel, against the lat/lon mode, which interpolates SET
+        # in time instead of the epoch terms, at the cost of one epoch at the full resolution
+        t_pix = t_row[:, np.newaxis] + np.linspace(0., 1.5, atr['WIDTH'])
+        tide_p_ref = pysolid.calc_solid_earth_tides_grid_latlon(dt_obj, lat, lon, step_size=0, verbose=False,
+                                                                backend=backend, time_offset=t_pix)
+        tide_p = pysolid.calc_solid_earth_tides_grid(dt_obj, atr, step_size=0, verbose=False, backend=backend,
+                                                     time_offset=t_pix)
+        for data, data_ref in zip(tide_p, tide_p_ref):
+            assert np.allclose(data, data_ref, rtol=0, atol=2e-8)
+
+        def get_run_time(**kwargs):
+            t0 = time.perf_counter()
+            pysolid.calc_solid_earth_tides_grid(dt_obj, atr, step_size=0, verbose=False, backend=backend, **kwargs)
+            return time.perf_counter() - t0
+        t_one = min(get_run_time() for _ in range(3))
+        t_pix = min(get_run_time(time_offset=t_pix) for _ in range(3))
+        print(f'full resolution run time: {t_one:.3f} s for one epoch, {t_pix:.3f} s with the time offset')
+        assert t_pix < 2 * t_one, 'full resolution with the time offset is much slower than without!'
+
+        # calculate lazily as xarray.Dataset, for a subset only, with the optional xarray/dask
+        try:
+            import dask
+            import xarray as xr
+        except ImportError:
+            print('xarray/dask are NOT installed, skip the xarray.Dataset test.')
+        else:
+            grid = xr.Dataset(coords={'lat': lat[:, 0], 'lon': lon[0, :]})
+            for step_size, atol in [(0, 1e-12), (1e3, 1e-8)]:
+                ds = pysolid.calc_solid_earth_tides_dataset(grid, dt_list, step_size=step_size, backend=backend,
+                                                            chunks={'lat': 128, 'lon': 96})
+                assert ds['tide_e'].shape == (len(dt_list), atr['LENGTH'], atr['WIDTH'])
+                ds_sub = ds.isel(time=-1, lat=slice(100, 300), lon=slice(50, 150)).compute()
+                for name, data_ref in zip(['tide_e', 'tide_n', 'tide_u'], [tide_e_full, tide_n_full, tide_u_full]):
+                    assert np.allclose(ds_sub[name].values, data_ref[100:300, 50:150], rtol=0, atol=atol)
+
+        # profile the stages, same output as without profiling
+        with profiler.profile(trace_mem=True) as stages:
+            tide_prof = pysolid.calc_solid_earth_tides_grid(dt_obj, atr, verbose=False, backend=backend)
+        print(profiler.format_report(stages))
+        assert [x.name for x in stages] == ['time', 'kernel', 'resample']
+        assert all(x.seconds >= 0 and x.peak_mem >= 0 for x in stages)
+        for data, data_ref in zip(tide_prof, [tide_e, tide_n, tide_u]):
+            assert np.array_equal(data, data_ref)
+
+    # calculate into an HDF5 file via the command line interface, with 2 processes, if h5py is installed
+    try:
+        import h5py
+    except ImportError:
+        print('h5py is NOT installed, skip the HDF5 file test.')
+    else:
+        from pysolid import cli
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            meta_file = os.path.join(tmp_dir, 'meta.rsc')
+            with open(meta_file, 'w') as f:
+                f.writelines(f'{key} {value}\n' for key, value in atr.items())
+            out_file = os.path.join(tmp_dir, 'SET.h5')
+            iargs = ['-m', meta_file, '-d'] + [x.strftime('%Y%m%dT%H%M%S') for x in dt_list]
+            iargs += ['-o', out_file, '-n', '2']
+            cli.main(iargs)
+
+            with h5py.File(out_file, 'r') as f:
+                assert f['done'][:].all()
+                for name, data_ref in zip(['east', 'north', 'up'], [tide_e_stack, tide_n_stack, tide_u_stack]):
+                    assert np.allclose(f[name][:], data_ref, rtol=0, atol=1e-7)
+
+            # resume: only the epoch not done is re-calculated
+            with h5py.File(out_file, 'r+') as f:
+                f['done'][0] = False
+                f['up'][0] = np.nan
+                up_1 = f['up'][1]
+            cli.main(iargs)
+            with h5py.File(out_file, 'r') as f:
+                assert f['done'][:].all()
+                assert np.allclose(f['up'][0], tide_u_stack[0], rtol=0, atol=1e-7)
+                assert np.array_equal(f['up'][1], up_1)
+
+            # a different data type: re-calculate all epochs, instead of resuming into mixed types
+            cli.main(iargs + ['--dtype', 'float64'])
+            with h5py.File(out_file, 'r') as f:
+                assert f['done'][:].all()
+                assert all(f[name].dtype == np.float64 for name in ['east', 'north', 'up'])
+                assert np.allclose(f['up'][:], tide_u_stack, rtol=0, atol=1e-12)
 
     # plot
     out_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pic'))
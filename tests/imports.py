@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# Copyright 2020, by the California Institute of Technology.
+# Regression test of the import time and the lazy loading of the dependencies.
+
+
+import os
+import re
+import subprocess
+import sys
+
+
+def run(code):
+    """Run the code in a fresh interpreter, return the stdout and stderr."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          capture_output=True, text=True, check=True)
+    return proc.stdout, proc.stderr
+
+
+def get_import_time(stderr, name):
+    """Get the cumulative import time of the module in microseconds from the -X importtime log."""
+    for line in stderr.splitlines():
+        m = re.match(r'import time:\s*\d+\s*\|\s*(\d+)\s*\|\s*(\S+)\s*$', line)
+        if m and m.group(2) == name:
+            return int(m.group(1))
+    raise ValueError(f'module {name} not found in the -X importtime log!')
+
+
+def get_loaded(code, names):
+    """Get the modules loaded, among the given names, after running the code."""
+    code += f'\nimport sys; print(",".join(x for x in {names!r} if x in sys.modules))'
+    return [x for x in run(code)[0].strip().split(',') if x]
+
+
+if __name__ == '__main__':
+
+    # print the file/module path
+    print('-'*50)
+    print(os.path.abspath(__file__))
+
+    heavy = ['numpy', 'scipy', 'matplotlib', 'dask', 'xarray', 'h5py', 'importlib.metadata',
+             'pysolid.solid', 'pysolid.grid', 'pysolid.point']
+
+    # import pysolid: nothing heavy, faster than importing numpy alone
+    stderr = run('import pysolid')[1]
+    t_pysolid = get_import_time(stderr, 'pysolid')
+    t_numpy = get_import_time(run('import numpy')[1], 'numpy')
+    print(f'import time: pysolid {t_pysolid/1e3:.1f} ms, numpy {t_numpy/1e3:.1f} ms')
+    assert t_pysolid < t_numpy, 'import pysolid is slower than import numpy!'
+    assert get_loaded('import pysolid', heavy) == []
+
+    # the top-level functions load their own module only, no scipy/matplotlib
+    loaded = get_loaded('from pysolid import calc_solid_earth_tides_point', heavy)
+    assert set(loaded) == {'numpy', 'pysolid.point'}, loaded
+    loaded = get_loaded('import pysolid; pysolid.calc_solid_earth_tides_grid', heavy)
+    assert set(loaded) == {'numpy', 'pysolid.grid'}, loaded
+
+    # the compiled solid.for is loaded on the first call, and bound once
+    code = '\n'.join([
+        'import datetime as dt, pysolid',
+        'from pysolid import utils',
+        'pysolid.calc_solid_earth_tides_point(34., -118., dt.datetime(2020, 1, 1), dt.datetime(2020, 1, 2), verbose=False)',
+        'assert utils.get_backend() is utils._solid is pysolid.solid',
+    ])
+    loaded = get_loaded(code, heavy)
+    assert 'pysolid.solid' in loaded, loaded
+    assert 'scipy' not in loaded and 'matplotlib' not in loaded, loaded
+
+    # submodules and __all__ are still accessible
+    code = 'import pysolid; pysolid.utils.get_backend; pysolid.harmonic.fit_harmonics; [getattr(pysolid, x) for x in pysolid.__all__ if x != "__version__"]'
+    run(code)
+    print('Passed.')
@@ -5,11 +5,15 @@
 
 import os
 import sys
+import tempfile
 import datetime as dt
+import logging
+import logging.handlers
 
 import numpy as np
 
 import pysolid
+import pysolid.harmonic
 
 
 if __name__ == '__main__':
@@ -52,17 +56,176 @@ if __name__ == '__main__':
           0.13082217, -0.1006462 ,  0.24870719, -0.02648802, -0.08420228],
     )
 
-    # calculate
-    (dt_out,
-     tide_e,
-     tide_n,
-     tide_u) = pysolid.calc_solid_earth_tides_point(lat, lon, dt_obj0, dt_obj1, verbose=False)
-
-    # compare
-    assert all(dt_out[::8000] == dt_out_8000)
-    assert np.allclose(tide_e[::8000], tide_e_8000)
-    assert np.allclose(tide_n[::8000], tide_n_8000)
-    assert np.allclose(tide_u[::8000], tide_u_8000)
+    for backend in ['fortran', 'numpy']:
+        print(f'backend: {backend}')
+
+        # calculate
+        (dt_out,
+         tide_e,
+         tide_n,
+         tide_u) = pysolid.calc_solid_earth_tides_point(lat, lon, dt_obj0, dt_obj1, verbose=False,
+                                                        backend=backend)
+
+        # compare
+        assert all(dt_out[::8000] == dt_out_8000)
+        assert np.allclose(tide_e[::8000], tide_e_8000)
+        assert np.allclose(tide_n[::8000], tide_n_8000)
+        assert np.allclose(tide_u[::8000], tide_u_8000)
+
+        # calculate at the given date/times
+        times = dt_out[3::8000]
+        (dt_out_t,
+         tide_e_t,
+         tide_n_t,
+         tide_u_t) = pysolid.calc_solid_earth_tides_point(lat, lon, times=times, verbose=False,
+                                                          backend=backend)
+
+        # compare
+        assert all(dt_out_t == times)
+        assert np.allclose(tide_e_t, tide_e[3::8000], rtol=0, atol=1e-12)
+        assert np.allclose(tide_n_t, tide_n[3::8000], rtol=0, atol=1e-12)
+        assert np.allclose(tide_u_t, tide_u[3::8000], rtol=0, atol=1e-12)
+
+        # calculate with the precomputed ephemeris table
+        eph = pysolid.ephemeris.build_ephemeris(dt_obj0, dt_obj1)
+        (dt_out_eph,
+         tide_e_eph,
+         tide_n_eph,
+         tide_u_eph) = pysolid.calc_solid_earth_tides_point(lat, lon, dt_obj0, dt_obj1, verbose=False,
+                                                            backend=backend, ephemeris=eph)
+
+        # compare
+        assert np.allclose(tide_e_eph, tide_e, rtol=0, atol=1e-9)
+        assert np.allclose(tide_n_eph, tide_n, rtol=0, atol=1e-9)
+        assert np.allclose(tide_u_eph, tide_u, rtol=0, atol=1e-9)
+
+        # calculate a 1 s series for 6 hours, interpolated from every 5 min
+        dt_obj2 = dt_obj0 + dt.timedelta(hours=6)
+        tide_1s = pysolid.calc_solid_earth_tides_point(lat, lon, dt_obj0, dt_obj2, step_sec=1, verbose=False,
+                                                       backend=backend)
+        tide_1s_sp = pysolid.calc_solid_earth_tides_point(lat, lon, dt_obj0, dt_obj2, step_sec=1, verbose=True,
+                                                          backend=backend, interp_step=300)
+        assert np.all(tide_1s_sp[0] == tide_1s[0])
+        for data, data_ref in zip(tide_1s_sp[1:], tide_1s[1:]):
+            assert np.allclose(data, data_ref, rtol=0, atol=1e-7)
+
+        # the reported max error bounds the actual one
+        solid = pysolid.utils.get_backend(backend)
+        calc_point = lambda mjd, fmjd: (np.stack(solid.solid_point_stack(lat, lon, mjd, fmjd)[:3]), False)
+        max_err = pysolid.point.calc_spline_in_time(calc_point, tide_1s[0], 300)[1]
+        assert max(np.abs(x - y).max() for x, y in zip(tide_1s_sp[1:], tide_1s[1:])) < max_err * 2
+
+        # the max error is returned with return_err, 0 if not interpolated
+        *tide_1s_err, max_err2 = pysolid.calc_solid_earth_tides_point(lat, lon, dt_obj0, dt_obj2, step_sec=1,
+                                                                      verbose=False, backend=backend,
+                                                                      interp_step=300, return_err=True)
+        assert max_err2 == max_err
+        assert all(np.array_equal(x, y) for x, y in zip(tide_1s_err, tide_1s_sp))
+        assert pysolid.calc_solid_earth_tides_point(lat, lon, dt_obj0, dt_obj2, verbose=False, backend=backend,
+                                                    return_err=True)[-1] == 0.
+        tide_enu, max_err3 = pysolid.calc_solid_earth_tides_points([lat], [lon], tide_1s[0], verbose=False,
+                                                                   backend=backend, interp_step=300,
+                                                                   return_err=True)
+        assert np.isclose(max_err3, max_err, rtol=1e-6, atol=0)
+        assert np.allclose(tide_enu[0].T, tide_1s_sp[1:], rtol=0, atol=1e-10)
+
+        # calculate with the on-disk cache, the 2nd call reads from the cache
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for _ in range(2):
+                tide_cache = pysolid.calc_solid_earth_tides_point(lat, lon, times=times, verbose=True,
+                                                                  backend=backend, cache_dir=cache_dir)[1:]
+                assert len(os.listdir(cache_dir)) == 1
+                for data, data_ref in zip(tide_cache, [tide_e_t, tide_n_t, tide_u_t]):
+                    assert np.allclose(data, data_ref, rtol=0, atol=1e-12)
+            # the ephemeris table is part of the key, thus a new entry
+            for _ in range(2):
+                tide_cache = pysolid.calc_solid_earth_tides_point(lat, lon, times=times, verbose=False,
+                                                                  backend=backend, cache_dir=cache_dir,
+                                                                  ephemeris=eph)[1:]
+                assert len(os.listdir(cache_dir)) == 2
+                for data, data_ref in zip(tide_cache, [tide_e_t, tide_n_t, tide_u_t]):
+                    assert np.allclose(data, data_ref, rtol=0, atol=1e-9)
+            # the max interpolation error is cached as well
+            for _ in range(2):
+                max_err_cache = pysolid.calc_solid_earth_tides_point(lat, lon, dt_obj0, dt_obj2, step_sec=1,
+                                                                     verbose=False, backend=backend,
+                                                                     cache_dir=cache_dir, interp_step=300,
+                                                                     return_err=True)[-1]
+                assert len(os.listdir(cache_dir)) == 3
+                assert max_err_cache == max_err
+
+        # calculate at multiple points in one call
+        lats = np.array([lat, -60.0])
+        lons = np.array([lon, 200.0])
+        tide_enu = pysolid.calc_solid_earth_tides_points(lats, lons, times, verbose=False, backend=backend)
+
+        # compare
+        assert tide_enu.shape == (lats.size, times.size, 3)
+        assert np.allclose(tide_enu[0], np.stack([tide_e_t, tide_n_t, tide_u_t], axis=-1), rtol=0, atol=1e-12)
+        for i in range(1, lats.size):
+            tide_i = pysolid.calc_solid_earth_tides_point(lats[i], lons[i], times=times, verbose=False,
+                                                          backend=backend)[1:]
+            assert np.allclose(tide_enu[i], np.stack(tide_i, axis=-1), rtol=0, atol=1e-12)
+
+    # verbose messages on the pysolid logger, at INFO level with verbose=True only
+    logger = logging.getLogger('pysolid')
+    handler = logging.handlers.BufferingHandler(capacity=1000)
+    logger.addHandler(handler)
+    for verbose in [True, False]:
+        handler.flush()
+        pysolid.calc_solid_earth_tides_point(lat, lon, times=times, verbose=verbose)
+        assert len(handler.buffer) > 0 if verbose else len(handler.buffer) == 0
+        assert all(x.name == 'pysolid.point' and x.levelno == logging.INFO for x in handler.buffer)
+    logger.removeHandler(handler)
+
+    # harmonic synthesis: fit over 2 years, evaluate within the span
+    harm = pysolid.harmonic.fit_harmonics(lat, lon, dt.datetime(2019, 1, 1), dt.datetime(2021, 1, 1))
+    print(f'harmonic: max fitting residual in up: {harm.max_err[2]*1e3:.1f} mm')
+    assert np.all(harm.max_err < 0.02)
+    (dt_out_h,
+     tide_e_h,
+     tide_n_h,
+     tide_u_h) = pysolid.harmonic.calc_solid_earth_tides_harmonic(harm, dt_obj0, dt_obj1)
+    assert np.all(dt_out_h == dt_out)
+    for data, data_ref, max_err in zip([tide_e_h, tide_n_h, tide_u_h], [tide_e, tide_n, tide_u], harm.max_err):
+        assert np.max(np.abs(data - data_ref)) < max_err * 1.5
+
+    # irregular date/times
+    tide_h_t = pysolid.harmonic.calc_solid_earth_tides_harmonic(harm, times=times)[1:]
+    for data, data_ref in zip(tide_h_t, [tide_e_h, tide_n_h, tide_u_h]):
+        assert np.allclose(data, data_ref[3::8000], rtol=0, atol=1e-10)
+
+    # streaming constituent analysis chunk by chunk, against the least squares with the full design matrix
+    dt_out_a, *tide_a = pysolid.calc_solid_earth_tides_point(lat, lon, dt.datetime(2019, 1, 1), dt.datetime(2021, 1, 1),
+                                                             step_sec=3600, verbose=False)
+    analysis = pysolid.harmonic.init_analysis()
+    for i0 in range(0, dt_out_a.size, 1000):
+        analysis = pysolid.harmonic.update_analysis(analysis, dt_out_a[i0:i0+1000], *[x[i0:i0+1000] for x in tide_a])
+    # irregular samples
+    idx = np.delete(np.arange(dt_out_a.size), np.s_[::7])
+    analysis_irr = pysolid.harmonic.update_analysis(pysolid.harmonic.init_analysis(), dt_out_a[idx],
+                                                    *[x[idx] for x in tide_a])
+    a = pysolid.harmonic.get_design_matrix(pysolid.harmonic.get_hours(dt_out_a), analysis.speed)
+    x = np.linalg.lstsq(a.T @ a, a.T @ np.stack(tide_a, axis=-1), rcond=1e-12)[0]
+    coef, rms = pysolid.harmonic.solve_analysis(analysis)
+    assert analysis.num == dt_out_a.size
+    assert np.allclose(coef, x[0::2] - 1j * x[1::2], rtol=0, atol=1e-10)
+    assert np.allclose(coef, harm.coef, rtol=0, atol=1e-10)
+    assert np.allclose(rms, harm.rms, rtol=1e-3, atol=0)
+    assert np.allclose(pysolid.harmonic.solve_analysis(analysis_irr)[0], coef, rtol=0, atol=1e-3)
+
+    # the input analysis is left unchanged, e.g. to branch from a common base
+    base = pysolid.harmonic.update_analysis(pysolid.harmonic.init_analysis(), dt_out_a[:1000], *[x[:1000] for x in tide_a])
+    base_arrays = [x.copy() for x in (base.gram_diff, base.gram_sum, base.proj, base.sum_sq)]
+    analysis_b = pysolid.harmonic.update_analysis(base, dt_out_a[1000:], *[x[1000:] for x in tide_a])
+    assert base.num == 1000
+    for data, data_ref in zip((base.gram_diff, base.gram_sum, base.proj, base.sum_sq), base_arrays):
+        assert np.array_equal(data, data_ref)
+    assert np.allclose(pysolid.harmonic.solve_analysis(analysis_b)[0], coef, rtol=0, atol=1e-10)
+
+    table = pysolid.harmonic.get_constituent_table(analysis)
+    print(pysolid.harmonic.format_table(table))
+    assert max(table, key=lambda x: x.amp[2]).tag.symbol == r'$M_2$'
 
     # plot
     out_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pic'))
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# Cross-validate the pure NumPy implementation against the compiled solid.for.
+# Copyright 2020, by the California Institute of Technology.
+
+
+import datetime as dt
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import warnings
+
+import numpy as np
+
+import pysolid
+from pysolid import ephemeris, solid_numpy, utils
+
+
+if __name__ == '__main__':
+
+    # print the file/module path
+    print('-'*50)
+    print(os.path.abspath(__file__))
+
+    # the leap second table is set into solid.for via get_backend()
+    solid = utils.get_backend('fortran')
+
+    # grid mode: iyr/imo/idy/ihh/imm/iss, glad0/steplat/nlat, glod0/steplon/nlon
+    grid_inputs = [
+        (2020, 12, 25, 14,  7, 44,  33.8, -0.01, 40, -118.2, 0.01, 50),  # Los Angeles, CA
+        (2009,  1,  1,  0,  0,  0,  70.0, -0.10, 50,  170.0, 0.30, 60),  # high latitude, dateline
+        (2016, 12, 31, 23, 59, 59, -89.5,  1.00, 10, -359.0, 35.9, 12),  # leap second, poles
+        (1950,  6, 30, 12,  0,  0,   0.0, -1.00,  5,    0.0, 1.00,  5),  # before leap second table
+    ]
+    for inps in grid_inputs:
+        print(f'grid  mode: {inps}')
+        data_f = solid.solid_grid(*inps)
+        data_n = solid_numpy.solid_grid(*inps)
+        assert bool(solid_numpy.limitflag.leapflag) == bool(solid.limitflag.leapflag) == (inps[0] < 1972)
+        for d_f, d_n in zip(data_f, data_n):
+            assert d_n.shape == d_f.shape
+            assert np.allclose(d_n, d_f, rtol=0, atol=1e-12)
+
+    # point mode: glad/glod, iyr/imo/idy, step_sec
+    point_inputs = [
+        ( 34.0, -118.0, 2020, 11,  5,   60),
+        (-60.0,  200.0, 1980,  2, 29,  300),
+        ( 10.0,   10.0, 2017,  1,  1, 3600),
+    ]
+    for inps in point_inputs:
+        print(f'point mode: {inps}')
+        data_f = solid.solid_point(*inps)
+        data_n = solid_numpy.solid_point(*inps)
+        assert bool(solid_numpy.limitflag.leapflag) == bool(solid.limitflag.leapflag)
+        for d_f, d_n in zip(data_f, data_n):
+            assert np.allclose(d_n, d_f, rtol=0, atol=1e-6)
+
+    # vectorized: stations x epochs via broadcasting
+    mjd = np.array([51544, 58000, 59000])
+    fmjd = np.array([0.0, 0.25, 0.7])
+    gla = np.deg2rad(np.array([-45., 0., 45., 80.]))
+    glo = np.deg2rad(np.array([10., 100., 250., 350.]))
+    xsta = solid_numpy.geoxyz(gla, glo)
+    epo, _ = solid_numpy.solid_epoch(mjd, fmjd)
+    dxtide = solid_numpy.detide_sta(xsta[:, np.newaxis, :], epo[np.newaxis, :, :])
+    assert dxtide.shape == (gla.size, mjd.size, 3)
+    for i in range(gla.size):
+        for j in range(mjd.size):
+            epo_j, _ = solid_numpy.solid_epoch(mjd[j:j+1], fmjd[j:j+1])
+            assert np.allclose(solid_numpy.detide_sta(xsta[i], epo_j[0]), dxtide[i, j], rtol=0, atol=1e-15)
+
+    # grid mode at the time of each row/pixel: numpy vs fortran, and vs grid_kern() at the epochs
+    mjd = np.array([59208, 59208, 59208], dtype=np.int32)
+    fmjd = 0.5 + np.array([0., 10., 20.]) / 86400.
+    tnode = np.array([0., 10., 20.])
+    epo = solid.solid_epochs(mjd, fmjd)[0]
+    grid = (33.8, -0.01, -118.2, 0.01, 6)
+    toff_row = np.array([[-5., 0., 3.3, 10., 17.2, 20., 25.]])
+    toff_pix = toff_row + np.linspace(0., 2., 6)[:, np.newaxis]
+    for toff in [toff_row, toff_pix]:
+        data_f = solid.grid_kern_time(epo, tnode, toff, *grid, eht=100.)
+        data_n = solid_numpy.grid_kern_time(epo, tnode, toff, *grid, eht=100.)
+        for d_f, d_n in zip(data_f, data_n):
+            assert d_n.shape == d_f.shape == (6, 7)
+            assert np.allclose(d_n, d_f, rtol=0, atol=1e-12)
+    data_f = solid.grid_kern_time(epo, tnode, toff_row, *grid, eht=100.)
+    data_ref = solid.grid_kern(epo, grid[0], grid[1], 7, *grid[2:], eht=100.)
+    for d_f, d_ref in zip(data_f, data_ref):
+        assert np.allclose(d_f[:, [1, 3, 5]], d_ref[:, [1, 3, 5], [0, 1, 2]], rtol=0, atol=1e-15)
+    try:
+        solid.grid_kern_time(epo, tnode, toff_pix[:3], *grid)
+    except Exception as e:
+        print(f'grid_kern_time: expected error: {e}')
+    else:
+        raise AssertionError('grid_kern_time should reject the time of a partial row!')
+
+    # ephemeris table: numpy vs fortran, and vs the series
+    eph = ephemeris.build_ephemeris('2016-01-01', '2018-01-01')
+    mjd = np.array([57388, 57754, 57753, 58000], dtype=np.int32)
+    fmjd = np.array([0.1, 0.0, 0.9999, 0.5])
+    args = (eph.data.T, eph.mjd0, eph.step, ephemeris.ORDER)
+    epo_f = solid.solid_epochs_eph(mjd, fmjd, *args)[0]
+    epo_n = solid_numpy.solid_epochs_eph(mjd, fmjd, *args)[0]
+    assert np.allclose(epo_n, epo_f, rtol=1e-14, atol=1e-12)
+    sun_err, moon_err, step2_err = ephemeris.check_ephemeris(eph, num_sample=1000)
+    print(f'ephemeris: max error of sun/moon/step2: {sun_err:.2f} m, {moon_err:.3f} m, {step2_err:.1e} mm')
+    assert sun_err < 2. and moon_err < 0.1 and step2_err < 1e-9
+
+    # leap second table: the bundled table vs UTC-TAI in solid.for, and the runtime update
+    leap_sec = utils.get_leap_seconds()
+    mjd = np.arange(41000, 62000, 7, dtype=np.int32)
+    utc_tai_f = np.zeros(mjd.size)
+    for i, mjd_i in enumerate(mjd):
+        solid.mjdoff.mjd0 = mjd_i
+        utc_tai_f[i] = solid.getutcmtai(0.)
+    utc_tai_n = solid_numpy.getutcmtai(mjd)[0]
+    assert np.all(utc_tai_f == utc_tai_n)
+    assert utc_tai_n[-1] == -37.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # add a fake leap second on 2040-01-01 (MJD 66154), valid until 2040-06-28 (MJD 66333)
+        fname = os.path.join(tmp_dir, 'Leap_Second.dat')
+        with open(utils.LEAP_SECOND_FILE) as f:
+            lines = re.sub(r'File expires on .*', 'File expires on 28 June 2040', f.read())
+        with open(fname, 'w') as f:
+            f.write(lines + '    66154.0     1  1 2040       38\n')
+        utils.set_leap_seconds(fname)
+        assert utils.get_leap_seconds().mjd_upper == 66333
+
+        for backend in ['fortran', 'numpy']:
+            inps = (2040, 3, 1, 0, 0, 0, 10., -1., 3, 20., 1., 3)
+            with warnings.catch_warnings():
+                warnings.simplefilter('error')
+                module = utils.get_backend(backend)
+                module.solid_grid(*inps)
+                lflag = module.limitflag.leapflag
+                pysolid.calc_solid_earth_tides_point(10., 20., times=['2040-03-01'], verbose=False,
+                                                     backend=backend)
+            assert not lflag
+            assert solid_numpy.getutcmtai(np.array([66154]))[0][0] == -38.
+
+        # out of the table: warning instead of prints, pointing at the caller outside of pysolid
+        atr = {'LENGTH': 5, 'WIDTH': 5, 'X_FIRST': 20., 'Y_FIRST': 10., 'X_STEP': 0.1, 'Y_STEP': -0.1}
+        lat, lon = np.meshgrid(10. - 0.1 * np.arange(5), 20. + 0.1 * np.arange(5), indexing='ij')
+        dt_obj = dt.datetime(2041, 3, 1)
+        for func in [lambda: pysolid.calc_solid_earth_tides_point(10., 20., times=['2041-03-01'], verbose=False),
+                     lambda: pysolid.calc_solid_earth_tides_point(10., 20., dt_obj, dt_obj + dt.timedelta(days=1),
+                                                                  verbose=False),
+                     lambda: pysolid.calc_solid_earth_tides_grid(dt_obj, atr, step_size=0, verbose=False),
+                     lambda: pysolid.calc_solid_earth_tides_grid(dt_obj, atr, verbose=False,
+                                                                 time_offset=np.arange(5.)),
+                     lambda: pysolid.calc_solid_earth_tides_grid_latlon(dt_obj, lat, lon, verbose=False)]:
+            with warnings.catch_warnings(record=True) as w:
+                warnings.simplefilter('always')
+                func()
+            w = [x for x in w if issubclass(x.category, RuntimeWarning)]
+            assert len(w) > 0 and all(x.filename == __file__ for x in w), [(x.filename, x.lineno) for x in w]
+    utils.set_leap_seconds()
+    leap_sec = utils.get_leap_seconds()
+
+    # invalid tables: rejected instead of used/truncated silently
+    for mjd_i, tai_utc_i, mjd_upper_i in [
+            (leap_sec.mjd[::-1], leap_sec.tai_utc, leap_sec.mjd_upper),       # NOT sorted
+            (leap_sec.mjd, leap_sec.tai_utc[:-1], leap_sec.mjd_upper),        # different sizes
+            (leap_sec.mjd, leap_sec.tai_utc, leap_sec.mjd[-1] - 1)]:          # expired before the last one
+        try:
+            utils.set_leap_seconds(utils.LeapSeconds(mjd_i, tai_utc_i, mjd_upper_i))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('invalid leap second table NOT rejected!')
+    assert utils.get_leap_seconds() is leap_sec
+    try:
+        num = utils.MAX_NUM_LEAP_SECOND + 1
+        solid.set_leapsec(np.arange(num, dtype=np.int32), np.zeros(num), 0)
+    except Exception:
+        pass
+    else:
+        raise AssertionError('leap second table beyond MAXLEAP NOT rejected in solid.for!')
+
+    # empty table in solid.for until set via get_backend(): flagged instead of used silently
+    code = '\n'.join([
+        'from pysolid import solid',
+        'solid.mjdoff.mjd0 = 60000',
+        'print(solid.getutcmtai(0.), int(solid.leaptab.nleap), bool(solid.limitflag.leapflag))',
+    ])
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    assert out.split() == ['0.0', '0', 'True']
+    print('Pass.')